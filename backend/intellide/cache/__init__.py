@@ -1,2 +1,3 @@
 from intellide.cache.cache import *
+from intellide.cache.course_directory import *
 from intellide.cache.startup import startup
@@ -0,0 +1,150 @@
+import json
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from intellide.cache.cache import cache
+from intellide.config import (
+    COURSE_DIRECTORY_ENTRY_TREE_CACHE_TTL,
+    COURSE_DIRECTORY_ENTRY_CHANGES_TTL,
+)
+
+# 所有进程发布和订阅目录变更的 Redis 频道
+_CACHE_COURSE_DIRECTORY_CHANGES_CHANNEL = "course:directory:changes"
+
+
+def _cache_course_directory_tree_key(
+    course_directory_id: int,
+    version: int,
+) -> str:
+    """
+    获取课程目录树快照的缓存键
+    """
+    return f"course:directory:{course_directory_id}:tree:{version}"
+
+
+def _cache_course_directory_changes_key(
+    course_directory_id: int,
+    version: int,
+) -> str:
+    """
+    获取课程目录某个版本的变更记录的缓存键
+    """
+    return f"course:directory:{course_directory_id}:changes:{version}"
+
+
+async def cache_course_directory_tree_get(
+    course_directory_id: int,
+    version: int,
+) -> Optional[List[Dict]]:
+    """
+    获取课程目录在指定版本的目录树快照
+
+    参数:
+    - course_directory_id: 课程目录ID
+    - version: 目录版本号
+
+    返回:
+    - 按路径排序的条目字典列表，没有缓存时返回 None
+    """
+    return await cache.get(_cache_course_directory_tree_key(course_directory_id, version))
+
+
+async def cache_course_directory_tree_set(
+    course_directory_id: int,
+    version: int,
+    entries: List[Dict],
+) -> None:
+    """
+    缓存课程目录在指定版本的目录树快照
+
+    快照包含目录中的所有条目，不区分用户角色，权限过滤在读取快照之后进行
+
+    参数:
+    - course_directory_id: 课程目录ID
+    - version: 目录版本号
+    - entries: 按路径排序的条目字典列表
+    """
+    await cache.set(
+        _cache_course_directory_tree_key(course_directory_id, version),
+        entries,
+        ttl=COURSE_DIRECTORY_ENTRY_TREE_CACHE_TTL,
+    )
+
+
+async def cache_course_directory_changes_get(
+    course_directory_id: int,
+    versions: Sequence[int],
+) -> List[Optional[List[Dict]]]:
+    """
+    批量获取课程目录在多个版本的变更记录
+
+    参数:
+    - course_directory_id: 课程目录ID
+    - versions: 目录版本号列表
+
+    返回:
+    - 与 versions 顺序一致的变更列表，没有缓存的版本为 None
+    """
+    if not versions:
+        return []
+    return await cache.multi_get(
+        [_cache_course_directory_changes_key(course_directory_id, version) for version in versions]
+    )
+
+
+async def cache_course_directory_changes_set(
+    course_directory_id: int,
+    version: int,
+    changes: List[Dict],
+) -> None:
+    """
+    缓存课程目录在某个版本发生的变更，用于断线重连的客户端恢复
+
+    参数:
+    - course_directory_id: 课程目录ID
+    - version: 变更后的目录版本号
+    - changes: 变更字典列表
+    """
+    await cache.set(
+        _cache_course_directory_changes_key(course_directory_id, version),
+        changes,
+        ttl=COURSE_DIRECTORY_ENTRY_CHANGES_TTL,
+    )
+
+
+async def cache_course_directory_changes_publish(
+    course_directory_id: int,
+    version: int,
+    changes: List[Dict],
+) -> None:
+    """
+    通过 Redis 向所有进程发布课程目录在某个版本发生的变更
+
+    参数:
+    - course_directory_id: 课程目录ID
+    - version: 变更后的目录版本号
+    - changes: 变更字典列表
+    """
+    message = {"course_directory_id": course_directory_id, "version": version, "changes": changes}
+    client = cache.client  # type: ignore
+    await client.publish(_CACHE_COURSE_DIRECTORY_CHANGES_CHANNEL, json.dumps(message))
+
+
+async def cache_course_directory_changes_subscribe() -> AsyncIterator[Tuple[int, int, List[Dict]]]:
+    """
+    通过 Redis 订阅所有进程发布的课程目录变更
+
+    同一目录的变更由不同进程发布时到达顺序可能与版本号顺序不同，由调用方按版本号排序
+
+    返回:
+    - (课程目录ID, 变更后的目录版本号, 变更字典列表) 的异步迭代器
+    """
+    pubsub = cache.client.pubsub()  # type: ignore
+    await pubsub.subscribe(_CACHE_COURSE_DIRECTORY_CHANGES_CHANNEL)
+    try:
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            data = json.loads(message["data"])
+            yield data["course_directory_id"], data["version"], data["changes"]
+    finally:
+        await pubsub.aclose()
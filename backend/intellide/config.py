@@ -6,6 +6,103 @@ SERVER_PORT = 8080
 
 # 项目存储路径
 STORAGE_PATH = os.path.join(os.path.dirname(__file__), "..", "storage")
+# 存储文件按存储名称前缀分片的目录层数，每层使用两个十六进制字符
+STORAGE_SHARD_LEVELS = 2
+# 是否将小文件追加写入打包文件（多个进程之间通过文件锁互斥，Windows 上只支持单个进程）
+STORAGE_PACK_ENABLE = False
+# 打包文件路径
+STORAGE_PACK_PATH = os.path.join(STORAGE_PATH, "packs")
+# 写入打包文件的存储块最大字节数，更大的存储块使用独立文件
+STORAGE_PACK_THRESHOLD = 64 * 1024
+# 单个打包文件的最大字节数
+STORAGE_PACK_MAX_SIZE = 256 * 1024 * 1024
+# 打包文件中已删除的数据占比达到该值时，回收任务会压缩该打包文件
+STORAGE_PACK_COMPACT_RATIO = 0.5
+# 是否对可压缩的文件进行压缩存储
+STORAGE_COMPRESS_ENABLE = True
+# 压缩存储的 gzip 压缩级别
+STORAGE_COMPRESS_LEVEL = 6
+# 压缩存储的最小字节数，更小的文件压缩收益不大
+STORAGE_COMPRESS_MIN_SIZE = 1024
+# 压缩存储的 MIME 类型前缀
+STORAGE_COMPRESS_MEDIA_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-sh",
+    "application/x-tex",
+    "application/x-ipynb+json",
+    "image/svg+xml",
+)
+# 临时文件路径（写入完成后再重命名到正式路径）
+STORAGE_TEMP_PATH = os.path.join(STORAGE_PATH, "temp")
+# 流式读写的块大小
+STORAGE_CHUNK_SIZE = 1024 * 1024
+# 上传单个文件的最大字节数
+STORAGE_UPLOAD_MAX_FILE_SIZE = 1024 * 1024 * 1024
+# 单个请求体的最大字节数
+STORAGE_UPLOAD_MAX_REQUEST_SIZE = 2 * 1024 * 1024 * 1024
+# 上传压缩包时允许的最大成员数量
+STORAGE_ARCHIVE_MAX_MEMBERS = 10000
+# 上传压缩包时所有成员解压后的最大总字节数
+STORAGE_ARCHIVE_MAX_TOTAL_SIZE = 4 * 1024 * 1024 * 1024
+# 分块上传的分块存储路径
+STORAGE_UPLOAD_PATH = os.path.join(STORAGE_PATH, "uploads")
+# 分块上传的默认分块大小
+STORAGE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# 分块上传允许的最大分块大小
+STORAGE_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# 分块上传会话的有效时长（秒），每次上传分块后重新计时
+STORAGE_UPLOAD_SESSION_TTL = 24 * 60 * 60
+# 清理过期分块上传会话的时间间隔（秒）
+STORAGE_UPLOAD_SESSION_CLEANUP_INTERVAL = 10 * 60
+# 回收无引用存储块的时间间隔（秒）
+STORAGE_BLOB_RECLAIM_INTERVAL = 10 * 60
+# 存储块引用计数降为 0 后保留的宽限期（秒）
+STORAGE_BLOB_RECLAIM_GRACE_PERIOD = 60 * 60
+# 每次回收的最大存储块数量
+STORAGE_BLOB_RECLAIM_BATCH_SIZE = 1000
+# 批量处理回收队列的时间间隔（秒）
+STORAGE_BLOB_RECLAIM_QUEUE_INTERVAL = 1
+# 标记清除回收孤立存储内容的时间间隔（秒）
+STORAGE_GC_INTERVAL = 24 * 60 * 60
+# 最近修改过的存储内容在宽限期内不会被回收（秒），避免删除尚未提交引用的新内容
+STORAGE_GC_GRACE_PERIOD = 24 * 60 * 60
+# 每批检查引用的存储内容数量
+STORAGE_GC_BATCH_SIZE = 1000
+# 每秒最多删除的存储内容数量
+STORAGE_GC_DELETE_RATE = 100
+
+# 课程目录条目配置
+# 列出子条目时允许的最大相对深度
+COURSE_DIRECTORY_ENTRY_LIST_MAX_DEPTH = 16
+# 列出子条目时每页的默认条目数量
+COURSE_DIRECTORY_ENTRY_LIST_DEFAULT_LIMIT = 100
+# 列出子条目时每页的最大条目数量
+COURSE_DIRECTORY_ENTRY_LIST_MAX_LIMIT = 1000
+# 目录树快照在缓存中的保留时间（秒），目录版本变化后旧快照不再被读取，到期后自动删除
+COURSE_DIRECTORY_ENTRY_TREE_CACHE_TTL = 3600
+# 批量操作中允许的最大操作数量
+COURSE_DIRECTORY_ENTRY_BATCH_MAX_OPERATIONS = 1000
+# 同步时客户端清单中允许的最大条目数量
+COURSE_DIRECTORY_ENTRY_SYNC_MAX_MANIFEST_SIZE = 100000
+# 每隔多少个版本保存一个完整内容的关键帧，还原任意版本最多需要应用的增量数量为该值减一
+COURSE_DIRECTORY_ENTRY_VERSION_KEYFRAME_INTERVAL = 16
+# 只对不超过该字节数的文件计算增量，更大的文件的每个版本都保存为关键帧
+COURSE_DIRECTORY_ENTRY_VERSION_DELTA_MAX_SIZE = 1024 * 1024
+# 增量超过完整内容的该比例时改为保存关键帧
+COURSE_DIRECTORY_ENTRY_VERSION_DELTA_MAX_RATIO = 0.5
+# 只比较不超过该字节数的版本，更大的版本拒绝生成文本差异
+COURSE_DIRECTORY_ENTRY_VERSION_DIFF_MAX_SIZE = 256 * 1024
+# 目录变更记录的缓存时间（秒），断线重连的客户端只能从该时间内的序号恢复
+COURSE_DIRECTORY_ENTRY_CHANGES_TTL = 3600
+# 断线重连时最多重放的变更数量，落后更多的客户端需要重新列出目录
+COURSE_DIRECTORY_ENTRY_CHANGES_MAX_RESUME = 1000
+# 推送目录变更时等待缺失序号的秒数，超时后从变更记录中补齐，补不齐时关闭连接让客户端重新订阅
+COURSE_DIRECTORY_ENTRY_CHANGES_GAP_TIMEOUT = 1
+# 接收目录变更的 Redis 订阅断开后重新订阅的间隔（秒）
+COURSE_DIRECTORY_ENTRY_CHANGES_LISTEN_INTERVAL = 1
 
 # 数据库配置
 DATABASE_ENGINE = "postgresql"
@@ -3,6 +3,7 @@ from enum import Enum as PyEnum
 from typing import Dict, List
 
 from sqlalchemy import (
+    Boolean,
     Column,
     Float,
     Integer,
@@ -13,11 +14,17 @@ from sqlalchemy import (
     Index,
     ForeignKey,
     Sequence,
+    cast,
+    func,
+    literal,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.event import listen
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import class_mapper
+from sqlalchemy.types import UserDefinedType
+
+from intellide.utils.path import path_tree
 
 
 class Mixin:
@@ -42,6 +49,53 @@ class EnumClass(PyEnum):
         return str(self.value)
 
 
+class Ltree(UserDefinedType):
+    """
+    PostgreSQL ltree 层级路径类型，需要 ltree 扩展
+    """
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "LTREE"
+
+    def bind_expression(self, bindvalue):
+        # 参数以文本形式传递，由数据库转换为 ltree
+        return func.text2ltree(bindvalue, type_=self)
+
+    def column_expression(self, column):
+        # 查询结果以文本形式返回
+        return func.ltree2text(column, type_=self)
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def descendant_of(self, other):
+            """是否是 other 本身或其子孙节点（<@）"""
+            return self.op("<@", return_type=Boolean)(other)
+
+        def ancestor_of(self, other):
+            """是否是 other 本身或其祖先节点（@>）"""
+            return self.op("@>", return_type=Boolean)(other)
+
+        def matches(self, lquery):
+            """是否匹配 lquery 模式（~）"""
+            return self.op("~", return_type=Boolean)(cast(literal(lquery, String), Lquery))
+
+        def concat(self, other):
+            """连接两个层级路径（||）"""
+            return self.op("||", return_type=Ltree)(other)
+
+
+class Lquery(UserDefinedType):
+    """
+    PostgreSQL lquery 层级路径匹配模式类型，需要 ltree 扩展
+    """
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "LQUERY"
+
+
 SQLAlchemyBaseModel = declarative_base()
 
 
@@ -246,6 +300,12 @@ class CourseDirectory(SQLAlchemyBaseModel, Mixin):
     permission = Column(
         JSONB,
     )
+    # 目录版本号，条目每次变更时在同一个事务中增加，也是目录变更推送的序号
+    version = Column(
+        BigInteger,
+        nullable=False,
+        default=0,
+    )
     created_at = Column(
         DateTime,
         nullable=False,
@@ -286,13 +346,31 @@ class CourseDirectoryEntry(SQLAlchemyBaseModel, Mixin):
         Integer,
         nullable=False,
     )
+    # 路径的 ltree 表示，用于按层级查询子树、祖先和子条目
+    path_tree = Column(
+        Ltree,
+        nullable=False,
+    )
     type = Column(
         Enum(EntryType),
         nullable=False,
     )
     storage_name = Column(
         String,
-        unique=True,
+        default=None,
+        index=True,
+    )
+    # 文件内容的字节数、SHA-256 哈希值和 MIME 类型，上传时计算，目录为 None
+    size = Column(
+        BigInteger,
+        default=None,
+    )
+    content_hash = Column(
+        String,
+        default=None,
+    )
+    mime_type = Column(
+        String,
         default=None,
     )
     created_at = Column(
@@ -303,6 +381,18 @@ class CourseDirectoryEntry(SQLAlchemyBaseModel, Mixin):
     updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
     __table_args__ = (
         Index("idx__course_directory_entries__path", path),  # B-TREE 主索引
+        Index(
+            "idx__course_directory_entries__course_directory_id__path",
+            course_directory_id,
+            path,
+            unique=True,
+        ),  # 同一目录下路径唯一
+        Index(
+            "idx__course_directory_entries__course_directory_id__depth__path",
+            course_directory_id,
+            depth,
+            path,
+        ),  # 按深度列出子条目
         Index(
             "idx__course_directory_entires__path__prefix",
             path,
@@ -311,11 +401,176 @@ class CourseDirectoryEntry(SQLAlchemyBaseModel, Mixin):
                 "path": "gin_trgm_ops",
             },
         ),  # 适用于 LIKE 查询
+        Index(
+            "idx__course_directory_entries__path_tree",
+            path_tree,
+            postgresql_using="gist",
+        ),  # 适用于子树、祖先和子条目查询
     )
 
+    def dict(self):
+        data = super().dict()
+        # 层级路径只用于查询，不返回给客户端
+        data.pop("path_tree")
+        return data
+
     @staticmethod
     def event_before_insert_or_update(mapper, connection, course_directory_entry: "CourseDirectoryEntry"):
         course_directory_entry.depth = course_directory_entry.path.count("/")
+        course_directory_entry.path_tree = path_tree(course_directory_entry.path)
+
+
+class StorageBlob(SQLAlchemyBaseModel, Mixin):
+    """
+    内容寻址存储块模型类
+
+    存储名称是内容的 SHA-256 哈希值，相同内容的文件共享同一个存储块，
+    引用计数降为 0 的存储块在宽限期后由后台任务回收
+    """
+
+    __tablename__ = "storage_blobs"
+    storage_name = Column(
+        String,
+        primary_key=True,
+    )
+    size = Column(
+        BigInteger,
+    )
+    reference_count = Column(
+        BigInteger,
+        nullable=False,
+        default=0,
+    )
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.now,
+    )
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.now,
+        onupdate=datetime.now,
+        index=True,
+    )
+
+
+class CourseDirectoryEntryUploadSession(SQLAlchemyBaseModel, Mixin):
+    """
+    课程目录条目分块上传会话模型类
+    """
+
+    __tablename__ = "course_directory_entry_upload_sessions"
+    id = Column(
+        BigInteger,
+        primary_key=True,
+        autoincrement=True,
+    )
+    course_directory_id = Column(
+        BigInteger,
+        ForeignKey("course_directories.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    author_id = Column(
+        BigInteger,
+        ForeignKey("users.id"),
+        nullable=False,
+        index=True,
+    )
+    path = Column(
+        String,
+        nullable=False,
+    )
+    size = Column(
+        BigInteger,
+        nullable=False,
+    )
+    chunk_size = Column(
+        BigInteger,
+        nullable=False,
+    )
+    chunk_count = Column(
+        Integer,
+        nullable=False,
+    )
+    storage_name = Column(
+        String,
+        nullable=False,
+        unique=True,
+    )
+    expires_at = Column(
+        DateTime,
+        nullable=False,
+        index=True,
+    )
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.now,
+    )
+    updated_at = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+
+class CourseDirectoryEntryVersion(SQLAlchemyBaseModel, Mixin):
+    """
+    课程目录文件条目的历史版本模型类
+
+    关键帧版本的存储块是该版本的完整内容，其余版本的存储块是相对于上一个版本的二进制增量
+    """
+
+    __tablename__ = "course_directory_entry_versions"
+    id = Column(
+        BigInteger,
+        primary_key=True,
+        autoincrement=True,
+    )
+    course_directory_entry_id = Column(
+        BigInteger,
+        ForeignKey("course_directory_entries.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    version = Column(
+        Integer,
+        nullable=False,
+    )
+    author_id = Column(
+        BigInteger,
+        ForeignKey("users.id"),
+        nullable=False,
+        index=True,
+    )
+    keyframe = Column(
+        Boolean,
+        nullable=False,
+    )
+    storage_name = Column(
+        String,
+        nullable=False,
+        index=True,
+    )
+    # 该版本完整内容的字节数和 SHA-256 哈希值
+    size = Column(
+        BigInteger,
+        nullable=False,
+    )
+    content_hash = Column(
+        String,
+        nullable=False,
+    )
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.now,
+    )
+    __table_args__ = (
+        Index(
+            "idx__course_directory_entry_versions__course_directory_entry_id__version",
+            course_directory_entry_id,
+            version,
+            unique=True,
+        ),  # 同一条目的版本号唯一
+    )
 
 
 class CourseCollaborativeDirectoryEntry(SQLAlchemyBaseModel, Mixin):
@@ -338,6 +593,7 @@ class CourseCollaborativeDirectoryEntry(SQLAlchemyBaseModel, Mixin):
     storage_name = Column(
         String,
         nullable=False,
+        index=True,
     )
     created_at = Column(
         DateTime,
@@ -64,6 +64,102 @@ async def _create_pg_tables(
         await conn.commit()
 
 
+async def _migrate_pg_tables(
+    async_engine: AsyncEngine,
+    statements: List[str],
+):
+    """
+    对已存在的 PostgreSQL 数据库表格执行结构迁移
+
+    所有迁移语句都必须是幂等的，每次启动都会重新执行
+
+    参数:
+    - engine: AsyncEngine 对象
+    - statements: 要执行的迁移语句列表
+    """
+    async with async_engine.connect() as conn:
+        for statement in statements:
+            await conn.execute(text(statement))
+        await conn.commit()
+
+
+# 数据库结构迁移语句
+_MIGRATIONS = [
+    # 内容相同的文件共享存储块，存储名称不再唯一
+    "ALTER TABLE course_directory_entries DROP CONSTRAINT IF EXISTS course_directory_entries_storage_name_key",
+    "CREATE INDEX IF NOT EXISTS ix_course_directory_entries_storage_name ON course_directory_entries (storage_name)",
+    # 回收孤立存储内容时按存储名称查询引用
+    "CREATE INDEX IF NOT EXISTS ix_course_collaborative_directory_entries_storage_name ON course_collaborative_directory_entries (storage_name)",
+    # 同一目录下路径唯一，创建唯一索引前先删除并发上传产生的重复条目（保留最早的一条）
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'idx__course_directory_entries__course_directory_id__path') THEN
+            DELETE FROM course_directory_entries a
+            USING course_directory_entries b
+            WHERE a.course_directory_id = b.course_directory_id AND a.path = b.path AND a.id > b.id;
+        END IF;
+    END $$
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx__course_directory_entries__course_directory_id__path ON course_directory_entries (course_directory_id, path)",
+    # 按深度列出子条目
+    "CREATE INDEX IF NOT EXISTS idx__course_directory_entries__course_directory_id__depth__path ON course_directory_entries (course_directory_id, depth, path)",
+    # 路径的 ltree 表示，与 path_tree() 相同，每一级名称使用其 MD5 哈希值作为标签
+    "ALTER TABLE course_directory_entries ADD COLUMN IF NOT EXISTS path_tree ltree",
+    """
+    UPDATE course_directory_entries
+    SET path_tree = (
+        SELECT text2ltree(string_agg(md5(parts.part), '.' ORDER BY parts.ordinality))
+        FROM unnest(string_to_array(path, '/')) WITH ORDINALITY AS parts(part, ordinality)
+    )
+    WHERE path_tree IS NULL
+    """,
+    "ALTER TABLE course_directory_entries ALTER COLUMN path_tree SET NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx__course_directory_entries__path_tree ON course_directory_entries USING gist (path_tree)",
+    # 文件内容元数据，内容寻址存储的存储名称就是内容哈希值，可以直接回填；
+    # 其余文件（旧的随机存储名称和 MIME 类型）由 tools/course_directory_entry_backfill.py 回填
+    "ALTER TABLE course_directory_entries ADD COLUMN IF NOT EXISTS size BIGINT",
+    "ALTER TABLE course_directory_entries ADD COLUMN IF NOT EXISTS content_hash VARCHAR",
+    "ALTER TABLE course_directory_entries ADD COLUMN IF NOT EXISTS mime_type VARCHAR",
+    """
+    UPDATE course_directory_entries
+    SET size = storage_blobs.size, content_hash = storage_blobs.storage_name
+    FROM storage_blobs
+    WHERE course_directory_entries.storage_name = storage_blobs.storage_name
+        AND course_directory_entries.content_hash IS NULL
+        AND storage_blobs.size IS NOT NULL
+        AND storage_blobs.storage_name ~ '^[0-9a-f]{64}$'
+    """,
+    # 按实际引用重新计算存储块的引用计数（引用列与 storage/gc.py 的 STORAGE_GC_REFERENCES 一致），
+    # 旧的随机存储名称没有存储块记录，不登记的话第一次释放引用后就会被立即回收
+    """
+    INSERT INTO storage_blobs (storage_name, reference_count, created_at, updated_at)
+    SELECT refs.storage_name, count(*), now(), now()
+    FROM (
+        SELECT storage_name FROM course_directory_entries WHERE storage_name IS NOT NULL
+        UNION ALL
+        SELECT storage_name FROM course_directory_entry_versions
+        UNION ALL
+        SELECT storage_name FROM course_collaborative_directory_entries WHERE storage_name IS NOT NULL
+    ) AS refs
+    GROUP BY refs.storage_name
+    ON CONFLICT (storage_name) DO UPDATE
+    SET reference_count = EXCLUDED.reference_count, updated_at = now()
+    WHERE storage_blobs.reference_count <> EXCLUDED.reference_count
+    """,
+    """
+    UPDATE storage_blobs
+    SET reference_count = 0, updated_at = now()
+    WHERE reference_count > 0
+        AND NOT EXISTS (SELECT 1 FROM course_directory_entries WHERE course_directory_entries.storage_name = storage_blobs.storage_name)
+        AND NOT EXISTS (SELECT 1 FROM course_directory_entry_versions WHERE course_directory_entry_versions.storage_name = storage_blobs.storage_name)
+        AND NOT EXISTS (SELECT 1 FROM course_collaborative_directory_entries WHERE course_collaborative_directory_entries.storage_name = storage_blobs.storage_name)
+    """,
+    # 目录版本号与条目变更在同一个事务中增加，目录树快照和变更推送的序号都使用该版本号
+    "ALTER TABLE course_directories ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+]
+
+
 # 初始化数据库
 async def startup():
     """
@@ -77,8 +173,12 @@ async def startup():
     )
     await _create_pg_extensions(
         async_engine=async_engine,
-        extensions=["pg_trgm"],
+        extensions=["pg_trgm", "ltree"],
     )
     await _create_pg_tables(
         async_engine=async_engine,
     )
+    await _migrate_pg_tables(
+        async_engine=async_engine,
+        statements=_MIGRATIONS,
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import os.path
 from typing import Callable, Optional, List
 
@@ -90,7 +91,7 @@ def test_entry_post_success(
     user_token_default = store["user_token_default"]
     entry_post_success(user_token_default, entry_path_file, "file", "false", temp_file_path)
     storage_name = entry_get_success(user_token_default, entry_path_file)[0]["storage_name"]
-    assert os.path.exists(storage_path(storage_name))
+    assert os.path.exists(asyncio.run(storage_path(storage_name)))
     entry_post_success(user_token_default, entry_path_directory, "directory", "false")
 
 
@@ -314,7 +315,7 @@ def test_entry_delete_success_file(
     assert entry_path not in entry_paths
     assert path_first_n(entry_path, 2) in entry_paths
     assert path_first_n(entry_path, 1) in entry_paths
-    assert not os.path.exists(storage_path(storage_name))
+    assert not os.path.exists(asyncio.run(storage_path(storage_name)))
 
 
 @pytest.mark.dependency(depends=["test_entry_get_success"])
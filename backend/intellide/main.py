@@ -1,3 +1,4 @@
+import logging
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -5,11 +6,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from intellide.cache import startup as startup_cache
-from intellide.config import SERVER_HOST, SERVER_PORT
+from intellide.config import SERVER_HOST, SERVER_PORT, STORAGE_UPLOAD_MAX_REQUEST_SIZE
 from intellide.database import startup as startup_database
 from intellide.docker import startup as startup_docker
 from intellide.routers import router
 from intellide.storage import startup as startup_storage
+from intellide.tasks import startup as startup_tasks, shutdown as shutdown_tasks
+from intellide.utils.request import RequestSizeLimitMiddleware
 from intellide.utils.response import APIError, internal_server_error
 
 
@@ -21,9 +24,11 @@ async def lifespan(_: FastAPI):
     await startup_cache()
     await startup_database()
     await startup_storage()
+    await startup_tasks()
     # 程序运行
     yield
     # 程序结束
+    await shutdown_tasks()
 
 
 # 服务端主程序
@@ -38,6 +43,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 添加请求体大小限制中间件
+app.add_middleware(
+    RequestSizeLimitMiddleware,  # type: ignore
+    max_size=STORAGE_UPLOAD_MAX_REQUEST_SIZE,
+)
+
 app.include_router(router)
 
 
@@ -52,4 +63,8 @@ async def exception_handler(_, error: Exception):
 
 
 if __name__ == "__main__":
+    # 输出后台任务的运行日志，例如存储回收的结果
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
     uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)
@@ -7,6 +7,11 @@ from intellide.routers.course_collaborative_directory_entry import (
 )
 from intellide.routers.course_directory import api as course_directory_api
 from intellide.routers.course_directory_entry import api as course_directory_entry_api
+from intellide.routers.course_directory_entry import ws as course_directory_entry_ws
+from intellide.routers.course_directory_entry_upload import api as course_directory_entry_upload_api
+from intellide.routers.course_directory_entry_version import (
+    api as course_directory_entry_version_api,
+)
 from intellide.routers.course_student import api as course_student_api
 from intellide.routers.course_collaborative_directory_entry import (
     api as course_collaborative_directory_entry_api,
@@ -19,6 +24,7 @@ router_ws = APIRouter(prefix="/ws")
 
 router_ws.include_router(course_chat_ws)
 router_ws.include_router(course_collaborative_directory_entry_ws)
+router_ws.include_router(course_directory_entry_ws)
 
 # 创建 API 路由
 router_api = APIRouter(prefix="/api")
@@ -26,6 +32,8 @@ router_api = APIRouter(prefix="/api")
 router_api.include_router(course_api)
 router_api.include_router(course_directory_api)
 router_api.include_router(course_directory_entry_api)
+router_api.include_router(course_directory_entry_upload_api)
+router_api.include_router(course_directory_entry_version_api)
 router_api.include_router(course_collaborative_directory_entry_api)
 router_api.include_router(course_student_api)
 router_api.include_router(user_api)
@@ -1,44 +1,108 @@
-from typing import Dict, Sequence, Optional
-
-from fastapi import APIRouter, Depends, UploadFile, Form, File, HTTPException
+import asyncio
+import base64
+import hashlib
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Sequence, Optional, Tuple, Union
+
+from fastapi import APIRouter, Depends, UploadFile, Form, File, Header, HTTPException, Request
+from fastapi import WebSocket, WebSocketDisconnect, WebSocketException
 from pydantic import BaseModel
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-
-from intellide.database import database
+from sqlalchemy.sql.elements import ColumnElement
+
+from intellide.cache import (
+    cache_course_directory_changes_get,
+    cache_course_directory_changes_publish,
+    cache_course_directory_changes_set,
+    cache_course_directory_changes_subscribe,
+    cache_course_directory_tree_get,
+    cache_course_directory_tree_set,
+)
+from intellide.config import (
+    STORAGE_UPLOAD_MAX_FILE_SIZE,
+    STORAGE_ARCHIVE_MAX_MEMBERS,
+    STORAGE_ARCHIVE_MAX_TOTAL_SIZE,
+    COURSE_DIRECTORY_ENTRY_LIST_MAX_DEPTH,
+    COURSE_DIRECTORY_ENTRY_LIST_DEFAULT_LIMIT,
+    COURSE_DIRECTORY_ENTRY_LIST_MAX_LIMIT,
+    COURSE_DIRECTORY_ENTRY_BATCH_MAX_OPERATIONS,
+    COURSE_DIRECTORY_ENTRY_SYNC_MAX_MANIFEST_SIZE,
+    COURSE_DIRECTORY_ENTRY_VERSION_KEYFRAME_INTERVAL,
+    COURSE_DIRECTORY_ENTRY_VERSION_DELTA_MAX_SIZE,
+    COURSE_DIRECTORY_ENTRY_VERSION_DELTA_MAX_RATIO,
+    COURSE_DIRECTORY_ENTRY_CHANGES_MAX_RESUME,
+    COURSE_DIRECTORY_ENTRY_CHANGES_GAP_TIMEOUT,
+)
+from intellide.database import database, async_session_maker
 from intellide.database.model import (
-    CourseDirectoryPermission,
+    CourseDirectory,
     CourseDirectoryPermissionType,
     UserRole,
     CourseDirectoryEntry,
+    CourseDirectoryEntryVersion,
     EntryType,
+    Ltree,
 )
 from intellide.routers.course import (
     course_user_entry_info,
 )
 from intellide.storage import (
-    storage_name_create,
-    storage_write_file,
+    storage_archive_members,
+    storage_blob_create,
+    storage_blob_create_from_upload_file,
+    storage_spool_archive_member,
+    StorageArchiveMember,
+    storage_blob_reclaim_enqueue,
+    storage_blob_release,
     storage_get_file_response,
-    storage_remove_file,
+    storage_get_zip_response,
+    StorageZipItem,
+    StorageBlobInfo,
+    storage_blob_acquire,
+    storage_hash_stream,
+    storage_iterate,
+    storage_iterate_file,
+    storage_media_type,
+    storage_read_file,
 )
 from intellide.utils.auth import jwe_decode
+from intellide.utils.delta import delta_apply, delta_create
 from intellide.utils.path import (
     path_normalize,
     path_dir_base_name,
     path_iterate_parents,
     path_prefix,
+    path_tree,
+    path_tree_children,
 )
+from intellide.utils.permission import PermissionTrie, permission_trie
+from intellide.utils.websocket import WebSocketManager
 from intellide.utils.response import (
     forbidden,
     ok,
     bad_request,
     not_implemented,
+    payload_too_large,
+    precondition_failed,
+    internal_server_error,
     APIError,
 )
 
 # 创建课程路由前缀
 api = APIRouter(prefix="/course/directory/entry")
+ws = APIRouter(prefix="/course/directory")
+
+# 目录变更推送的连接，按 (课程目录ID, 用户角色) 分组
+manager = WebSocketManager()
+# 连接标识符到待发送变更队列的映射，每个连接由自己的发送任务按序号依次发送，慢的连接不会阻塞其他连接
+_course_directory_entry_changes_queues: Dict[Tuple[int, int], "asyncio.Queue[Optional[Dict]]"] = {}
 
 
 @api.post("")
@@ -76,29 +140,14 @@ async def course_directory_entry_post(
     if not path:
         return bad_request("Invalid path")
 
-    # 如果用户是学生，检查权限
-    if user_role == UserRole.STUDENT:
-        # 检查上一个存在的父目录的作者是否是当前用户
-        # 写在了check_if_skip_permission_check_for_upload函数中
-        if not await check_if_skip_permission_check_for_upload(db=db, path=path, course_directory_id=course_directory.id, user_id=user_id):
-            if not verify_permissions(
-                path_prefix(path),
-                course_directory.permission,
-                CourseDirectoryPermissionType.UPLOAD,
-            ):
-                return forbidden("No upload permission")
-
-    # 查询是否已存在相同路径的条目
-    result = await db.execute(
-        select(CourseDirectoryEntry).where(
-            CourseDirectoryEntry.course_directory_id == course_directory.id,
-            CourseDirectoryEntry.path == path,
-        )
+    # 检查上传权限以及条目是否已存在
+    await verify_course_directory_entry_upload(
+        db=db,
+        user_role=user_role,
+        user_id=user_id,
+        course_directory=course_directory,
+        path=path,
     )
-    course_directory_entry: CourseDirectoryEntry = result.scalar()
-    # 如果条目已存在，返回错误
-    if course_directory_entry:
-        return bad_request("Entry already exists")
 
     # 递归插入父目录
     await insert_course_directory_entry_parent_recursively(
@@ -110,17 +159,19 @@ async def course_directory_entry_post(
 
     # 如果上传了文件，创建文件条目
     if file is not None:
-        storage_name = storage_name_create()
-        await storage_write_file(
-            storage_name=storage_name,
-            content=await file.read(),
+        # 分块流式写入内容寻址存储，超过大小限制时中断
+        blob = await storage_blob_create_from_upload_file(
+            db=db,
+            file=file,
+            max_size=STORAGE_UPLOAD_MAX_FILE_SIZE,
+            file_name=path,
         )
         course_directory_entry = CourseDirectoryEntry(
             course_directory_id=course_directory.id,
             author_id=user_id,
             path=path,
             type=EntryType.FILE,
-            storage_name=storage_name,
+            **course_directory_entry_file_columns(path, blob),
         )
         db.add(course_directory_entry)
     # 如果没有上传文件，创建目录条目
@@ -133,14 +184,201 @@ async def course_directory_entry_post(
         )
         db.add(course_directory_entry)
 
-    # 提交数据库更改
-    await db.commit()
+    # 提交数据库更改，并发上传到相同路径时由唯一索引拒绝
+    changes = [
+        course_directory_entry_change(
+            CourseDirectoryEntryChangeType.CREATE, path, course_directory_entry.type, user_id
+        )
+    ]
+    try:
+        sequence = await record_course_directory_entry_changes(db, course_directory.id, changes)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return bad_request("Entry already exists")
     await db.refresh(course_directory_entry)
+    await publish_course_directory_entry_changes(course_directory.id, sequence, changes)
 
     # 返回新建条目的ID
     return ok(data={"course_directory_entry_id": course_directory_entry.id})
 
 
+@api.post("/archive")
+async def course_directory_entry_post_archive(
+    course_directory_id: int = Form(...),
+    path: str = Form("/"),
+    archive: UploadFile = File(...),
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    上传 zip/tar 压缩包并展开为指定目录下的课程目录条目
+
+    所有条目（包括缺失的父目录）在同一个事务中批量插入，
+    学生的上传权限对每个不同的父目录只检查一次
+
+    参数：
+        course_directory_id: 课程目录ID
+        path: 展开到的目录路径，"/" 或空字符串表示根目录
+        archive: 上传的压缩包
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        新建的文件条目和目录条目数量
+
+    异常：
+        APIError: 当压缩包无效、超过限制、用户没有权限或条目已存在时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取用户角色、课程、目录和条目信息
+    user_role, course, course_directory, __ = await course_user_entry_info(
+        db=db, course_directory_id=course_directory_id, user_id=user_id
+    )
+    # 规范化路径，空路径表示根目录
+    path = path_normalize(path or "/")
+
+    # 读取压缩包成员列表并计算目标路径
+    members = await asyncio.to_thread(storage_archive_members, archive.file)
+    if len(members) > STORAGE_ARCHIVE_MAX_MEMBERS:
+        return payload_too_large(
+            f"Archive contains more than {STORAGE_ARCHIVE_MAX_MEMBERS} members"
+        )
+    files: Dict[str, StorageArchiveMember] = {}
+    directories = set()
+    total_size = 0
+    for member in members:
+        member_path = path_normalize(f"{path}/{member.name}")
+        # 拒绝解压到目标目录之外的成员
+        if not member_path.startswith(f"{path}/"):
+            return bad_request(f"Invalid archive member path: {member.name}")
+        if member.is_dir:
+            directories.add(member_path)
+            continue
+        if member.size > STORAGE_UPLOAD_MAX_FILE_SIZE:
+            return payload_too_large(
+                f"Archive member {member.name} exceeds the maximum size of "
+                f"{STORAGE_UPLOAD_MAX_FILE_SIZE} bytes"
+            )
+        total_size += member.size
+        files[member_path] = member
+    if not files and not directories:
+        return bad_request("Archive is empty")
+    if total_size > STORAGE_ARCHIVE_MAX_TOTAL_SIZE:
+        return payload_too_large(
+            f"Archive exceeds the maximum total size of {STORAGE_ARCHIVE_MAX_TOTAL_SIZE} bytes"
+        )
+    for file_path in files:
+        directories.update(path_iterate_parents(file_path, include_self=False))
+    for directory in list(directories):
+        directories.update(path_iterate_parents(directory, include_self=False))
+    if files.keys() & directories:
+        return bad_request("Archive contains a file and a directory with the same path")
+
+    # 一次查询所有目标路径上已存在的条目
+    result = await db.execute(
+        select(CourseDirectoryEntry).where(
+            CourseDirectoryEntry.course_directory_id == course_directory.id,
+            CourseDirectoryEntry.path.in_(files.keys() | directories),
+        )
+    )
+    existing: Dict[str, CourseDirectoryEntry] = {
+        entry.path: entry for entry in result.scalars().all()
+    }
+    for entry_path, entry in existing.items():
+        if entry_path in files or entry.type != EntryType.DIRECTORY:
+            return bad_request(f"Entry already exists: {entry_path}")
+    new_directories = sorted(directories - existing.keys())
+
+    # 如果用户是学生，对每个不同的父目录检查一次上传权限
+    if user_role == UserRole.STUDENT:
+        for parent in {path_prefix(entry_path) for entry_path in [*files, *new_directories]}:
+            # 上一个存在的父目录的作者是当前用户时跳过权限检查
+            nearest = (
+                next(
+                    (
+                        existing[ancestor]
+                        for ancestor in path_iterate_parents(parent)
+                        if ancestor in existing
+                    ),
+                    None,
+                )
+                if parent
+                else None
+            )
+            if nearest is not None and nearest.author_id == user_id:
+                continue
+            if not verify_permissions(
+                parent,
+                course_directory,
+                CourseDirectoryPermissionType.UPLOAD,
+            ):
+                return forbidden(f"No upload permission for {parent}")
+
+    # 按压缩包内的顺序逐个成员解压到临时文件一次，再从临时文件写入内容寻址存储
+    blobs = {}
+    for file_path, member in files.items():
+        async with storage_spool_archive_member(member) as temp_path:
+            blobs[file_path] = await storage_blob_create(
+                db=db,
+                stream_factory=lambda temp_path=temp_path: storage_iterate_file(temp_path),
+                max_size=member.size,
+                file_name=file_path,
+            )
+
+    # 批量插入目录条目和文件条目，批量插入不会触发 ORM 事件，需要显式计算深度和层级路径
+    await insert_course_directory_entry_directories(
+        course_directory_id=course_directory.id,
+        user_id=user_id,
+        paths=new_directories,
+        db=db,
+    )
+    rows = [
+        {
+            "course_directory_id": course_directory.id,
+            "author_id": user_id,
+            "path": file_path,
+            "depth": file_path.count("/"),
+            "path_tree": path_tree(file_path),
+            "type": EntryType.FILE,
+            **course_directory_entry_file_columns(file_path, blob),
+        }
+        for file_path, blob in blobs.items()
+    ]
+    if rows:
+        await db.execute(insert(CourseDirectoryEntry), rows)
+
+    # 提交数据库更改，并发上传到相同路径时由唯一索引拒绝
+    changes = [
+        course_directory_entry_change(
+            CourseDirectoryEntryChangeType.CREATE, directory, EntryType.DIRECTORY, user_id
+        )
+        for directory in new_directories
+    ] + [
+        course_directory_entry_change(
+            CourseDirectoryEntryChangeType.CREATE, file_path, EntryType.FILE, user_id
+        )
+        for file_path in blobs
+    ]
+    try:
+        sequence = await record_course_directory_entry_changes(db, course_directory.id, changes)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return bad_request("Entry already exists")
+    await publish_course_directory_entry_changes(course_directory.id, sequence, changes)
+
+    # 返回新建的条目数量
+    return ok(
+        data={
+            "file_count": len(blobs),
+            "directory_count": len(new_directories),
+        }
+    )
+
+
 @api.get("")
 async def course_directory_entry_get(
     course_directory_id: int,
@@ -160,7 +398,8 @@ async def course_directory_entry_get(
         db: 数据库会话对象
 
     返回：
-        fuzzy=True时返回所有匹配的条目列表
+        fuzzy=True时返回所有匹配的条目列表，以及列表对应的目录版本号，
+        客户端可以从该版本号开始订阅目录变更
         fuzzy=False时返回精确匹配的单个条目
 
     异常：
@@ -177,32 +416,34 @@ async def course_directory_entry_get(
 
     # 如果是模糊匹配路径
     if fuzzy:
-        # 查询所有匹配的条目
-        result = await db.execute(
-            select(CourseDirectoryEntry).where(
-                CourseDirectoryEntry.course_directory_id == course_directory.id,
-                CourseDirectoryEntry.path.like(f"{path}%"),
-            )
-        )
-        course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
+        # 从目录树快照中查找所有匹配的条目，热门目录不需要查询数据库
+        version, course_directory_entries = await course_directory_entry_tree(course_directory, db)
+        course_directory_entries = [
+            course_directory_entry
+            for course_directory_entry in course_directory_entries
+            if course_directory_entry["path"].startswith(path)
+        ]
         if not course_directory_entries:
             return bad_request("No entries found")
         if role == UserRole.STUDENT:
-            allowed_entrys = []
-            # 检查每个条目的权限
-            for course_directory_entry in course_directory_entries:
-                if course_directory_entry.author_id == user_id or verify_permissions(
-                    course_directory_entry.path,
-                    course_directory.permission,
-                    CourseDirectoryPermissionType.READ,
-                ):
-                    allowed_entrys.append(course_directory_entry)
-            if not allowed_entrys:
+            # 快照不区分角色，在快照之上一次性检查所有条目的权限
+            allowed = verify_permissions_many(
+                [
+                    course_directory_entry["path"]
+                    for course_directory_entry in course_directory_entries
+                ],
+                course_directory,
+                CourseDirectoryPermissionType.READ,
+            )
+            course_directory_entries = [
+                course_directory_entry
+                for course_directory_entry, readable in zip(course_directory_entries, allowed)
+                if course_directory_entry["author_id"] == str(user_id) or readable
+            ]
+            if not course_directory_entries:
                 return bad_request("No read permission for all entries in result of fuzzy match")
-            # 返回所有匹配的条目列表
-            return ok(data=[course_directory_entry.dict() for course_directory_entry in allowed_entrys])
-        else:
-            return ok(data=[course_directory_entry.dict() for course_directory_entry in course_directory_entries])
+        # 返回所有匹配的条目列表
+        return ok(data=course_directory_entries, version=version)
     else:
         # 查询精确匹配的条目
         result = await db.execute(
@@ -219,7 +460,7 @@ async def course_directory_entry_get(
             if course_directory_entry.author_id != user_id:
                 if not verify_permissions(
                     course_directory_entry.path,
-                    course_directory.permission,
+                    course_directory,
                     CourseDirectoryPermissionType.READ,
                 ):
                     return forbidden("No read permission")
@@ -227,6 +468,113 @@ async def course_directory_entry_get(
         return ok(data=course_directory_entry.dict())
 
 
+class CourseDirectoryEntryListSort(str, Enum):
+    """
+    列出子条目时的排序字段
+    """
+
+    PATH = "path"
+    CREATED_AT = "created_at"
+    UPDATED_AT = "updated_at"
+
+
+@api.get("/list")
+async def course_directory_entry_list(
+    course_directory_id: int,
+    path: str = "/",
+    max_depth: int = 1,
+    sort: CourseDirectoryEntryListSort = CourseDirectoryEntryListSort.PATH,
+    descending: bool = False,
+    limit: int = COURSE_DIRECTORY_ENTRY_LIST_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    分页列出课程目录条目的子条目
+
+    只查询深度在 (父条目深度, 父条目深度 + max_depth] 之间的子条目，展开一个目录的开销
+    与子条目数量成正比，而不是与整个子树的大小成正比；分页使用 (排序字段, ID) 的游标
+
+    参数：
+        course_directory_id: 课程目录ID
+        path: 父条目路径，"/" 或空字符串表示根目录
+        max_depth: 相对于父条目的最大深度，1 表示只列出直接子条目
+        sort: 排序字段
+        descending: 是否降序排列
+        limit: 每页的最大条目数量
+        cursor: 上一页返回的游标（可选）
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        子条目列表和下一页的游标，没有下一页时游标为 None
+
+    异常：
+        APIError: 当参数无效或用户没有权限时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取用户角色、课程、目录和条目信息
+    role, course, course_directory, _ = await course_user_entry_info(
+        db=db, course_directory_id=course_directory_id, user_id=user_id
+    )
+
+    # 检查参数，空路径表示根目录
+    path = path_normalize(path or "/")
+    if not 1 <= max_depth <= COURSE_DIRECTORY_ENTRY_LIST_MAX_DEPTH:
+        return bad_request(
+            f"max_depth must be between 1 and {COURSE_DIRECTORY_ENTRY_LIST_MAX_DEPTH}"
+        )
+    if not 1 <= limit <= COURSE_DIRECTORY_ENTRY_LIST_MAX_LIMIT:
+        return bad_request(f"limit must be between 1 and {COURSE_DIRECTORY_ENTRY_LIST_MAX_LIMIT}")
+
+    # 按层级路径查询深度范围内的子条目
+    sort_column = getattr(CourseDirectoryEntry, sort.value)
+    query = select(CourseDirectoryEntry).where(
+        CourseDirectoryEntry.course_directory_id == course_directory.id,
+        CourseDirectoryEntry.path_tree.matches(path_tree_children(path, max_depth)),
+    )
+    # 学生只能看到有读取权限的条目，在数据库中过滤后再分页，每页都能取满 limit 条
+    if role == UserRole.STUDENT:
+        query = query.where(
+            verify_permissions_condition(
+                course_directory, user_id, CourseDirectoryPermissionType.READ
+            )
+        )
+    # 从游标之后继续查询
+    if cursor is not None:
+        cursor_value, cursor_id = course_directory_entry_list_cursor_decode(cursor, sort)
+        key = tuple_(sort_column, CourseDirectoryEntry.id)
+        query = query.where(
+            key < tuple_(cursor_value, cursor_id)
+            if descending
+            else key > tuple_(cursor_value, cursor_id)
+        )
+    if descending:
+        query = query.order_by(sort_column.desc(), CourseDirectoryEntry.id.desc())
+    else:
+        query = query.order_by(sort_column, CourseDirectoryEntry.id)
+    # 多查询一条用于判断是否还有下一页
+    result = await db.execute(query.limit(limit + 1))
+    course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
+    next_cursor = None
+    if len(course_directory_entries) > limit:
+        course_directory_entries = course_directory_entries[:limit]
+        last = course_directory_entries[-1]
+        next_cursor = course_directory_entry_list_cursor_encode(getattr(last, sort.value), last.id)
+
+    return ok(
+        data={
+            "entries": [
+                course_directory_entry.dict() for course_directory_entry in course_directory_entries
+            ],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
 @api.delete("")
 async def course_directory_entry_delete(
     course_directory_entry_id: int,
@@ -256,64 +604,65 @@ async def course_directory_entry_delete(
     if not course_directory_entry:
         return bad_request("Course directory entry not found")
 
-    # 如果用户是学生，检查权限
-    if role == UserRole.STUDENT:
-        if course_directory_entry.type == EntryType.FILE:
-            if course_directory_entry.author_id != user_id:
-                if not verify_permissions(
-                    course_directory_entry.path,
-                    course_directory.permission,
-                    CourseDirectoryPermissionType.DELETE,
-                ):
-                    return forbidden("No delete permission")
-        else:
-            # 删除文件夹需要检查文件夹内所有条目都有DELETE权限
-            # 如果有一个条目没有DELETE权限，则返回错误
-            result = await db.execute(
-                select(CourseDirectoryEntry).where(
-                    CourseDirectoryEntry.course_directory_id == course_directory.id,
-                    CourseDirectoryEntry.path.like(f"{course_directory_entry.path}%"),
-                )
-            )
-            course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
-            for course_directory_entry in course_directory_entries:
-                if course_directory_entry.author_id != user_id:
-                    if course_directory_entry.author_id != user_id:
-                        if not verify_permissions(
-                            course_directory_entry.path,
-                            course_directory.permission,
-                            CourseDirectoryPermissionType.DELETE,
-                        ):
-                            return forbidden("No delete permission for some entries in the directory")
+    # 检查删除权限
+    await verify_course_directory_entry_delete(
+        db=db,
+        user_role=role,
+        user_id=user_id,
+        course_directory=course_directory,
+        course_directory_entry=course_directory_entry,
+    )
+
     # 删除课程目录条目
-    await delete_course_directory_entry(course_directory_entry_id, db)
+    storage_names = await delete_course_directory_entry(course_directory_entry_id, db)
 
     # 提交数据库更改
+    changes = [
+        course_directory_entry_change(
+            CourseDirectoryEntryChangeType.DELETE,
+            course_directory_entry.path,
+            course_directory_entry.type,
+            user_id,
+        )
+    ]
+    sequence = await record_course_directory_entry_changes(db, course_directory.id, changes)
     await db.commit()
+    await publish_course_directory_entry_changes(course_directory.id, sequence, changes)
+
+    # 磁盘文件由后台队列批量删除，请求不需要等待
+    storage_blob_reclaim_enqueue(storage_names)
 
     # 返回成功响应
     return ok()
 
 
-@api.get("/download")
-async def course_directory_entry_download(
-    course_directory_entry_id: int,
+@api.put("/content")
+async def course_directory_entry_put_content(
+    course_directory_entry_id: int = Form(...),
+    file: UploadFile = File(...),
+    if_match: Optional[str] = Header(None),
     access_info: Dict = Depends(jwe_decode),
     db: AsyncSession = Depends(database),
 ):
     """
-    下载课程目录条目文件
+    原地覆盖文件条目的内容
+
+    新内容流式写入新的存储块，然后在锁住条目行的情况下替换存储名称和内容元数据，
+    条目ID保持不变；提供 If-Match 时只有当前内容哈希值匹配才会覆盖，旧存储块交给后台队列回收；
+    每次覆盖都会记录一个历史版本
 
     参数：
         course_directory_entry_id: 目录条目ID
+        file: 新的文件内容
+        if_match: If-Match 请求头，值为带引号的内容哈希值或 *（可选）
         access_info: 包含用户ID等信息的字典
         db: 数据库会话对象
 
     返回：
-        文件下载响应
+        条目ID和新的内容哈希值
 
     异常：
-        APIError: 当用户没有权限或条目不是文件时抛出
+        APIError: 当用户没有权限、条目不是文件或前提条件不满足时抛出
     """
     # 获取用户ID
     user_id = access_info["user_id"]
@@ -325,177 +674,1272 @@ async def course_directory_entry_download(
     if not course_directory_entry:
         return bad_request("Course directory entry not found")
 
+    # 如果条目不是文件类型，返回错误
+    if course_directory_entry.type != EntryType.FILE:
+        return bad_request("Course directory entry is not a file")
+
     # 如果用户是学生，检查权限
     if role == UserRole.STUDENT:
         if course_directory_entry.author_id != user_id:
             if not verify_permissions(
                 course_directory_entry.path,
-                course_directory.permission,
-                CourseDirectoryPermissionType.READ,
+                course_directory,
+                CourseDirectoryPermissionType.WRITE,
             ):
-                return forbidden("No read permission")
+                return forbidden("No write permission")
 
-    # 如果条目不是文件类型，抛出错误
-    if course_directory_entry.type != EntryType.FILE:
-        raise HTTPException(status_code=400, detail="Course directory entry is not a file")
+    # 写入新内容之前先检查一次前提条件，内容已经变化时不需要读取上传的文件
+    verify_course_directory_entry_if_match(if_match, course_directory_entry.content_hash)
 
-    # 获取文件名
-    _, file_name = path_dir_base_name(course_directory_entry.path)
+    # 在锁住条目行之前计算历史版本的增量
+    version_source = await prepare_course_directory_entry_version(course_directory_entry, file)
 
-    # 返回文件下载响应
-    return storage_get_file_response(course_directory_entry.storage_name, file_name)
+    # 分块流式写入内容寻址存储，超过大小限制时中断
+    path = course_directory_entry.path
+    blob = await storage_blob_create_from_upload_file(
+        db=db,
+        file=file,
+        max_size=STORAGE_UPLOAD_MAX_FILE_SIZE,
+        file_name=path,
+    )
 
+    # 锁住条目行后再次检查前提条件，并发的覆盖操作在这里串行化
+    result = await db.execute(
+        select(
+            CourseDirectoryEntry.author_id,
+            CourseDirectoryEntry.storage_name,
+            CourseDirectoryEntry.content_hash,
+            CourseDirectoryEntry.size,
+        )
+        .where(CourseDirectoryEntry.id == course_directory_entry_id)
+        .with_for_update()
+    )
+    current = result.one_or_none()
+    if current is None:
+        return bad_request("Course directory entry not found")
+    verify_course_directory_entry_if_match(if_match, current.content_hash)
 
-class CourseDirectoryEntryMoveRequest(BaseModel):
-    """
-    移动课程目录条目请求
+    # 记录新内容的历史版本
+    await insert_course_directory_entry_version(
+        db=db,
+        course_directory_entry_id=course_directory_entry_id,
+        user_id=user_id,
+        current=current,
+        blob=blob,
+        source=version_source,
+    )
 
-    属性：
-        course_directory_entry_id: 要移动的条目ID
-        dst_path: 目标路径
-    """
+    # 替换存储名称和内容元数据，并释放旧存储块的引用
+    await db.execute(
+        update(CourseDirectoryEntry)
+        .where(CourseDirectoryEntry.id == course_directory_entry_id)
+        .values(**course_directory_entry_file_columns(path, blob), updated_at=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+    await storage_blob_release(db, [current.storage_name])
 
-    course_directory_entry_id: int  # 要移动的条目ID
-    dst_path: str  # 目标路径
+    # 提交数据库更改
+    changes = [
+        course_directory_entry_change(
+            CourseDirectoryEntryChangeType.UPDATE, path, EntryType.FILE, user_id
+        )
+    ]
+    sequence = await record_course_directory_entry_changes(db, course_directory.id, changes)
+    await db.commit()
+    await publish_course_directory_entry_changes(course_directory.id, sequence, changes)
 
+    # 旧存储块不再被引用时由后台队列删除磁盘文件
+    storage_blob_reclaim_enqueue([current.storage_name])
 
-@api.put("/move")
-async def course_directory_entry_move(
-    request: CourseDirectoryEntryMoveRequest,
+    # 返回条目ID和新的内容哈希值
+    return ok(
+        data={
+            "course_directory_entry_id": course_directory_entry_id,
+            "content_hash": blob.storage_name,
+        }
+    )
+
+
+@api.get("/download")
+async def course_directory_entry_download(
+    course_directory_entry_id: int,
+    request: Request,
     access_info: Dict = Depends(jwe_decode),
     db: AsyncSession = Depends(database),
 ):
-    """移动课程目录条目
+    """
+    下载课程目录条目文件，支持 ETag/Last-Modified 条件请求和 Range 范围请求
 
     参数：
-        request: 包含条目ID和目标路径的请求对象
+        course_directory_entry_id: 目录条目ID
+        request: 请求对象，用于读取条件请求和范围请求的请求头
         access_info: 包含用户ID等信息的字典
         db: 数据库会话对象
 
     返回：
-        移动成功返回OK
+        文件下载响应
 
     异常：
-        APIError: 当用户没有权限或目标路径无效时抛出
+        APIError: 当用户没有权限或条目不是文件时抛出
     """
     # 获取用户ID
     user_id = access_info["user_id"]
-    # 规范化目标路径
-    request.dst_path = path_normalize(request.dst_path)
-    # 如果目标路径无效，返回错误
-    if not request.dst_path:
-        return bad_request("Invalid destination path")
 
     # 获取用户角色、课程、目录和条目信息
     role, course, course_directory, course_directory_entry = await course_user_entry_info(
-        db=db,
-        course_directory_entry_id=request.course_directory_entry_id,
-        user_id=user_id,
+        db=db, course_directory_entry_id=course_directory_entry_id, user_id=user_id
     )
 
+    # 如果条目不存在，返回错误
+    if not course_directory_entry:
+        return bad_request("Course directory entry not found")
+
     # 如果用户是学生，检查权限
     if role == UserRole.STUDENT:
         if course_directory_entry.author_id != user_id:
             if not verify_permissions(
                 course_directory_entry.path,
-                course_directory.permission,
-                CourseDirectoryPermissionType.DELETE,
-            ):
-                return forbidden("No delete permission")
-        if not await check_if_skip_permission_check_for_upload(
-            db=db,
-            path=request.dst_path,
-            course_directory_id=course_directory.id,
-            user_id=user_id,
-        ):
-            if not verify_permissions(
-                path_prefix(request.dst_path),
-                course_directory.permission,
-                CourseDirectoryPermissionType.UPLOAD,
+                course_directory,
+                CourseDirectoryPermissionType.READ,
             ):
-                return forbidden("No upload permission")
-    # 获取当前条目的根路径
-    root_path = course_directory_entry.path
+                return forbidden("No read permission")
 
-    # 递归插入目标路径的父目录
-    await insert_course_directory_entry_parent_recursively(
-        course_directory_id=course_directory.id,
-        user_id=user_id,
-        child=request.dst_path,
-        db=db,
-    )
+    # 如果条目不是文件类型，抛出错误
+    if course_directory_entry.type != EntryType.FILE:
+        raise HTTPException(status_code=400, detail="Course directory entry is not a file")
 
-    # 查询所有以根路径开头的条目
-    result = await db.execute(
-        select(CourseDirectoryEntry).where(
-            CourseDirectoryEntry.course_directory_id == course_directory.id,
-            CourseDirectoryEntry.path.like(f"{root_path}%"),
-        )
+    # 获取文件名
+    _, file_name = path_dir_base_name(course_directory_entry.path)
+
+    # 返回文件下载响应，内容哈希值在文件内容不变时保持不变，可以作为强 ETag；
+    # 已记录的大小和 MIME 类型不需要再读取文件
+    return await storage_get_file_response(
+        storage_name=course_directory_entry.storage_name,
+        file_name=file_name,
+        headers=request.headers,
+        etag=course_directory_entry.content_hash or course_directory_entry.storage_name,
+        last_modified=course_directory_entry.updated_at,
+        media_type=course_directory_entry.mime_type,
+        size=course_directory_entry.size,
     )
-    course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
 
-    # 更新每个条目的路径
-    for course_directory_entry in course_directory_entries:
-        course_directory_entry.path = request.dst_path + course_directory_entry.path[len(root_path) :]
 
-    # 提交数据库更改
-    await db.commit()
-    return ok()
+@api.get("/download/zip")
+async def course_directory_entry_download_zip(
+    course_directory_entry_id: int,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    以 ZIP 压缩包的形式流式下载课程目录条目及其所有子条目
 
+    压缩包边读取边生成，不写入临时文件；学生没有读取权限的子条目会被跳过
 
-async def insert_course_directory_entry_parent_recursively(
-    course_directory_id: int,
+    参数：
+        course_directory_entry_id: 目录条目ID
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        ZIP 压缩包下载响应
+
+    异常：
+        APIError: 当用户没有权限时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取用户角色、课程、目录和条目信息
+    role, course, course_directory, course_directory_entry = await course_user_entry_info(
+        db=db, course_directory_entry_id=course_directory_entry_id, user_id=user_id
+    )
+
+    # 如果条目不存在，返回错误
+    if not course_directory_entry:
+        return bad_request("Course directory entry not found")
+
+    # 如果用户是学生，检查条目本身的读取权限
+    if role == UserRole.STUDENT and course_directory_entry.author_id != user_id:
+        if not verify_permissions(
+            course_directory_entry.path,
+            course_directory,
+            CourseDirectoryPermissionType.READ,
+        ):
+            return forbidden("No read permission")
+
+    # 查询条目本身及其所有子条目，父目录排在子条目之前
+    query = select(CourseDirectoryEntry).where(
+        CourseDirectoryEntry.course_directory_id == course_directory.id,
+        CourseDirectoryEntry.path_tree.descendant_of(path_tree(course_directory_entry.path)),
+    )
+    # 如果用户是学生，没有读取权限的子条目在数据库中过滤掉
+    if role == UserRole.STUDENT:
+        query = query.where(
+            or_(
+                CourseDirectoryEntry.id == course_directory_entry.id,
+                verify_permissions_condition(
+                    course_directory, user_id, CourseDirectoryPermissionType.READ
+                ),
+            )
+        )
+    result = await db.execute(query.order_by(CourseDirectoryEntry.path))
+    course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
+
+    # 压缩包内的路径以条目本身的名称为根
+    root, root_name = path_dir_base_name(course_directory_entry.path)
+    items = [
+        StorageZipItem(
+            arcname=entry.path[len(root) + 1 :],
+            storage_name=entry.storage_name if entry.type == EntryType.FILE else None,
+            modified_at=entry.updated_at,
+        )
+        for entry in course_directory_entries
+    ]
+
+    # 压缩包在响应发送时生成，此时只需要已经查询出的条目信息
+    return await storage_get_zip_response(
+        file_name=f"{root_name}.zip",
+        items=items,
+    )
+
+
+class CourseDirectoryEntrySyncRequest(BaseModel):
+    """
+    同步课程目录条目请求
+
+    属性：
+        course_directory_id: 课程目录ID
+        manifest: 客户端已有条目的路径到内容哈希值的映射，目录的哈希值为 None
+    """
+
+    course_directory_id: int  # 课程目录ID
+    manifest: Dict[str, Optional[str]]  # 路径到内容哈希值的映射
+
+
+@api.post("/sync")
+async def course_directory_entry_sync(
+    request: CourseDirectoryEntrySyncRequest,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    根据客户端清单计算课程目录的增量变化
+
+    服务端只查询条目的路径、类型和上传时记录的内容哈希值，与客户端清单做集合运算，
+    客户端只需要下载新增和修改的文件
+
+    参数：
+        request: 包含课程目录ID和客户端清单的请求对象
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        新增、修改的条目列表（包含用于下载的条目ID）、删除的路径列表，以及目录的当前版本号
+
+    异常：
+        APIError: 当用户没有权限时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 检查清单大小
+    if len(request.manifest) > COURSE_DIRECTORY_ENTRY_SYNC_MAX_MANIFEST_SIZE:
+        return bad_request(
+            f"Manifest must contain at most {COURSE_DIRECTORY_ENTRY_SYNC_MAX_MANIFEST_SIZE} entries"
+        )
+
+    # 获取用户角色、课程、目录和条目信息
+    role, course, course_directory, _ = await course_user_entry_info(
+        db=db, course_directory_id=request.course_directory_id, user_id=user_id
+    )
+
+    # 版本号在授权查询时读取，之后查询的同步结果至少与该版本一样新
+    version = course_directory.version
+
+    # 只查询比较所需的列，学生的读取权限在数据库中过滤
+    query = select(
+        CourseDirectoryEntry.id,
+        CourseDirectoryEntry.path,
+        CourseDirectoryEntry.type,
+        CourseDirectoryEntry.content_hash,
+        CourseDirectoryEntry.size,
+    ).where(CourseDirectoryEntry.course_directory_id == course_directory.id)
+    if role == UserRole.STUDENT:
+        query = query.where(
+            verify_permissions_condition(
+                course_directory, user_id, CourseDirectoryPermissionType.READ
+            )
+        )
+    result = await db.execute(query)
+    entries = {row.path: row for row in result.all()}
+
+    # 集合运算得到新增、修改和删除的路径
+    manifest = request.manifest
+    added = entries.keys() - manifest.keys()
+    deleted = manifest.keys() - entries.keys()
+    changed = {
+        path
+        for path in entries.keys() & manifest.keys()
+        if entries[path].content_hash != manifest[path]
+    }
+
+    def entry_dict(path: str) -> Dict:
+        entry = entries[path]
+        return {
+            "course_directory_entry_id": entry.id,
+            "path": entry.path,
+            "type": str(entry.type),
+            "content_hash": entry.content_hash,
+            "size": entry.size,
+        }
+
+    return ok(
+        data={
+            "added": [entry_dict(path) for path in sorted(added)],
+            "changed": [entry_dict(path) for path in sorted(changed)],
+            "deleted": sorted(deleted),
+            "version": version,
+        }
+    )
+
+
+class CourseDirectoryEntryMoveRequest(BaseModel):
+    """
+    移动课程目录条目请求
+
+    属性：
+        course_directory_entry_id: 要移动的条目ID
+        dst_path: 目标路径
+    """
+
+    course_directory_entry_id: int  # 要移动的条目ID
+    dst_path: str  # 目标路径
+
+
+@api.put("/move")
+async def course_directory_entry_move(
+    request: CourseDirectoryEntryMoveRequest,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """移动课程目录条目
+
+    参数：
+        request: 包含条目ID和目标路径的请求对象
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        移动成功返回OK
+
+    异常：
+        APIError: 当用户没有权限或目标路径无效时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+    # 规范化目标路径
+    request.dst_path = path_normalize(request.dst_path)
+    # 如果目标路径无效，返回错误
+    if not request.dst_path:
+        return bad_request("Invalid destination path")
+
+    # 获取用户角色、课程、目录和条目信息
+    role, course, course_directory, course_directory_entry = await course_user_entry_info(
+        db=db,
+        course_directory_entry_id=request.course_directory_entry_id,
+        user_id=user_id,
+    )
+    # 如果条目不存在，返回错误
+    if not course_directory_entry:
+        return bad_request("Course directory entry not found")
+
+    # 移动条目本身及其所有子条目
+    change = course_directory_entry_change(
+        CourseDirectoryEntryChangeType.MOVE,
+        course_directory_entry.path,
+        course_directory_entry.type,
+        user_id,
+        dst_path=request.dst_path,
+    )
+    await move_course_directory_entry(
+        db=db,
+        user_role=role,
+        user_id=user_id,
+        course_directory=course_directory,
+        course_directory_entry=course_directory_entry,
+        dst_path=request.dst_path,
+    )
+
+    # 提交数据库更改，并发创建了相同路径的条目时由唯一索引拒绝
+    try:
+        sequence = await record_course_directory_entry_changes(db, course_directory.id, [change])
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return bad_request("Destination already exists")
+    await publish_course_directory_entry_changes(course_directory.id, sequence, [change])
+    return ok()
+
+
+class CourseDirectoryEntryBatchOperationType(str, Enum):
+    """
+    批量操作的操作类型
+    """
+
+    CREATE = "create"
+    MOVE = "move"
+    DELETE = "delete"
+
+
+class CourseDirectoryEntryBatchOperation(BaseModel):
+    """
+    批量操作中的单个操作
+
+    属性：
+        type: 操作类型
+        path: 条目路径，create 时为新建目录的路径，move 和 delete 时为要操作的条目路径
+        dst_path: 目标路径（仅 move）
+    """
+
+    type: CourseDirectoryEntryBatchOperationType  # 操作类型
+    path: str  # 条目路径
+    dst_path: Optional[str] = None  # 目标路径
+
+
+class CourseDirectoryEntryBatchRequest(BaseModel):
+    """
+    批量操作课程目录条目请求
+
+    属性：
+        course_directory_id: 课程目录ID
+        operations: 按顺序执行的操作列表
+    """
+
+    course_directory_id: int  # 课程目录ID
+    operations: List[CourseDirectoryEntryBatchOperation]  # 按顺序执行的操作列表
+
+
+@api.post("/batch")
+async def course_directory_entry_batch(
+    request: CourseDirectoryEntryBatchRequest,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    在一个事务中按顺序执行多个创建目录、移动和删除操作
+
+    只查询一次用户角色和目录信息，后面的操作可以看到前面操作的结果；
+    任何一个操作失败时回滚所有操作，错误响应中的 index 为失败操作的序号
+
+    参数：
+        request: 包含课程目录ID和操作列表的请求对象
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        与操作顺序一致的每个操作的结果列表
+
+    异常：
+        APIError: 当用户没有访问目录的权限时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 检查操作数量
+    if not 1 <= len(request.operations) <= COURSE_DIRECTORY_ENTRY_BATCH_MAX_OPERATIONS:
+        return bad_request(
+            "Number of operations must be between 1 and "
+            f"{COURSE_DIRECTORY_ENTRY_BATCH_MAX_OPERATIONS}"
+        )
+
+    # 获取用户角色、课程、目录和条目信息，所有操作共用一次授权查询
+    role, course, course_directory, _ = await course_user_entry_info(
+        db=db, course_directory_id=request.course_directory_id, user_id=user_id
+    )
+
+    # 按顺序执行所有操作，任何一个失败都回滚整个事务
+    results = []
+    storage_names = []
+    changes = []
+    for index, operation in enumerate(request.operations):
+        try:
+            result, released, change = await course_directory_entry_batch_operation(
+                db=db,
+                user_role=role,
+                user_id=user_id,
+                course_directory=course_directory,
+                operation=operation,
+            )
+        except APIError as error:
+            await db.rollback()
+            return error.response(index=index)
+        except IntegrityError:
+            await db.rollback()
+            return bad_request("Entry already exists", index=index)
+        results.append(result)
+        storage_names.extend(released)
+        changes.append(change)
+
+    # 提交数据库更改，并发创建了相同路径的条目时由唯一索引拒绝
+    try:
+        sequence = await record_course_directory_entry_changes(db, course_directory.id, changes)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return bad_request("Entry already exists")
+    await publish_course_directory_entry_changes(course_directory.id, sequence, changes)
+
+    # 磁盘文件由后台队列批量删除，请求不需要等待
+    storage_blob_reclaim_enqueue(storage_names)
+
+    # 返回每个操作的结果
+    return ok(data=results)
+
+
+async def course_directory_entry_batch_operation(
+    db: AsyncSession,
+    user_role: UserRole,
+    user_id: int,
+    course_directory: CourseDirectory,
+    operation: CourseDirectoryEntryBatchOperation,
+) -> Tuple[Dict, List[str], Dict]:
+    """
+    执行批量操作中的单个操作，不提交事务
+
+    参数：
+        db: 数据库会话对象
+        user_role: 用户角色
+        user_id: 用户ID
+        course_directory: 课程目录对象
+        operation: 要执行的操作
+
+    返回：
+        元组(操作结果, 被释放引用的存储名称列表, 目录变更)
+
+    异常：
+        APIError: 当参数无效或用户没有权限时抛出
+    """
+    # 规范化路径
+    path = path_normalize(operation.path)
+    # 如果路径无效，抛出错误
+    if not path:
+        raise APIError(bad_request, "Invalid path")
+
+    # 创建目录条目
+    if operation.type == CourseDirectoryEntryBatchOperationType.CREATE:
+        await verify_course_directory_entry_upload(
+            db=db,
+            user_role=user_role,
+            user_id=user_id,
+            course_directory=course_directory,
+            path=path,
+        )
+        await insert_course_directory_entry_parent_recursively(
+            course_directory_id=course_directory.id,
+            user_id=user_id,
+            child=path,
+            db=db,
+        )
+        course_directory_entry = CourseDirectoryEntry(
+            course_directory_id=course_directory.id,
+            author_id=user_id,
+            path=path,
+            type=EntryType.DIRECTORY,
+        )
+        db.add(course_directory_entry)
+        await db.flush()
+        change = course_directory_entry_change(
+            CourseDirectoryEntryChangeType.CREATE, path, EntryType.DIRECTORY, user_id
+        )
+        return {"course_directory_entry_id": course_directory_entry.id}, [], change
+
+    # 移动和删除操作按路径查询条目
+    result = await db.execute(
+        select(CourseDirectoryEntry).where(
+            CourseDirectoryEntry.course_directory_id == course_directory.id,
+            CourseDirectoryEntry.path == path,
+        )
+    )
+    course_directory_entry: CourseDirectoryEntry = result.scalar()
+    # 如果条目不存在，抛出错误
+    if not course_directory_entry:
+        raise APIError(bad_request, "Course directory entry not found")
+    course_directory_entry_id = course_directory_entry.id
+
+    # 移动条目本身及其所有子条目
+    if operation.type == CourseDirectoryEntryBatchOperationType.MOVE:
+        # 规范化目标路径
+        dst_path = path_normalize(operation.dst_path or "")
+        # 如果目标路径无效，抛出错误
+        if not dst_path:
+            raise APIError(bad_request, "Invalid destination path")
+        change = course_directory_entry_change(
+            CourseDirectoryEntryChangeType.MOVE,
+            path,
+            course_directory_entry.type,
+            user_id,
+            dst_path=dst_path,
+        )
+        await move_course_directory_entry(
+            db=db,
+            user_role=user_role,
+            user_id=user_id,
+            course_directory=course_directory,
+            course_directory_entry=course_directory_entry,
+            dst_path=dst_path,
+        )
+        storage_names = []
+
+    # 删除条目本身及其所有子条目
+    else:
+        await verify_course_directory_entry_delete(
+            db=db,
+            user_role=user_role,
+            user_id=user_id,
+            course_directory=course_directory,
+            course_directory_entry=course_directory_entry,
+        )
+        change = course_directory_entry_change(
+            CourseDirectoryEntryChangeType.DELETE, path, course_directory_entry.type, user_id
+        )
+        storage_names = await delete_course_directory_entry(course_directory_entry_id, db)
+
+    # 移动和删除使用不同步会话的批量语句，会话中已加载的条目可能已经过期，
+    # 清空会话使后续操作重新从数据库加载条目
+    db.expunge_all()
+    return {"course_directory_entry_id": course_directory_entry_id}, storage_names, change
+
+
+@ws.websocket("/{course_directory_id}/changes")
+async def course_directory_entry_changes(
+    websocket: WebSocket,
+    course_directory_id: int,
+    sequence: Optional[int] = None,
+    access_info: Dict = Depends(jwe_decode),
+):
+    """
+    订阅课程目录的条目变更
+
+    每次提交的创建、移动、删除和更新变更作为一条消息推送，消息的序号即提交后的目录版本号，
+    按序号连续递增发送，任何进程中提交的变更都会推送；学生只会收到有读取权限的变更，但序号保持连续。
+    提供 sequence 时先重放该序号之后的所有变更，重放不了时（落后太多或变更记录已过期）
+    发送 reset 消息，客户端需要重新列出目录并从列表返回的版本号重新订阅
+
+    参数：
+        websocket: WebSocket对象
+        course_directory_id: 课程目录ID
+        sequence: 客户端已经处理的最后一个序号（可选）
+        access_info: 包含用户ID等信息的字典
+    """
+    user_id = access_info["user_id"]
+    # 获取用户角色和目录信息，如果用户没有权限，关闭 WebSocket 连接；
+    # 订阅会长时间保持，授权查询使用单独的会话并立即归还数据库连接
+    try:
+        async with async_session_maker() as db:
+            role, course, course_directory, _ = await course_user_entry_info(
+                db=db, course_directory_id=course_directory_id, user_id=user_id
+            )
+    except APIError:
+        await websocket.close(code=1008)
+        return
+    # 接受 WebSocket 连接
+    try:
+        await websocket.accept()
+    except (WebSocketException, WebSocketDisconnect):
+        await websocket.close(code=1008)
+        return
+
+    # 同一个用户可以打开多个连接，学生的连接标识符包含用户ID用于过滤变更
+    keys = (course_directory_id, role)
+    identifier = (user_id, id(websocket))
+    # 先注册连接再读取当前序号，之后提交的变更都会进入该连接的队列，已经重放过的序号由发送任务跳过
+    queue: "asyncio.Queue[Optional[Dict]]" = asyncio.Queue(
+        maxsize=COURSE_DIRECTORY_ENTRY_CHANGES_MAX_RESUME
+    )
+    manager.add(keys=keys, identifier=identifier, websocket=websocket)
+    _course_directory_entry_changes_queues[identifier] = queue
+
+    sender = None
+    try:
+        async with async_session_maker() as db:
+            current = (
+                await db.execute(
+                    select(CourseDirectory.version).where(CourseDirectory.id == course_directory_id)
+                )
+            ).scalar_one()
+        # 先直接发送重放的变更，再启动发送任务发送队列中序号更大的变更
+        messages = []
+        if sequence is not None and sequence != current:
+            versions = list(range(sequence + 1, current + 1))
+            # 序号超过当前版本号说明缓存被清空过，同样需要重新列出目录
+            recorded = [None]
+            if versions and len(versions) <= COURSE_DIRECTORY_ENTRY_CHANGES_MAX_RESUME:
+                recorded = await cache_course_directory_changes_get(course_directory_id, versions)
+            if any(changes is None for changes in recorded):
+                messages.append({"type": "reset", "sequence": current})
+            else:
+                messages.extend(
+                    {
+                        "type": "changes",
+                        "sequence": version,
+                        "changes": (
+                            filter_course_directory_entry_changes(
+                                changes, course_directory, user_id
+                            )
+                            if role == UserRole.STUDENT
+                            else changes
+                        ),
+                    }
+                    for version, changes in zip(versions, recorded)
+                )
+        if not messages or messages[-1]["type"] != "reset":
+            messages.append({"type": "ready", "sequence": current})
+        for message in messages:
+            await websocket.send_json(message)
+        sender = asyncio.create_task(
+            send_course_directory_entry_changes(
+                websocket, queue, course_directory_id, role, user_id, current
+            )
+        )
+
+        # 客户端不需要发送消息，接收循环只用于检测连接断开
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    except (WebSocketDisconnect, WebSocketException):
+        pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+        _course_directory_entry_changes_queues.pop(identifier, None)
+        manager.remove(keys=keys, identifier=identifier)
+
+
+async def verify_course_directory_entry_delete(
+    db: AsyncSession,
+    user_role: UserRole,
+    user_id: int,
+    course_directory: CourseDirectory,
+    course_directory_entry: CourseDirectoryEntry,
+) -> None:
+    """
+    检查用户是否可以删除指定条目
+
+    参数：
+        db: 数据库会话对象
+        user_role: 用户角色
+        user_id: 用户ID
+        course_directory: 课程目录对象
+        course_directory_entry: 要删除的条目
+
+    异常：
+        APIError: 当用户没有删除权限时抛出
+    """
+    # 如果用户是学生，检查权限
+    if user_role == UserRole.STUDENT:
+        if course_directory_entry.type == EntryType.FILE:
+            if course_directory_entry.author_id != user_id:
+                if not verify_permissions(
+                    course_directory_entry.path,
+                    course_directory,
+                    CourseDirectoryPermissionType.DELETE,
+                ):
+                    raise APIError(forbidden, "No delete permission")
+        else:
+            # 删除文件夹需要检查文件夹内所有条目都有DELETE权限
+            # 如果有一个条目没有DELETE权限，则抛出错误
+            result = await db.execute(
+                select(CourseDirectoryEntry).where(
+                    CourseDirectoryEntry.course_directory_id == course_directory.id,
+                    CourseDirectoryEntry.path_tree.descendant_of(
+                        path_tree(course_directory_entry.path)
+                    ),
+                )
+            )
+            course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
+            allowed = verify_permissions_many(
+                [entry.path for entry in course_directory_entries],
+                course_directory,
+                CourseDirectoryPermissionType.DELETE,
+            )
+            for entry, deletable in zip(course_directory_entries, allowed):
+                if entry.author_id != user_id and not deletable:
+                    raise APIError(
+                        forbidden, "No delete permission for some entries in the directory"
+                    )
+
+
+async def move_course_directory_entry(
+    db: AsyncSession,
+    user_role: UserRole,
+    user_id: int,
+    course_directory: CourseDirectory,
+    course_directory_entry: CourseDirectoryEntry,
+    dst_path: str,
+) -> None:
+    """
+    检查权限并移动条目本身及其所有子条目，不提交事务
+
+    参数：
+        db: 数据库会话对象
+        user_role: 用户角色
+        user_id: 用户ID
+        course_directory: 课程目录对象
+        course_directory_entry: 要移动的条目
+        dst_path: 规范化后的目标路径
+
+    异常：
+        APIError: 当用户没有权限或目标路径无效时抛出
+    """
+    # 一次查询目标路径上的条目和目标路径上一个存在的父目录
+    dst_entry, dst_nearest_ancestor = await query_course_directory_entry_nearest_ancestor(
+        db=db,
+        course_directory_id=course_directory.id,
+        path=dst_path,
+    )
+
+    # 如果用户是学生，检查权限
+    if user_role == UserRole.STUDENT:
+        if course_directory_entry.author_id != user_id:
+            if not verify_permissions(
+                course_directory_entry.path,
+                course_directory,
+                CourseDirectoryPermissionType.DELETE,
+            ):
+                raise APIError(forbidden, "No delete permission")
+        if not check_if_skip_permission_check_for_upload(
+            nearest_ancestor=dst_nearest_ancestor, user_id=user_id
+        ):
+            if not verify_permissions(
+                path_prefix(dst_path),
+                course_directory,
+                CourseDirectoryPermissionType.UPLOAD,
+            ):
+                raise APIError(forbidden, "No upload permission")
+    # 获取当前条目的根路径
+    root_path = course_directory_entry.path
+    # 不能移动到自身或自身的子树中
+    if dst_path == root_path or dst_path.startswith(f"{root_path}/"):
+        raise APIError(bad_request, "Cannot move an entry into itself")
+
+    # 目标路径已存在时拒绝移动
+    if dst_entry is not None:
+        raise APIError(bad_request, "Destination already exists")
+
+    # 递归插入目标路径的父目录
+    await insert_course_directory_entry_parent_recursively(
+        course_directory_id=course_directory.id,
+        user_id=user_id,
+        child=dst_path,
+        db=db,
+    )
+
+    # 在一条 UPDATE 语句中改写条目本身及其所有子条目的路径前缀、深度和层级路径，
+    # 子树按层级路径匹配，不会误匹配 src2 这样的同级条目
+    await db.execute(
+        update(CourseDirectoryEntry)
+        .where(
+            CourseDirectoryEntry.course_directory_id == course_directory.id,
+            CourseDirectoryEntry.path_tree.descendant_of(path_tree(root_path)),
+        )
+        .values(
+            path=func.concat(dst_path, func.substr(CourseDirectoryEntry.path, len(root_path) + 1)),
+            depth=CourseDirectoryEntry.depth + (dst_path.count("/") - root_path.count("/")),
+            path_tree=case(
+                (CourseDirectoryEntry.path == root_path, literal(path_tree(dst_path), Ltree)),
+                else_=literal(path_tree(dst_path), Ltree).concat(
+                    func.subpath(CourseDirectoryEntry.path_tree, root_path.count("/") + 1)
+                ),
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def verify_course_directory_entry_upload(
+    db: AsyncSession,
+    user_role: UserRole,
+    user_id: int,
+    course_directory: CourseDirectory,
+    path: str,
+) -> None:
+    """
+    检查用户是否可以在指定路径上传新的条目
+
+    参数：
+        db: 数据库会话对象
+        user_role: 用户角色
+        user_id: 用户ID
+        course_directory: 课程目录对象
+        path: 规范化后的条目路径
+
+    异常：
+        APIError: 当用户没有上传权限或条目已存在时抛出
+    """
+    # 一次查询相同路径的条目和上一个存在的父目录
+    course_directory_entry, nearest_ancestor = await query_course_directory_entry_nearest_ancestor(
+        db=db,
+        course_directory_id=course_directory.id,
+        path=path,
+    )
+
+    # 如果用户是学生，检查权限
+    if user_role == UserRole.STUDENT:
+        # 检查上一个存在的父目录的作者是否是当前用户
+        # 写在了check_if_skip_permission_check_for_upload函数中
+        if not check_if_skip_permission_check_for_upload(
+            nearest_ancestor=nearest_ancestor, user_id=user_id
+        ):
+            if not verify_permissions(
+                path_prefix(path),
+                course_directory,
+                CourseDirectoryPermissionType.UPLOAD,
+            ):
+                raise APIError(forbidden, "No upload permission")
+
+    # 如果条目已存在，返回错误
+    if course_directory_entry is not None:
+        raise APIError(bad_request, "Entry already exists")
+
+
+async def insert_course_directory_entry_parent_recursively(
+    course_directory_id: int,
+    user_id: int,
+    child: str,
+    db: AsyncSession,
+    commit: bool = False,
+) -> None:
+    """
+    递归插入课程目录的父目录
+
+    所有父目录在一条多行 INSERT ... ON CONFLICT DO NOTHING 语句中插入，
+    已存在的父目录由 (course_directory_id, path) 唯一索引跳过，并发上传也不会产生重复条目
+
+    参数：
+        course_directory_id: 课程目录ID
+        child: 子目录路径
+        db: 数据库会话对象
+        commit: 是否自动提交事务
+    """
+    await insert_course_directory_entry_directories(
+        course_directory_id=course_directory_id,
+        user_id=user_id,
+        paths=path_iterate_parents(child, include_self=False),
+        db=db,
+    )
+    # 如果需要提交事务，则提交数据库更改
+    if commit:
+        changes = [
+            course_directory_entry_change(
+                CourseDirectoryEntryChangeType.CREATE, parent, EntryType.DIRECTORY, user_id
+            )
+            for parent in sorted(path_iterate_parents(child, include_self=False))
+        ]
+        sequence = await record_course_directory_entry_changes(db, course_directory_id, changes)
+        await db.commit()
+        await publish_course_directory_entry_changes(course_directory_id, sequence, changes)
+
+
+def verify_course_directory_entry_if_match(
+    if_match: Optional[str],
+    content_hash: Optional[str],
+) -> None:
+    """
+    检查 If-Match 请求头是否与条目当前的内容哈希值匹配，使用强比较
+
+    参数：
+        if_match: If-Match 请求头（可选），不提供时总是满足
+        content_hash: 条目当前的内容哈希值
+
+    异常：
+        APIError: 当前提条件不满足时抛出
+    """
+    if if_match is None:
+        return
+    candidates = [candidate.strip() for candidate in if_match.split(",")]
+    if "*" in candidates or (content_hash and f'"{content_hash}"' in candidates):
+        return
+    raise APIError(precondition_failed, "Content has been modified")
+
+
+class CourseDirectoryEntryVersionSource(NamedTuple):
+    """
+    在锁住条目行之前根据条目当前内容准备的版本信息
+
+    属性：
+        storage_name: 准备时条目当前内容的存储名称
+        content_hash: 当前内容的哈希值
+        size: 当前内容的字节数
+        delta: 新内容相对于当前内容的增量，需要保存关键帧时为 None
+    """
+
+    storage_name: str
+    content_hash: str
+    size: int
+    delta: Optional[bytes]
+
+
+async def prepare_course_directory_entry_version(
+    course_directory_entry: CourseDirectoryEntry,
+    file: UploadFile,
+) -> CourseDirectoryEntryVersionSource:
+    """
+    在锁住条目行之前读取条目当前内容的元数据，并计算新内容相对于当前内容的增量
+
+    读取内容和计算增量都比较耗时，放在锁外进行，避免并发的覆盖操作长时间等待条目行的锁
+
+    参数：
+        course_directory_entry: 条目对象
+        file: 上传的新内容
+
+    返回：
+        版本准备信息，文件过大、大小未知或增量不够小时不包含增量
+    """
+    content_hash, size = course_directory_entry.content_hash, course_directory_entry.size
+    # 还没有回填内容元数据的旧条目需要读取一次内容
+    if content_hash is None or size is None:
+        content_hash, size = await storage_hash_stream(
+            storage_iterate(course_directory_entry.storage_name)
+        )
+    delta = None
+    if (
+        file.size is not None
+        and max(file.size, size) <= COURSE_DIRECTORY_ENTRY_VERSION_DELTA_MAX_SIZE
+    ):
+        source = await storage_read_file(course_directory_entry.storage_name)
+        target = await file.read()
+        await file.seek(0)
+        delta = await asyncio.to_thread(delta_create, source, target)
+        if len(delta) > len(target) * COURSE_DIRECTORY_ENTRY_VERSION_DELTA_MAX_RATIO:
+            delta = None
+    return CourseDirectoryEntryVersionSource(
+        course_directory_entry.storage_name, content_hash, size, delta
+    )
+
+
+async def insert_course_directory_entry_version(
+    db: AsyncSession,
+    course_directory_entry_id: int,
+    user_id: int,
+    current: Row,
+    blob: StorageBlobInfo,
+    source: CourseDirectoryEntryVersionSource,
+) -> None:
+    """
+    为文件条目的新内容插入一个历史版本
+
+    第一次修改内容时先把修改前的内容记录为第一个版本；新版本与上一个版本（即条目当前的内容）
+    之间的二进制增量足够小时只保存增量，每隔固定数量的版本、文件过大或增量过大时保存完整内容的关键帧。
+    增量由 prepare_course_directory_entry_version 在锁外计算，这里只写入记录；调用方需要持有条目行的锁
+
+    参数：
+        db: 数据库会话对象
+        course_directory_entry_id: 条目ID
+        user_id: 新内容的作者ID
+        current: 条目当前的作者ID、存储名称、内容哈希值和大小
+        blob: 新内容的存储块信息
+        source: 锁外准备的版本信息
+    """
+    # 准备之后条目内容被并发修改时，增量和元数据都已经过期，保存关键帧
+    if current.storage_name != source.storage_name:
+        content_hash, size = await storage_hash_stream(storage_iterate(current.storage_name))
+        source = CourseDirectoryEntryVersionSource(current.storage_name, content_hash, size, None)
+
+    # 查询最新版本号和最新关键帧的版本号
+    result = await db.execute(
+        select(
+            func.max(CourseDirectoryEntryVersion.version),
+            func.max(
+                case((CourseDirectoryEntryVersion.keyframe, CourseDirectoryEntryVersion.version))
+            ),
+        ).where(CourseDirectoryEntryVersion.course_directory_entry_id == course_directory_entry_id)
+    )
+    latest_version, keyframe_version = result.one()
+    storage_names = []
+
+    # 第一次修改内容时，把修改前的内容记录为第一个版本
+    if latest_version is None:
+        db.add(
+            CourseDirectoryEntryVersion(
+                course_directory_entry_id=course_directory_entry_id,
+                version=1,
+                author_id=current.author_id,
+                keyframe=True,
+                storage_name=source.storage_name,
+                size=source.size,
+                content_hash=source.content_hash,
+            )
+        )
+        storage_names.append(source.storage_name)
+        latest_version = keyframe_version = 1
+    version = latest_version + 1
+
+    # 距离上一个关键帧足够远或没有可用的增量时保存关键帧
+    keyframe = (
+        source.delta is None
+        or version - keyframe_version >= COURSE_DIRECTORY_ENTRY_VERSION_KEYFRAME_INTERVAL
+    )
+    if keyframe:
+        # 关键帧与条目共享新内容的存储块
+        storage_name = blob.storage_name
+        storage_names.append(storage_name)
+    else:
+
+        async def delta_stream() -> AsyncIterator[bytes]:
+            yield source.delta
+
+        storage_name = (await storage_blob_create(db=db, stream_factory=delta_stream)).storage_name
+    db.add(
+        CourseDirectoryEntryVersion(
+            course_directory_entry_id=course_directory_entry_id,
+            version=version,
+            author_id=user_id,
+            keyframe=keyframe,
+            storage_name=storage_name,
+            size=blob.size,
+            content_hash=blob.storage_name,
+        )
+    )
+    await storage_blob_acquire(db, storage_names)
+
+
+async def read_course_directory_entry_version(
+    db: AsyncSession,
+    course_directory_entry_id: int,
+    version: int,
+) -> Tuple[CourseDirectoryEntryVersion, bytes]:
+    """
+    还原文件条目某个历史版本的完整内容
+
+    从不晚于该版本的最近一个关键帧开始依次应用增量
+
+    参数：
+        db: 数据库会话对象
+        course_directory_entry_id: 条目ID
+        version: 版本号
+
+    返回：
+        元组(版本记录, 完整内容)
+
+    异常：
+        APIError: 当版本不存在或还原的内容与记录不一致时抛出
+    """
+    keyframe_version = (
+        select(func.max(CourseDirectoryEntryVersion.version))
+        .where(
+            CourseDirectoryEntryVersion.course_directory_entry_id == course_directory_entry_id,
+            CourseDirectoryEntryVersion.version <= version,
+            CourseDirectoryEntryVersion.keyframe,
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(CourseDirectoryEntryVersion)
+        .where(
+            CourseDirectoryEntryVersion.course_directory_entry_id == course_directory_entry_id,
+            CourseDirectoryEntryVersion.version.between(keyframe_version, version),
+        )
+        .order_by(CourseDirectoryEntryVersion.version)
+    )
+    chain: Sequence[CourseDirectoryEntryVersion] = result.scalars().all()
+    if not chain or chain[-1].version != version:
+        raise APIError(bad_request, "Version not found")
+    content = await storage_read_file(chain[0].storage_name)
+    for course_directory_entry_version in chain[1:]:
+        delta = await storage_read_file(course_directory_entry_version.storage_name)
+        content = await asyncio.to_thread(delta_apply, content, delta)
+    if hashlib.sha256(content).hexdigest() != chain[-1].content_hash:
+        raise APIError(internal_server_error, "Version content is corrupted")
+    return chain[-1], content
+
+
+def course_directory_entry_file_columns(
+    path: str,
+    blob: StorageBlobInfo,
+) -> Dict:
+    """
+    获取文件条目的存储名称和内容元数据列
+
+    内容在写入存储块时已经计算过哈希值和大小，这里只推断 MIME 类型
+
+    参数：
+        path: 文件路径
+        blob: 存储块信息
+
+    返回：
+        可以直接用于创建条目的列值字典
+    """
+    return {
+        "storage_name": blob.storage_name,
+        "size": blob.size,
+        "content_hash": blob.storage_name,
+        "mime_type": storage_media_type(path),
+    }
+
+
+async def insert_course_directory_entry_directories(
+    course_directory_id: int,
     user_id: int,
-    child: str,
+    paths: Iterable[str],
     db: AsyncSession,
-    commit: bool = False,
 ) -> None:
     """
-    递归插入课程目录的父目录
+    批量插入目录条目，已存在的路径会被跳过
+
+    批量插入不会触发 ORM 事件，需要显式计算深度和层级路径
 
     参数：
         course_directory_id: 课程目录ID
-        child: 子目录路径
+        user_id: 用户ID
+        paths: 目录路径
         db: 数据库会话对象
-        commit: 是否自动提交事务
     """
-    # 遍历子目录路径的所有父目录
-    for path in path_iterate_parents(child, include_self=False):
-        # 查询当前父目录是否已存在
-        result = await db.execute(
-            select(CourseDirectoryEntry).where(
-                CourseDirectoryEntry.course_directory_id == course_directory_id,
-                CourseDirectoryEntry.path == path,
-            )
+    rows = [
+        {
+            "course_directory_id": course_directory_id,
+            "author_id": user_id,
+            "path": path,
+            "depth": path.count("/"),
+            "path_tree": path_tree(path),
+            "type": EntryType.DIRECTORY,
+        }
+        for path in paths
+    ]
+    if not rows:
+        return
+    await db.execute(
+        pg_insert(CourseDirectoryEntry)
+        .values(rows)
+        .on_conflict_do_nothing(
+            index_elements=[
+                CourseDirectoryEntry.course_directory_id,
+                CourseDirectoryEntry.path,
+            ]
         )
-        # 如果父目录不存在，则创建新的目录条目
-        if result.scalar() is None:
-            db.add(
-                CourseDirectoryEntry(
-                    course_directory_id=course_directory_id,
-                    author_id=user_id,
-                    path=path,
-                    type=EntryType.DIRECTORY,
-                )
-            )
-    # 如果需要提交事务，则提交数据库更改
-    if commit:
-        await db.commit()
+    )
 
 
 async def delete_course_directory_entry(
     course_directory_entry_id: int,
     db: AsyncSession,
     commit: bool = False,
-):
+) -> List[str]:
     """
     删除课程目录条目
 
+    条目本身及其所有子条目在一条 DELETE ... RETURNING 语句中删除，
+    同时在事务中释放文件的存储块引用；磁盘文件的删除交给后台队列批量处理，
+    调用者需要在提交事务后将返回的存储名称加入回收队列
+
     参数：
         course_directory_entry_id: 目录条目ID
         db: 数据库会话对象
         commit: 是否自动提交事务
 
+    返回：
+        被删除的文件条目的存储名称列表
+
     异常：
         APIError: 当条目不存在或类型未实现时抛出
     """
@@ -507,102 +1951,561 @@ async def delete_course_directory_entry(
     if not course_directory_entry:
         raise APIError(bad_request, "Course directory entry not found")
 
-    # 如果条目是文件类型，删除存储中的文件并删除数据库记录
+    # 如果条目是文件类型，只删除条目本身
     if course_directory_entry.type == EntryType.FILE:
-        await storage_remove_file(course_directory_entry.storage_name)  # 删除存储中的文件
-        await db.delete(course_directory_entry)  # 删除数据库记录
+        condition = CourseDirectoryEntry.id == course_directory_entry.id
 
-    # 如果条目是目录类型，删除目录及其所有子条目
+    # 如果条目是目录类型，删除目录及其所有子条目，子条目按层级路径匹配
     elif course_directory_entry.type == EntryType.DIRECTORY:
-        path = course_directory_entry.path
-        result = await db.execute(
-            select(CourseDirectoryEntry).where(
-                CourseDirectoryEntry.course_directory_id == course_directory_entry.course_directory_id,
-                CourseDirectoryEntry.path.like(f"{path}%"),
-            )
+        condition = and_(
+            CourseDirectoryEntry.course_directory_id == course_directory_entry.course_directory_id,
+            CourseDirectoryEntry.path_tree.descendant_of(path_tree(course_directory_entry.path)),
         )
-        # 删除所有匹配的子条目
-        for entry in result.scalars().all():
-            await db.delete(entry)
 
     # 如果条目类型未实现，抛出错误
     else:
         raise APIError(not_implemented, "Not implemented")
 
+    # 历史版本随条目一起删除，先取出其存储名称以释放引用
+    result = await db.execute(
+        delete(CourseDirectoryEntryVersion)
+        .where(
+            CourseDirectoryEntryVersion.course_directory_entry_id.in_(
+                select(CourseDirectoryEntry.id).where(condition)
+            )
+        )
+        .returning(CourseDirectoryEntryVersion.storage_name)
+        .execution_options(synchronize_session=False)
+    )
+    storage_names = list(result.scalars().all())
+    result = await db.execute(
+        delete(CourseDirectoryEntry)
+        .where(condition)
+        .returning(CourseDirectoryEntry.storage_name)
+        .execution_options(synchronize_session=False)
+    )
+    storage_names.extend(storage_name for storage_name in result.scalars().all() if storage_name)
+    # 释放所有文件的存储块引用
+    await storage_blob_release(db, storage_names)
+
     # 如果需要提交事务，提交数据库更改
     if commit:
         await db.commit()
+    return storage_names
+
+
+async def course_directory_entry_tree(
+    course_directory: CourseDirectory,
+    db: AsyncSession,
+) -> Tuple[int, List[Dict]]:
+    """
+    获取课程目录的目录树快照
+
+    快照按目录版本号缓存，条目被创建、移动、删除或更新时版本号在同一个事务中增加，旧快照随之失效；
+    缓存命中时不查询数据库。没有缓存时在同一条语句中查询版本号和条目，快照总是与其版本号一致
+
+    参数:
+        course_directory: 课程目录对象，版本号在授权查询时读取
+        db: 数据库会话对象
+
+    返回:
+        元组(目录版本号, 按路径排序的所有条目字典列表)
+    """
+    version = course_directory.version
+    course_directory_entries = await cache_course_directory_tree_get(course_directory.id, version)
+    if course_directory_entries is None:
+        result = await db.execute(
+            select(CourseDirectory.version, CourseDirectoryEntry)
+            .select_from(CourseDirectory)
+            .outerjoin(
+                CourseDirectoryEntry, CourseDirectoryEntry.course_directory_id == CourseDirectory.id
+            )
+            .where(CourseDirectory.id == course_directory.id)
+            .order_by(CourseDirectoryEntry.path)
+        )
+        rows = result.all()
+        if rows:
+            version = rows[0].version
+        course_directory_entries = [
+            course_directory_entry.dict()
+            for _, course_directory_entry in rows
+            if course_directory_entry is not None
+        ]
+        await cache_course_directory_tree_set(
+            course_directory.id, version, course_directory_entries
+        )
+    return version, course_directory_entries
+
+
+class CourseDirectoryEntryChangeType(str, Enum):
+    """
+    目录变更的类型
+    """
+
+    CREATE = "create"
+    MOVE = "move"
+    DELETE = "delete"
+    UPDATE = "update"
+
+
+def course_directory_entry_change(
+    change_type: CourseDirectoryEntryChangeType,
+    path: str,
+    entry_type: EntryType,
+    author_id: int,
+    dst_path: Optional[str] = None,
+) -> Dict:
+    """
+    构造一个目录变更
+
+    创建变更隐含了缺失的父目录，移动和删除变更包含条目的所有子条目
+
+    参数:
+        change_type: 变更类型
+        path: 条目路径，移动时为原路径
+        entry_type: 条目类型
+        author_id: 执行变更的用户ID
+        dst_path: 目标路径（仅移动）
+
+    返回:
+        可以序列化为 JSON 的变更字典
+    """
+    change = {
+        "type": change_type.value,
+        "path": path,
+        "entry_type": str(entry_type),
+        "author_id": str(author_id),
+    }
+    if dst_path is not None:
+        change["dst_path"] = dst_path
+    return change
+
+
+async def record_course_directory_entry_changes(
+    db: AsyncSession,
+    course_directory_id: int,
+    changes: List[Dict],
+) -> int:
+    """
+    在修改条目的事务中增加目录版本号，并按新的版本号记录一次提交中的所有变更
+
+    版本号与条目变更在同一个事务中提交，任何时刻读到的条目都与同时读到的版本号一致；
+    更新目录记录持有行锁直到事务结束，同一目录的版本号按提交顺序分配。
+    变更记录在提交之前写入缓存，事务回滚时版本号会被下一次提交重新使用并覆盖记录。
+    必须在提交事务之前调用，提交之后调用 publish_course_directory_entry_changes 推送
+
+    参数:
+        db: 数据库会话对象
+        course_directory_id: 课程目录ID
+        changes: 按执行顺序排列的变更列表
+
+    返回:
+        变更后的目录版本号，即变更的序号
+    """
+    result = await db.execute(
+        update(CourseDirectory)
+        .where(CourseDirectory.id == course_directory_id)
+        .values(version=CourseDirectory.version + 1, updated_at=CourseDirectory.updated_at)
+        .returning(CourseDirectory.version)
+        .execution_options(synchronize_session=False)
+    )
+    sequence = result.scalar_one()
+    await cache_course_directory_changes_set(course_directory_id, sequence, changes)
+    return sequence
+
+
+async def publish_course_directory_entry_changes(
+    course_directory_id: int,
+    sequence: int,
+    changes: List[Dict],
+) -> None:
+    """
+    通过 Redis 把已提交的变更推送给所有进程中订阅的客户端，不等待发送完成
+
+    参数:
+        course_directory_id: 课程目录ID
+        sequence: record_course_directory_entry_changes 返回的序号
+        changes: 按执行顺序排列的变更列表
+    """
+    await cache_course_directory_changes_publish(course_directory_id, sequence, changes)
+
+
+async def course_directory_entry_changes_listen() -> None:
+    """
+    接收所有进程发布的目录变更，放入本进程中订阅了该目录的连接的发送队列
+    """
+    async for course_directory_id, sequence, changes in cache_course_directory_changes_subscribe():
+        if not manager.groups.has_child(course_directory_id):
+            continue
+        # 权限可能在订阅之后被修改，有学生订阅时重新读取目录
+        course_directory = None
+        if manager.groups.get_child(course_directory_id).has_child(UserRole.STUDENT):
+            async with async_session_maker() as db:
+                course_directory = await db.get(CourseDirectory, course_directory_id)
+        if manager.groups.has_child(course_directory_id):
+            enqueue_course_directory_entry_changes(
+                course_directory_id, course_directory, sequence, changes
+            )
+
+
+def enqueue_course_directory_entry_changes(
+    course_directory_id: int,
+    course_directory: Optional[CourseDirectory],
+    sequence: int,
+    changes: List[Dict],
+) -> None:
+    """
+    把变更放入订阅目录的所有连接的发送队列，学生只会收到有读取权限的变更
+
+    队列已满的连接跟不上变更，清空队列并通知发送任务关闭连接，客户端重连后从断开时的序号恢复
+
+    参数:
+        course_directory_id: 课程目录ID
+        course_directory: 课程目录对象，没有学生订阅时为 None
+        sequence: 变更的序号
+        changes: 变更列表
+    """
+    groups = manager.groups.get_child(course_directory_id)
+    for role in (UserRole.TEACHER, UserRole.STUDENT):
+        if not groups.has_child(role):
+            continue
+        for identifier in list(groups.get_child(role).connections):
+            queue = _course_directory_entry_changes_queues.get(identifier)
+            if queue is None:
+                continue
+            if role == UserRole.STUDENT:
+                # 目录已被删除时不再推送
+                if course_directory is None:
+                    continue
+                visible = filter_course_directory_entry_changes(
+                    changes, course_directory, identifier[0]
+                )
+            else:
+                visible = changes
+            try:
+                queue.put_nowait({"type": "changes", "sequence": sequence, "changes": visible})
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+async def send_course_directory_entry_changes(
+    websocket: WebSocket,
+    queue: "asyncio.Queue[Optional[Dict]]",
+    course_directory_id: int,
+    role: UserRole,
+    user_id: int,
+    sequence: int,
+) -> None:
+    """
+    按序号依次发送连接队列中的变更消息，收到 None 时关闭连接
+
+    不同进程发布的变更到达顺序可能与序号不同，序号不连续时先缓存后面的消息；
+    等待超时后从变更记录中补齐缺失的序号，补不齐时关闭连接，客户端重连后从已处理的序号恢复
+
+    参数:
+        websocket: WebSocket对象
+        queue: 连接的待发送变更队列
+        course_directory_id: 课程目录ID
+        role: 用户角色
+        user_id: 用户ID
+        sequence: 已经发送给客户端的最后一个序号
+    """
+    pending: Dict[int, Dict] = {}
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(),
+                    timeout=COURSE_DIRECTORY_ENTRY_CHANGES_GAP_TIMEOUT if pending else None,
+                )
+            except asyncio.TimeoutError:
+                versions = list(range(sequence + 1, min(pending)))
+                recorded = await cache_course_directory_changes_get(course_directory_id, versions)
+                if any(changes is None for changes in recorded):
+                    await websocket.close(code=1013)
+                    return
+                course_directory = None
+                if role == UserRole.STUDENT:
+                    async with async_session_maker() as db:
+                        course_directory = await db.get(CourseDirectory, course_directory_id)
+                    if course_directory is None:
+                        await websocket.close(code=1013)
+                        return
+                for version, changes in zip(versions, recorded):
+                    pending[version] = {
+                        "type": "changes",
+                        "sequence": version,
+                        "changes": (
+                            filter_course_directory_entry_changes(
+                                changes, course_directory, user_id
+                            )
+                            if course_directory is not None
+                            else changes
+                        ),
+                    }
+            else:
+                if message is None:
+                    await websocket.close(code=1013)
+                    return
+                # 订阅之前已经重放过的序号直接跳过
+                if message["sequence"] > sequence:
+                    pending[message["sequence"]] = message
+            while sequence + 1 in pending:
+                sequence += 1
+                await websocket.send_json(pending.pop(sequence))
+    except (WebSocketDisconnect, WebSocketException):
+        pass
+
+
+def filter_course_directory_entry_changes(
+    changes: List[Dict],
+    course_directory: CourseDirectory,
+    user_id: int,
+) -> List[Dict]:
+    """
+    过滤学生可以看到的变更
+
+    用户自己执行的变更总是可见，其余变更需要条目路径具有读取权限；
+    只有一端可读的移动变更转换为可读一端的删除或创建变更，不会泄露不可读的路径
+
+    参数:
+        changes: 变更列表
+        course_directory: 课程目录对象
+        user_id: 学生的用户ID
+
+    返回:
+        可见的变更列表
+    """
+    paths = list(
+        {
+            path
+            for change in changes
+            for path in (change["path"], change.get("dst_path"))
+            if path is not None
+        }
+    )
+    readable = dict(
+        zip(
+            paths,
+            verify_permissions_many(paths, course_directory, CourseDirectoryPermissionType.READ),
+        )
+    )
+    visible = []
+    for change in changes:
+        if change["author_id"] == str(user_id):
+            visible.append(change)
+        elif change["type"] != CourseDirectoryEntryChangeType.MOVE.value:
+            if readable[change["path"]]:
+                visible.append(change)
+        elif readable[change["path"]] and readable[change["dst_path"]]:
+            visible.append(change)
+        elif readable[change["path"]]:
+            visible.append({**change, "type": CourseDirectoryEntryChangeType.DELETE.value})
+            visible[-1].pop("dst_path")
+        elif readable[change["dst_path"]]:
+            visible.append(
+                {
+                    **change,
+                    "type": CourseDirectoryEntryChangeType.CREATE.value,
+                    "path": change["dst_path"],
+                }
+            )
+            visible[-1].pop("dst_path")
+    return visible
 
 
 def verify_permissions(
     entry_path: str,
-    permissions: CourseDirectoryPermission,
+    course_directory: CourseDirectory,
     needed_permission_type: CourseDirectoryPermissionType,
 ) -> bool:
     """
     检查用户是否对共享目录中的指定条目路径具有某种权限。
 
+    权限映射按目录编译为前缀树并缓存，目录更新后重新编译
+
     参数:
         entry_path: 要检查的条目路径
-        permissions: 路径到权限的映射字典
+        course_directory: 课程目录对象
         needed_permission_type: 需要的权限类型
 
     返回:
         如果用户具有需要的权限则返回True，否则返回False
     """
-    # 检查条目路径本身是否有显式权限
-    if entry_path in permissions:
-        # 将字符串权限值转换为枚举类型进行比较
-        entry_permissions = permissions[entry_path]
-        if str(needed_permission_type) not in entry_permissions:
-            return False
-    # 递归检查父路径
-    current_path = entry_path
-    while current_path != "":
-        # 获取父路径
-        current_path = path_prefix(current_path)
-        if current_path in permissions:
-            # 将字符串权限值转换为枚举类型进行比较
-            entry_permissions = permissions[current_path]
-            if str(needed_permission_type) not in entry_permissions:
-                return False
-            break
-    return True
-
-
-async def check_if_skip_permission_check_for_upload(
-    path: str,
-    course_directory_id: int,
+    return course_directory_permission_trie(course_directory).verify(
+        entry_path, needed_permission_type
+    )
+
+
+def verify_permissions_many(
+    entry_paths: Sequence[str],
+    course_directory: CourseDirectory,
+    needed_permission_type: CourseDirectoryPermissionType,
+) -> List[bool]:
+    """
+    批量检查用户是否对共享目录中的多个条目路径具有某种权限
+
+    参数:
+        entry_paths: 要检查的条目路径列表
+        course_directory: 课程目录对象
+        needed_permission_type: 需要的权限类型
+
+    返回:
+        与 entry_paths 顺序一致的检查结果列表
+    """
+    return course_directory_permission_trie(course_directory).verify_many(
+        entry_paths, needed_permission_type
+    )
+
+
+def verify_permissions_condition(
+    course_directory: CourseDirectory,
     user_id: int,
+    needed_permission_type: CourseDirectoryPermissionType,
+) -> ColumnElement:
+    """
+    将用户对共享目录中条目的权限检查转换为 SQL 条件，只有满足条件的条目会从数据库中返回
+
+    用户自己创建的条目总是满足条件，其余条目与 verify_permissions 的判断结果一致
+
+    参数:
+        course_directory: 课程目录对象
+        user_id: 用户ID
+        needed_permission_type: 需要的权限类型
+
+    返回:
+        可以用于 CourseDirectoryEntry 查询的 SQL 条件
+    """
+    return or_(
+        CourseDirectoryEntry.author_id == user_id,
+        course_directory_permission_trie(course_directory).predicate(
+            CourseDirectoryEntry.path, needed_permission_type
+        ),
+    )
+
+
+def course_directory_permission_trie(
+    course_directory: CourseDirectory,
+) -> PermissionTrie:
+    """
+    获取课程目录的权限前缀树
+
+    参数:
+        course_directory: 课程目录对象
+
+    返回:
+        权限前缀树
+    """
+    return permission_trie(
+        course_directory.id,
+        course_directory.updated_at,
+        course_directory.permission,
+    )
+
+
+async def query_course_directory_entry_nearest_ancestor(
     db: AsyncSession,
+    course_directory_id: int,
+    path: str,
+) -> Tuple[Optional[CourseDirectoryEntry], Optional[CourseDirectoryEntry]]:
+    """
+    在一次查询中获取指定路径上的条目和上一个存在的父目录
+
+    按层级路径索引查询路径本身及其所有祖先，按深度降序最多取两条
+
+    参数:
+        db: 数据库会话对象
+        course_directory_id: 课程目录ID
+        path: 规范化后的条目路径
+
+    返回:
+        元组(路径上的条目, 上一个存在的父目录)，不存在时为 None
+    """
+    result = await db.execute(
+        select(CourseDirectoryEntry)
+        .where(
+            CourseDirectoryEntry.course_directory_id == course_directory_id,
+            CourseDirectoryEntry.path_tree.ancestor_of(path_tree(path)),
+        )
+        .order_by(CourseDirectoryEntry.depth.desc())
+        .limit(2)
+    )
+    course_directory_entries: Sequence[CourseDirectoryEntry] = result.scalars().all()
+    course_directory_entry = None
+    if course_directory_entries and course_directory_entries[0].path == path:
+        course_directory_entry = course_directory_entries[0]
+        course_directory_entries = course_directory_entries[1:]
+    nearest_ancestor = course_directory_entries[0] if course_directory_entries else None
+    return course_directory_entry, nearest_ancestor
+
+
+def check_if_skip_permission_check_for_upload(
+    nearest_ancestor: Optional[CourseDirectoryEntry],
+    user_id: int,
 ) -> bool:
     """
     在用户是学生时，检查上传操作是否可以跳过权限检查
 
+    比如创建/a/b/c/d.txt,但现在只有a存在,
+    b和c还没有被创建,那我需要去检测a的作者是否是当前用户
+    如果a的作者是当前用户,可以跳过权限检查
+
     参数:
-        path: 要检查的条目路径
-        course_directory_id: 课程目录ID
+        nearest_ancestor: 上一个存在的父目录，由 query_course_directory_entry_nearest_ancestor 查询
         user_id: 用户ID
-        db: 数据库会话对象
 
     返回:
         如果可以跳过权限检查则返回True，否则返回False
     """
-    for parent in path_iterate_parents(path, include_self=False):
-        # 查询当前父目录是否已存在
-        temp_result = await db.execute(
-            select(CourseDirectoryEntry).where(
-                CourseDirectoryEntry.course_directory_id == course_directory_id,
-                CourseDirectoryEntry.path == parent,
-            )
-        )
-        # 直到找到第一个存在的的父目录
-        if temp_result.scalar() is not None:
-            if temp_result.scalar().author_id == user_id:
-                # 比如创建/a/b/c/d.txt,但现在只有a存在,
-                # b和c还没有被创建,那我需要去检测a的作者是否是当前用户
-                # 如果a的作者是当前用户,可以跳过权限检查
-                return True
-            else:
-                return False
-    return False
+    return nearest_ancestor is not None and nearest_ancestor.author_id == user_id
+
+
+def course_directory_entry_list_cursor_encode(
+    value: Union[str, datetime],
+    course_directory_entry_id: int,
+) -> str:
+    """
+    将排序字段的值和条目ID编码为分页游标
+
+    参数：
+        value: 排序字段的值
+        course_directory_entry_id: 条目ID
+
+    返回：
+        URL 安全的游标字符串
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(
+        json.dumps([value, course_directory_entry_id]).encode()
+    ).decode()
+
+
+def course_directory_entry_list_cursor_decode(
+    cursor: str,
+    sort: CourseDirectoryEntryListSort,
+) -> Tuple[Union[str, datetime], int]:
+    """
+    解码分页游标
+
+    参数：
+        cursor: 游标字符串
+        sort: 排序字段
+
+    返回：
+        (排序字段的值, 条目ID) 元组
+
+    异常：
+        APIError: 当游标无效时抛出
+    """
+    try:
+        value, course_directory_entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort != CourseDirectoryEntryListSort.PATH:
+            value = datetime.fromisoformat(value)
+        if not isinstance(value, (str, datetime)) or not isinstance(course_directory_entry_id, int):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise APIError(bad_request, "Invalid cursor")
+    return value, course_directory_entry_id
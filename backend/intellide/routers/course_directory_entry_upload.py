@@ -0,0 +1,450 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Sequence
+
+from fastapi import APIRouter, Depends, UploadFile, Form, File
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from intellide.config import (
+    STORAGE_UPLOAD_MAX_FILE_SIZE,
+    STORAGE_UPLOAD_CHUNK_SIZE,
+    STORAGE_UPLOAD_MAX_CHUNK_SIZE,
+    STORAGE_UPLOAD_SESSION_TTL,
+)
+from intellide.database import database, async_session_maker
+from intellide.database.model import (
+    CourseDirectoryEntry,
+    CourseDirectoryEntryUploadSession,
+    EntryType,
+)
+from intellide.routers.course import course_user_entry_info
+from intellide.routers.course_directory_entry import (
+    verify_course_directory_entry_upload,
+    insert_course_directory_entry_parent_recursively,
+    course_directory_entry_file_columns,
+    course_directory_entry_change,
+    publish_course_directory_entry_changes,
+    record_course_directory_entry_changes,
+    CourseDirectoryEntryChangeType,
+)
+from intellide.storage import (
+    storage_name_create,
+    storage_blob_create,
+    storage_iterate_upload_file,
+    storage_upload_write_chunk,
+    storage_upload_list_chunks,
+    storage_upload_chunk_size,
+    storage_upload_iterate_chunks,
+    storage_upload_remove,
+)
+from intellide.utils.auth import jwe_decode
+from intellide.utils.path import path_normalize
+from intellide.utils.response import ok, bad_request, APIError
+
+# 创建分块上传路由前缀
+api = APIRouter(prefix="/course/directory/entry/upload")
+
+
+class CourseDirectoryEntryUploadPostRequest(BaseModel):
+    """
+    创建分块上传会话请求
+
+    属性：
+        course_directory_id: 课程目录ID
+        path: 条目路径
+        size: 文件总字节数
+        chunk_size: 分块大小（可选）
+    """
+
+    course_directory_id: int  # 课程目录ID
+    path: str  # 条目路径
+    size: int  # 文件总字节数
+    chunk_size: Optional[int] = None  # 分块大小（可选）
+
+
+@api.post("")
+async def course_directory_entry_upload_post(
+    request: CourseDirectoryEntryUploadPostRequest,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    创建分块上传会话
+
+    参数：
+        request: 包含目录ID、路径和文件大小的请求对象
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        上传会话的ID、分块大小、分块数量和过期时间
+
+    异常：
+        APIError: 当用户没有上传权限或条目已存在时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取用户角色、课程、目录和条目信息
+    user_role, course, course_directory, _ = await course_user_entry_info(
+        db=db, course_directory_id=request.course_directory_id, user_id=user_id
+    )
+
+    # 规范化路径
+    path = path_normalize(request.path)
+    if not path:
+        return bad_request("Invalid path")
+
+    # 检查文件大小和分块大小
+    chunk_size = request.chunk_size or STORAGE_UPLOAD_CHUNK_SIZE
+    if not 0 <= request.size <= STORAGE_UPLOAD_MAX_FILE_SIZE:
+        return bad_request(f"File size must be between 0 and {STORAGE_UPLOAD_MAX_FILE_SIZE} bytes")
+    if not 0 < chunk_size <= STORAGE_UPLOAD_MAX_CHUNK_SIZE:
+        return bad_request(
+            f"Chunk size must be between 1 and {STORAGE_UPLOAD_MAX_CHUNK_SIZE} bytes"
+        )
+
+    # 提前检查上传权限，避免上传完所有分块后才失败
+    await verify_course_directory_entry_upload(
+        db=db,
+        user_role=user_role,
+        user_id=user_id,
+        course_directory=course_directory,
+        path=path,
+    )
+
+    # 创建上传会话
+    upload_session = CourseDirectoryEntryUploadSession(
+        course_directory_id=course_directory.id,
+        author_id=user_id,
+        path=path,
+        size=request.size,
+        chunk_size=chunk_size,
+        chunk_count=max(1, -(-request.size // chunk_size)),
+        storage_name=storage_name_create(),
+        expires_at=datetime.now() + timedelta(seconds=STORAGE_UPLOAD_SESSION_TTL),
+    )
+    db.add(upload_session)
+    await db.commit()
+    await db.refresh(upload_session)
+
+    return ok(
+        data={
+            "upload_session_id": upload_session.id,
+            "chunk_size": upload_session.chunk_size,
+            "chunk_count": upload_session.chunk_count,
+            "expires_at": str(upload_session.expires_at),
+        }
+    )
+
+
+@api.get("")
+async def course_directory_entry_upload_get(
+    upload_session_id: int,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    查询分块上传会话的状态
+
+    参数：
+        upload_session_id: 上传会话ID
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        上传会话信息，以及已接收和缺失的分块序号
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取上传会话
+    upload_session = await course_directory_entry_upload_session_info(
+        db=db, upload_session_id=upload_session_id, user_id=user_id
+    )
+
+    # 查询已经接收的分块
+    received = await storage_upload_list_chunks(upload_session.storage_name)
+    missing = sorted(set(range(upload_session.chunk_count)) - set(received))
+
+    return ok(
+        data={
+            **upload_session.dict(),
+            "received": received,
+            "missing": missing,
+        }
+    )
+
+
+@api.put("/chunk")
+async def course_directory_entry_upload_chunk_put(
+    upload_session_id: int = Form(...),
+    index: int = Form(...),
+    file: UploadFile = File(...),
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    上传一个分块，分块可以乱序、并行或重复上传
+
+    参数：
+        upload_session_id: 上传会话ID
+        index: 分块序号（从 0 开始）
+        file: 分块内容
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        上传成功返回OK
+
+    异常：
+        APIError: 当分块大小不正确时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取上传会话
+    upload_session = await course_directory_entry_upload_session_info(
+        db=db, upload_session_id=upload_session_id, user_id=user_id
+    )
+
+    # 检查分块序号
+    if not 0 <= index < upload_session.chunk_count:
+        return bad_request("Chunk index out of range")
+
+    # 流式写入分块，超过该分块应有的大小时中断；大小不正确的分块不会被保留，
+    # 否则会话查询会把它当作已上传的分块
+    expected_size = course_directory_entry_upload_chunk_expected_size(upload_session, index)
+    await storage_upload_write_chunk(
+        upload_name=upload_session.storage_name,
+        index=index,
+        stream=storage_iterate_upload_file(file),
+        max_size=expected_size,
+        expected_size=expected_size,
+    )
+
+    # 有新的分块到达时延长会话有效期
+    upload_session.expires_at = datetime.now() + timedelta(seconds=STORAGE_UPLOAD_SESSION_TTL)
+    await db.commit()
+
+    return ok()
+
+
+class CourseDirectoryEntryUploadFinalizeRequest(BaseModel):
+    """
+    完成分块上传请求
+
+    属性：
+        upload_session_id: 上传会话ID
+    """
+
+    upload_session_id: int  # 上传会话ID
+
+
+@api.post("/finalize")
+async def course_directory_entry_upload_finalize(
+    request: CourseDirectoryEntryUploadFinalizeRequest,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    合并所有分块并创建课程目录条目
+
+    参数：
+        request: 包含上传会话ID的请求对象
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        新建条目的ID
+
+    异常：
+        APIError: 当分块不完整、没有上传权限或条目已存在时抛出
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取上传会话
+    upload_session = await course_directory_entry_upload_session_info(
+        db=db, upload_session_id=request.upload_session_id, user_id=user_id
+    )
+
+    # 检查所有分块是否都已上传且大小正确
+    received = set(await storage_upload_list_chunks(upload_session.storage_name))
+    missing = sorted(set(range(upload_session.chunk_count)) - received)
+    if missing:
+        return bad_request("Upload is incomplete", missing=missing)
+    for index in range(upload_session.chunk_count):
+        if await storage_upload_chunk_size(
+            upload_session.storage_name, index
+        ) != course_directory_entry_upload_chunk_expected_size(upload_session, index):
+            return bad_request(f"Chunk {index} has an unexpected size", missing=[index])
+
+    # 获取用户角色和目录信息，并重新检查上传权限
+    user_role, course, course_directory, _ = await course_user_entry_info(
+        db=db, course_directory_id=upload_session.course_directory_id, user_id=user_id
+    )
+    await verify_course_directory_entry_upload(
+        db=db,
+        user_role=user_role,
+        user_id=user_id,
+        course_directory=course_directory,
+        path=upload_session.path,
+    )
+
+    # 递归插入父目录
+    await insert_course_directory_entry_parent_recursively(
+        course_directory_id=course_directory.id,
+        user_id=user_id,
+        child=upload_session.path,
+        db=db,
+    )
+
+    # 按顺序流式合并分块到内容寻址存储
+    blob = await storage_blob_create(
+        db=db,
+        stream_factory=lambda: storage_upload_iterate_chunks(
+            upload_session.storage_name, upload_session.chunk_count
+        ),
+        max_size=upload_session.size,
+        file_name=upload_session.path,
+    )
+    course_directory_entry = CourseDirectoryEntry(
+        course_directory_id=course_directory.id,
+        author_id=user_id,
+        path=upload_session.path,
+        type=EntryType.FILE,
+        **course_directory_entry_file_columns(upload_session.path, blob),
+    )
+    db.add(course_directory_entry)
+
+    # 删除上传会话，并发上传到相同路径时由唯一索引拒绝
+    await db.delete(upload_session)
+    changes = [
+        course_directory_entry_change(
+            CourseDirectoryEntryChangeType.CREATE,
+            course_directory_entry.path,
+            EntryType.FILE,
+            user_id,
+        )
+    ]
+    try:
+        sequence = await record_course_directory_entry_changes(
+            db, course_directory_entry.course_directory_id, changes
+        )
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return bad_request("Entry already exists")
+    await db.refresh(course_directory_entry)
+    await publish_course_directory_entry_changes(
+        course_directory_entry.course_directory_id, sequence, changes
+    )
+    await storage_upload_remove(upload_session.storage_name)
+
+    # 返回新建条目的ID
+    return ok(data={"course_directory_entry_id": course_directory_entry.id})
+
+
+@api.delete("")
+async def course_directory_entry_upload_delete(
+    upload_session_id: int,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    取消分块上传会话并删除已上传的分块
+
+    参数：
+        upload_session_id: 上传会话ID
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        删除成功返回OK
+    """
+    # 获取用户ID
+    user_id = access_info["user_id"]
+
+    # 获取上传会话
+    upload_session = await course_directory_entry_upload_session_info(
+        db=db, upload_session_id=upload_session_id, user_id=user_id
+    )
+
+    # 删除上传会话和分块
+    await db.delete(upload_session)
+    await db.commit()
+    await storage_upload_remove(upload_session.storage_name)
+
+    return ok()
+
+
+async def course_directory_entry_upload_session_info(
+    db: AsyncSession,
+    upload_session_id: int,
+    user_id: int,
+) -> CourseDirectoryEntryUploadSession:
+    """
+    获取属于当前用户且未过期的上传会话
+
+    参数：
+        db: 数据库会话对象
+        upload_session_id: 上传会话ID
+        user_id: 用户ID
+
+    返回：
+        上传会话对象
+
+    异常：
+        APIError: 当上传会话不存在、不属于当前用户或已过期时抛出
+    """
+    result = await db.execute(
+        select(CourseDirectoryEntryUploadSession).where(
+            CourseDirectoryEntryUploadSession.id == upload_session_id,
+            CourseDirectoryEntryUploadSession.author_id == user_id,
+            CourseDirectoryEntryUploadSession.expires_at > datetime.now(),
+        )
+    )
+    upload_session: Optional[CourseDirectoryEntryUploadSession] = result.scalar()
+    if not upload_session:
+        raise APIError(bad_request, "Upload session not found")
+    return upload_session
+
+
+def course_directory_entry_upload_chunk_expected_size(
+    upload_session: CourseDirectoryEntryUploadSession,
+    index: int,
+) -> int:
+    """
+    计算指定分块应有的字节数
+
+    参数：
+        upload_session: 上传会话对象
+        index: 分块序号
+
+    返回：
+        分块的字节数，最后一个分块可能小于分块大小
+    """
+    if index < upload_session.chunk_count - 1:
+        return upload_session.chunk_size
+    return upload_session.size - upload_session.chunk_size * (upload_session.chunk_count - 1)
+
+
+async def course_directory_entry_upload_session_cleanup() -> None:
+    """
+    清理过期的上传会话及其分块
+    """
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(CourseDirectoryEntryUploadSession).where(
+                CourseDirectoryEntryUploadSession.expires_at <= datetime.now(),
+            )
+        )
+        upload_sessions: Sequence[CourseDirectoryEntryUploadSession] = result.scalars().all()
+        for upload_session in upload_sessions:
+            await db.delete(upload_session)
+        await db.commit()
+    for upload_session in upload_sessions:
+        await storage_upload_remove(upload_session.storage_name)
@@ -0,0 +1,274 @@
+import asyncio
+import difflib
+from typing import Dict, Sequence, Union
+
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from intellide.config import COURSE_DIRECTORY_ENTRY_VERSION_DIFF_MAX_SIZE
+from intellide.database import database
+from intellide.database.model import (
+    CourseDirectoryEntry,
+    CourseDirectoryEntryVersion,
+    CourseDirectoryPermissionType,
+    EntryType,
+    UserRole,
+)
+from intellide.routers.course import course_user_entry_info
+from intellide.routers.course_directory_entry import (
+    read_course_directory_entry_version,
+    verify_permissions,
+)
+from intellide.storage import storage_get_file_response, storage_media_type
+from intellide.utils.auth import jwe_decode
+from intellide.utils.path import path_dir_base_name
+from intellide.utils.response import ok, bad_request, forbidden
+
+# 创建历史版本路由前缀
+api = APIRouter(prefix="/course/directory/entry/version")
+
+
+@api.get("")
+async def course_directory_entry_version_get(
+    course_directory_entry_id: int,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    列出文件条目的历史版本
+
+    参数：
+        course_directory_entry_id: 目录条目ID
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        按版本号升序排列的版本列表，包含版本号、作者ID、大小、内容哈希值和创建时间
+    """
+    # 检查条目和读取权限
+    course_directory_entry = await verify_course_directory_entry_version_read(
+        db=db,
+        course_directory_entry_id=course_directory_entry_id,
+        user_id=access_info["user_id"],
+    )
+    if not isinstance(course_directory_entry, CourseDirectoryEntry):
+        return course_directory_entry
+
+    result = await db.execute(
+        select(
+            CourseDirectoryEntryVersion.version,
+            CourseDirectoryEntryVersion.author_id,
+            CourseDirectoryEntryVersion.size,
+            CourseDirectoryEntryVersion.content_hash,
+            CourseDirectoryEntryVersion.created_at,
+        )
+        .where(CourseDirectoryEntryVersion.course_directory_entry_id == course_directory_entry_id)
+        .order_by(CourseDirectoryEntryVersion.version)
+    )
+    versions: Sequence = result.all()
+    return ok(
+        data=[
+            {
+                "version": version.version,
+                "author_id": str(version.author_id),
+                "size": version.size,
+                "content_hash": version.content_hash,
+                "created_at": str(version.created_at),
+            }
+            for version in versions
+        ]
+    )
+
+
+@api.get("/download")
+async def course_directory_entry_version_download(
+    course_directory_entry_id: int,
+    version: int,
+    request: Request,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    下载文件条目的某个历史版本
+
+    关键帧版本直接返回存储块，支持条件请求和范围请求；其余版本从最近的关键帧还原后返回
+
+    参数：
+        course_directory_entry_id: 目录条目ID
+        version: 版本号
+        request: 请求对象，用于读取条件请求和范围请求的请求头
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        文件下载响应
+
+    异常：
+        APIError: 当版本不存在或还原失败时抛出
+    """
+    # 检查条目和读取权限
+    course_directory_entry = await verify_course_directory_entry_version_read(
+        db=db,
+        course_directory_entry_id=course_directory_entry_id,
+        user_id=access_info["user_id"],
+    )
+    if not isinstance(course_directory_entry, CourseDirectoryEntry):
+        return course_directory_entry
+
+    # 获取文件名
+    _, file_name = path_dir_base_name(course_directory_entry.path)
+
+    result = await db.execute(
+        select(CourseDirectoryEntryVersion).where(
+            CourseDirectoryEntryVersion.course_directory_entry_id == course_directory_entry_id,
+            CourseDirectoryEntryVersion.version == version,
+        )
+    )
+    course_directory_entry_version = result.scalar()
+    if course_directory_entry_version is None:
+        return bad_request("Version not found")
+
+    # 关键帧的存储块就是完整内容
+    if course_directory_entry_version.keyframe:
+        return await storage_get_file_response(
+            storage_name=course_directory_entry_version.storage_name,
+            file_name=file_name,
+            headers=request.headers,
+            etag=course_directory_entry_version.content_hash,
+            last_modified=course_directory_entry_version.created_at,
+            media_type=course_directory_entry.mime_type,
+            size=course_directory_entry_version.size,
+        )
+
+    # 其余版本需要还原完整内容
+    course_directory_entry_version, content = await read_course_directory_entry_version(
+        db=db,
+        course_directory_entry_id=course_directory_entry_id,
+        version=version,
+    )
+    return Response(
+        content=content,
+        media_type=course_directory_entry.mime_type or storage_media_type(file_name),
+        headers={
+            "Content-Disposition": f"attachment; filename={file_name}",
+            "ETag": f'"{course_directory_entry_version.content_hash}"',
+        },
+    )
+
+
+@api.get("/diff")
+async def course_directory_entry_version_diff(
+    course_directory_entry_id: int,
+    from_version: int,
+    to_version: int,
+    access_info: Dict = Depends(jwe_decode),
+    db: AsyncSession = Depends(database),
+):
+    """
+    比较文件条目的两个历史版本，返回统一格式的文本差异
+
+    参数：
+        course_directory_entry_id: 目录条目ID
+        from_version: 旧版本号
+        to_version: 新版本号
+        access_info: 包含用户ID等信息的字典
+        db: 数据库会话对象
+
+    返回：
+        统一格式的差异文本，任意一个版本超过大小限制时返回错误
+
+    异常：
+        APIError: 当版本不存在或还原失败时抛出
+    """
+    # 检查条目和读取权限
+    course_directory_entry = await verify_course_directory_entry_version_read(
+        db=db,
+        course_directory_entry_id=course_directory_entry_id,
+        user_id=access_info["user_id"],
+    )
+    if not isinstance(course_directory_entry, CourseDirectoryEntry):
+        return course_directory_entry
+
+    # 还原内容之前按记录的大小检查限制，避免读取和比较过大的版本
+    result = await db.execute(
+        select(CourseDirectoryEntryVersion.version, CourseDirectoryEntryVersion.size).where(
+            CourseDirectoryEntryVersion.course_directory_entry_id == course_directory_entry_id,
+            CourseDirectoryEntryVersion.version.in_([from_version, to_version]),
+        )
+    )
+    sizes = dict(result.all())
+    if from_version not in sizes or to_version not in sizes:
+        return bad_request("Version not found")
+    if max(sizes.values()) > COURSE_DIRECTORY_ENTRY_VERSION_DIFF_MAX_SIZE:
+        return bad_request(
+            f"Versions larger than {COURSE_DIRECTORY_ENTRY_VERSION_DIFF_MAX_SIZE} bytes "
+            "cannot be compared"
+        )
+
+    # 还原两个版本的内容
+    _, source = await read_course_directory_entry_version(
+        db=db, course_directory_entry_id=course_directory_entry_id, version=from_version
+    )
+    _, target = await read_course_directory_entry_version(
+        db=db, course_directory_entry_id=course_directory_entry_id, version=to_version
+    )
+    try:
+        source_lines = source.decode("utf-8").splitlines(keepends=True)
+        target_lines = target.decode("utf-8").splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return bad_request("Version content is not text")
+
+    # 比较文本是 CPU 密集操作，在线程中执行，不阻塞事件循环
+    diff = await asyncio.to_thread(
+        lambda: "".join(
+            difflib.unified_diff(
+                source_lines,
+                target_lines,
+                fromfile=f"{course_directory_entry.path}@{from_version}",
+                tofile=f"{course_directory_entry.path}@{to_version}",
+            )
+        )
+    )
+    return ok(data={"diff": diff})
+
+
+async def verify_course_directory_entry_version_read(
+    db: AsyncSession,
+    course_directory_entry_id: int,
+    user_id: int,
+) -> Union[CourseDirectoryEntry, Response]:
+    """
+    检查用户是否可以读取文件条目的历史版本，与下载条目使用相同的读取权限
+
+    参数：
+        db: 数据库会话对象
+        course_directory_entry_id: 目录条目ID
+        user_id: 用户ID
+
+    返回：
+        可以读取时返回条目，否则返回错误响应
+    """
+    # 获取用户角色、课程、目录和条目信息
+    role, course, course_directory, course_directory_entry = await course_user_entry_info(
+        db=db, course_directory_entry_id=course_directory_entry_id, user_id=user_id
+    )
+
+    # 如果条目不存在，返回错误
+    if not course_directory_entry:
+        return bad_request("Course directory entry not found")
+
+    # 如果用户是学生，检查权限
+    if role == UserRole.STUDENT:
+        if course_directory_entry.author_id != user_id:
+            if not verify_permissions(
+                course_directory_entry.path,
+                course_directory,
+                CourseDirectoryPermissionType.READ,
+            ):
+                return forbidden("No read permission")
+
+    # 只有文件才有历史版本
+    if course_directory_entry.type != EntryType.FILE:
+        return bad_request("Course directory entry is not a file")
+    return course_directory_entry
@@ -1,2 +1,7 @@
 from intellide.storage.startup import startup
 from intellide.storage.storage import *
+from intellide.storage.blob import *
+from intellide.storage.archive import *
+from intellide.storage.pack import *
+from intellide.storage.gc import *
+from intellide.storage.backfill import *
@@ -0,0 +1,150 @@
+import asyncio
+import posixpath
+import tarfile
+import zipfile
+from contextlib import asynccontextmanager
+from typing import IO, AsyncIterator, Callable, List, NamedTuple
+
+import aiofiles.os
+
+from intellide.config import STORAGE_CHUNK_SIZE
+from intellide.storage.storage import storage_temp_path
+from intellide.utils.response import APIError, bad_request
+
+
+class StorageArchiveMember(NamedTuple):
+    """
+    压缩包中的一个成员
+
+    属性:
+    - name: 压缩包内的相对路径，不以 / 开头或结尾
+    - is_dir: 是否是目录
+    - size: 压缩包声明的解压后字节数
+    - open: 每次调用都返回一个从头开始读取成员内容的文件对象
+    """
+
+    name: str
+    is_dir: bool
+    size: int
+    open: Callable[[], IO[bytes]]
+
+
+def storage_archive_members(
+    fileobj: IO[bytes],
+) -> List[StorageArchiveMember]:
+    """
+    同步读取 zip 或 tar（可带 gzip/bz2/xz 压缩）压缩包的成员列表，
+    只保留普通文件和目录，跳过符号链接、设备文件等
+
+    参数:
+    - fileobj: 可寻址的压缩包文件对象，读取成员内容期间需要保持打开
+
+    返回:
+    - 成员列表
+
+    异常:
+    - APIError: 当压缩包格式不受支持或已损坏时抛出
+    """
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        try:
+            zf = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise APIError(bad_request, "Invalid archive")
+        return [
+            StorageArchiveMember(
+                name=info.filename.strip("/"),
+                is_dir=info.is_dir(),
+                size=info.file_size,
+                open=lambda info=info: zf.open(info),
+            )
+            for info in zf.infolist()
+            if info.filename.strip("/")
+        ]
+    fileobj.seek(0)
+    try:
+        tf = tarfile.open(fileobj=fileobj, mode="r:*")
+        tar_members = tf.getmembers()
+    except tarfile.TarError:
+        raise APIError(bad_request, "Unsupported archive format")
+    return [
+        StorageArchiveMember(
+            name=posixpath.normpath(member.name).strip("/"),
+            is_dir=member.isdir(),
+            size=member.size if member.isfile() else 0,
+            open=lambda member=member: tf.extractfile(member),
+        )
+        for member in tar_members
+        if (member.isfile() or member.isdir())
+        and posixpath.normpath(member.name).strip("/") not in ("", ".")
+    ]
+
+
+async def storage_iterate_archive_member(
+    member: StorageArchiveMember,
+    chunk_size: int = STORAGE_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    按块迭代压缩包成员的内容，解压在线程中进行
+
+    参数:
+    - member: 压缩包成员
+    - chunk_size: 块大小
+
+    返回:
+    - 成员内容块的异步迭代器
+    """
+    fp = await asyncio.to_thread(member.open)
+    try:
+        while chunk := await asyncio.to_thread(fp.read, chunk_size):
+            yield chunk
+    finally:
+        fp.close()
+
+
+def _storage_spool_archive_member(
+    member: StorageArchiveMember,
+    path: str,
+    chunk_size: int,
+) -> None:
+    """
+    同步将压缩包成员的内容写入文件，最多写入声明大小加一个字节，超出部分由调用方的大小限制拒绝
+
+    参数:
+    - member: 压缩包成员
+    - path: 写入的文件路径
+    - chunk_size: 块大小
+    """
+    remaining = member.size + 1
+    with member.open() as src, open(path, "wb") as dst:
+        while remaining > 0 and (chunk := src.read(min(chunk_size, remaining))):
+            dst.write(chunk)
+            remaining -= len(chunk)
+
+
+@asynccontextmanager
+async def storage_spool_archive_member(
+    member: StorageArchiveMember,
+    chunk_size: int = STORAGE_CHUNK_SIZE,
+) -> AsyncIterator[str]:
+    """
+    将压缩包成员解压到临时文件，退出时删除临时文件
+
+    每个成员只解压一次，之后的多遍读取都从临时文件进行；
+    按压缩包内的顺序解压时 tar.gz 等流式压缩包不需要为每个成员从头重新解压
+
+    参数:
+    - member: 压缩包成员
+    - chunk_size: 块大小
+
+    返回:
+    - 临时文件路径
+    """
+    temp_path = storage_temp_path()
+    try:
+        await asyncio.to_thread(_storage_spool_archive_member, member, temp_path, chunk_size)
+        yield temp_path
+    finally:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
@@ -0,0 +1,136 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, or_, tuple_, update
+from sqlalchemy.future import select
+
+from intellide.cache import (
+    cache_course_directory_changes_publish,
+    cache_course_directory_changes_set,
+)
+from intellide.database import async_session_maker
+from intellide.database.model import CourseDirectory, CourseDirectoryEntry, EntryType
+from intellide.storage.storage import (
+    storage_hash_stream,
+    storage_iterate,
+    storage_media_type,
+)
+
+
+async def storage_backfill_entry_metadata(
+    after_id: int = 0,
+    limit: int = 1000,
+) -> Optional[int]:
+    """
+    回填一批缺少内容元数据的文件条目
+
+    内容哈希值和大小通过流式读取存储内容计算，MIME 类型根据路径推断；
+    存储内容已经丢失的条目会被跳过，条目的更新时间保持不变。
+    只更新存储名称仍与读取时相同的条目，读取期间内容被覆盖的条目已经记录了新内容的元数据。
+    回填的条目所在目录的版本号在同一个事务中增加，使缓存的目录树快照失效，并推送条目的更新变更
+
+    参数:
+    - after_id: 只处理ID大于该值的条目
+    - limit: 本批最多处理的条目数量
+
+    返回:
+    - 本批处理的最后一个条目ID，没有需要回填的条目时返回 None
+    """
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(
+                CourseDirectoryEntry.id,
+                CourseDirectoryEntry.path,
+                CourseDirectoryEntry.storage_name,
+            )
+            .where(
+                CourseDirectoryEntry.id > after_id,
+                CourseDirectoryEntry.type == EntryType.FILE,
+                or_(
+                    CourseDirectoryEntry.size.is_(None),
+                    CourseDirectoryEntry.content_hash.is_(None),
+                    CourseDirectoryEntry.mime_type.is_(None),
+                ),
+            )
+            .order_by(CourseDirectoryEntry.id)
+            .limit(limit)
+        )
+        rows = result.all()
+        if not rows:
+            return None
+        values = []
+        for row in rows:
+            try:
+                content_hash, size = await storage_hash_stream(storage_iterate(row.storage_name))
+            except FileNotFoundError:
+                continue
+            values.append(
+                {
+                    "b_id": row.id,
+                    "b_storage_name": row.storage_name,
+                    "b_size": size,
+                    "b_content_hash": content_hash,
+                    "b_mime_type": storage_media_type(row.path),
+                }
+            )
+        if values:
+            entries = CourseDirectoryEntry.__table__
+            await db.execute(
+                update(entries)
+                .where(
+                    entries.c.id == bindparam("b_id"),
+                    entries.c.storage_name == bindparam("b_storage_name"),
+                )
+                .values(
+                    size=bindparam("b_size"),
+                    content_hash=bindparam("b_content_hash"),
+                    mime_type=bindparam("b_mime_type"),
+                    updated_at=entries.c.updated_at,
+                ),
+                values,
+            )
+            # 查询实际回填的条目，更新语句持有行锁，提交之前存储名称不会再变化
+            result = await db.execute(
+                select(
+                    CourseDirectoryEntry.course_directory_id,
+                    CourseDirectoryEntry.path,
+                    CourseDirectoryEntry.author_id,
+                )
+                .where(
+                    tuple_(CourseDirectoryEntry.id, CourseDirectoryEntry.storage_name).in_(
+                        [(value["b_id"], value["b_storage_name"]) for value in values]
+                    )
+                )
+                .order_by(CourseDirectoryEntry.course_directory_id, CourseDirectoryEntry.path)
+            )
+            changes: Dict[int, List[Dict]] = {}
+            for entry in result.all():
+                changes.setdefault(entry.course_directory_id, []).append(
+                    {
+                        "type": "update",
+                        "path": entry.path,
+                        "entry_type": str(EntryType.FILE),
+                        "author_id": str(entry.author_id),
+                    }
+                )
+            # 按目录ID顺序增加版本号并记录变更，与 record_course_directory_entry_changes 相同
+            sequences = {}
+            for course_directory_id, directory_changes in sorted(changes.items()):
+                result = await db.execute(
+                    update(CourseDirectory)
+                    .where(CourseDirectory.id == course_directory_id)
+                    .values(
+                        version=CourseDirectory.version + 1, updated_at=CourseDirectory.updated_at
+                    )
+                    .returning(CourseDirectory.version)
+                    .execution_options(synchronize_session=False)
+                )
+                sequences[course_directory_id] = result.scalar_one()
+                await cache_course_directory_changes_set(
+                    course_directory_id, sequences[course_directory_id], directory_changes
+                )
+            await db.commit()
+            for course_directory_id, sequence in sequences.items():
+                await cache_course_directory_changes_publish(
+                    course_directory_id, sequence, changes[course_directory_id]
+                )
+    return rows[-1].id
@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Iterable, List, NamedTuple, Optional
+
+from fastapi import UploadFile
+from sqlalchemy import delete, func, update, bindparam
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from intellide.config import (
+    STORAGE_BLOB_RECLAIM_GRACE_PERIOD,
+    STORAGE_BLOB_RECLAIM_BATCH_SIZE,
+)
+from intellide.database import async_session_maker
+from intellide.database.model import StorageBlob
+from intellide.storage.gc import storage_gc_referenced
+from intellide.storage.pack import (
+    storage_pack_accepts,
+    storage_pack_write_stream,
+)
+from intellide.storage.storage import (
+    storage_compressible,
+    storage_exists,
+    storage_gzip_name,
+    storage_gzip_stream,
+    storage_hash_stream,
+    storage_iterate_upload_file,
+    storage_remove_file,
+    storage_size,
+    storage_write_stream,
+)
+from intellide.utils.response import APIError, bad_request
+
+
+class StorageBlobInfo(NamedTuple):
+    """
+    存储块信息
+
+    属性:
+    - storage_name: 存储名称（内容的 SHA-256 哈希值）
+    - size: 内容字节数
+    """
+
+    storage_name: str
+    size: int
+
+
+async def _storage_blob_write(
+    storage_name: str,
+    size: int,
+    stream_factory: Callable[[], AsyncIterator[bytes]],
+    max_size: Optional[int],
+    file_name: Optional[str],
+) -> None:
+    """
+    写入存储块的内容，小存储块写入打包存储，可压缩的存储块以 gzip 形式写入，
+    压缩后没有变小的存储块改为写入原始内容
+    """
+    write_stream = storage_pack_write_stream if storage_pack_accepts(size) else storage_write_stream
+    if file_name is not None and storage_compressible(file_name, size):
+        gzip_name = storage_gzip_name(storage_name)
+        digest = hashlib.sha256()
+
+        async def hashed_stream() -> AsyncIterator[bytes]:
+            async for chunk in stream_factory():
+                digest.update(chunk)
+                yield chunk
+
+        await write_stream(
+            storage_name=gzip_name,
+            stream=storage_gzip_stream(hashed_stream()),
+            # deflate 对不可压缩内容的膨胀上限约为千分之一，再加上 gzip 头尾
+            max_size=size + size // 1000 + 64,
+        )
+        # 压缩前的原始内容同样需要校验哈希值
+        if digest.hexdigest() != storage_name:
+            await storage_remove_file(gzip_name)
+            raise APIError(bad_request, "File content changed while writing")
+        if await storage_size(gzip_name) < size:
+            return
+        await storage_remove_file(gzip_name)
+    await write_stream(
+        storage_name=storage_name,
+        stream=stream_factory(),
+        max_size=max_size,
+        content_hash=storage_name,
+    )
+
+
+async def storage_blob_create(
+    db: AsyncSession,
+    stream_factory: Callable[[], AsyncIterator[bytes]],
+    max_size: Optional[int] = None,
+    file_name: Optional[str] = None,
+) -> StorageBlobInfo:
+    """
+    以内容寻址的方式写入存储块并增加其引用计数
+
+    第一遍读取只计算哈希值，只有内容尚未存储时才进行第二遍读取并写入磁盘，
+    因此磁盘占用和写入量只与不同内容的数量有关
+
+    引用计数在写入之前增加，在事务提交之前对应的行会一直被锁住，
+    回收任务因此不会在写入期间删除同名文件
+
+    参数:
+    - db: 数据库会话对象
+    - stream_factory: 每次调用都返回一个从头开始的内容异步迭代器
+    - max_size: 内容的最大字节数（可选）
+    - file_name: 文件名称（可选），用于判断是否压缩存储
+
+    返回:
+    - 存储块信息
+    """
+    # 第一遍读取：计算内容哈希值和大小
+    storage_name, size = await storage_hash_stream(stream_factory(), max_size)
+    # 增加引用计数，不存在时创建存储块记录
+    await db.execute(
+        insert(StorageBlob)
+        .values(
+            storage_name=storage_name,
+            size=size,
+            reference_count=1,
+        )
+        .on_conflict_do_update(
+            index_elements=[StorageBlob.storage_name],
+            set_={
+                "size": size,
+                "reference_count": StorageBlob.reference_count + 1,
+                "updated_at": datetime.now(),
+            },
+        )
+    )
+    # 第二遍读取：内容尚未存储时才写入磁盘
+    if not await storage_exists(storage_name):
+        await _storage_blob_write(storage_name, size, stream_factory, max_size, file_name)
+    return StorageBlobInfo(storage_name, size)
+
+
+async def storage_blob_create_from_upload_file(
+    db: AsyncSession,
+    file: UploadFile,
+    max_size: Optional[int] = None,
+    file_name: Optional[str] = None,
+) -> StorageBlobInfo:
+    """
+    将上传的文件写入内容寻址存储块
+
+    参数:
+    - db: 数据库会话对象
+    - file: 上传的文件
+    - max_size: 文件的最大字节数（可选）
+    - file_name: 文件名称（可选），不提供时使用上传的文件名
+
+    返回:
+    - 存储块信息
+    """
+    return await storage_blob_create(
+        db=db,
+        stream_factory=lambda: storage_iterate_upload_file(file),
+        max_size=max_size,
+        file_name=file_name or file.filename,
+    )
+
+
+async def storage_blob_acquire(
+    db: AsyncSession,
+    storage_names: Iterable[Optional[str]],
+) -> None:
+    """
+    增加已存在的存储块的引用计数，不需要重新读取内容
+
+    没有记录的存储块直接以新增的引用数量登记，不会出现引用计数为 0 的中间状态
+
+    参数:
+    - db: 数据库会话对象
+    - storage_names: 要引用的存储名称，同一名称出现多次表示增加多个引用
+    """
+    counts = Counter(storage_name for storage_name in storage_names if storage_name)
+    if not counts:
+        return
+    now = datetime.now()
+    statement = insert(StorageBlob).values(
+        [
+            {
+                "storage_name": storage_name,
+                "reference_count": count,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for storage_name, count in sorted(counts.items())
+        ]
+    )
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[StorageBlob.storage_name],
+            set_={
+                "reference_count": StorageBlob.reference_count + statement.excluded.reference_count,
+                "updated_at": now,
+            },
+        )
+    )
+
+
+async def storage_blob_release(
+    db: AsyncSession,
+    storage_names: Iterable[Optional[str]],
+) -> None:
+    """
+    减少存储块的引用计数
+
+    引用计数降为 0 的存储块不会立即删除，而是在宽限期后由回收任务删除；
+    没有记录的存储文件不会登记，是否仍被引用由标记清除回收判断
+
+    参数:
+    - db: 数据库会话对象
+    - storage_names: 要释放的存储名称，同一名称出现多次表示释放多个引用
+    """
+    counts = Counter(storage_name for storage_name in storage_names if storage_name)
+    if not counts:
+        return
+    now = datetime.now()
+    # 批量减少引用计数
+    blobs = StorageBlob.__table__
+    await db.execute(
+        update(blobs)
+        .where(blobs.c.storage_name == bindparam("b_storage_name"))
+        .values(
+            reference_count=func.greatest(blobs.c.reference_count - bindparam("b_count"), 0),
+            updated_at=now,
+        ),
+        [
+            {"b_storage_name": storage_name, "b_count": count}
+            for storage_name, count in counts.items()
+        ],
+    )
+
+
+async def storage_blob_reclaim(
+    storage_names: Optional[List[str]] = None,
+    grace_period: float = STORAGE_BLOB_RECLAIM_GRACE_PERIOD,
+) -> List[str]:
+    """
+    回收引用计数为 0 且超过宽限期的存储块
+
+    删除文件时持有存储块记录的行锁，与 storage_blob_create 互斥；
+    删除前再次确认没有任何记录引用该存储名称，引用计数与实际引用不一致时不会误删
+
+    参数:
+    - storage_names: 只回收这些存储块（可选），不提供时回收所有满足条件的存储块
+    - grace_period: 引用计数降为 0 后保留的宽限期（秒）
+
+    返回:
+    - 被回收的存储名称列表
+    """
+    async with async_session_maker() as db:
+        query = select(StorageBlob.storage_name).where(
+            StorageBlob.reference_count == 0,
+            StorageBlob.updated_at <= datetime.now() - timedelta(seconds=grace_period),
+        )
+        if storage_names is not None:
+            query = query.where(StorageBlob.storage_name.in_(storage_names))
+        result = await db.execute(
+            query.limit(STORAGE_BLOB_RECLAIM_BATCH_SIZE).with_for_update(skip_locked=True)
+        )
+        candidates = list(result.scalars().all())
+        referenced = await storage_gc_referenced(db, candidates)
+        reclaimed: List[str] = [
+            storage_name for storage_name in candidates if storage_name not in referenced
+        ]
+        for storage_name in reclaimed:
+            try:
+                await storage_remove_file(storage_name)
+            except FileNotFoundError:
+                pass
+        if reclaimed:
+            await db.execute(delete(StorageBlob).where(StorageBlob.storage_name.in_(reclaimed)))
+        await db.commit()
+    return reclaimed
+
+
+# 等待立即回收的存储名称队列
+_storage_blob_reclaim_queue: "asyncio.Queue[str]" = asyncio.Queue()
+
+
+def storage_blob_reclaim_enqueue(
+    storage_names: Iterable[Optional[str]],
+) -> None:
+    """
+    将已释放引用的存储块加入回收队列，由后台任务批量删除磁盘文件
+
+    必须在释放引用的事务提交之后调用；仍被引用的存储块不会被删除
+
+    参数:
+    - storage_names: 存储名称
+    """
+    for storage_name in set(storage_names):
+        if storage_name:
+            _storage_blob_reclaim_queue.put_nowait(storage_name)
+
+
+async def storage_blob_reclaim_queued() -> List[str]:
+    """
+    等待回收队列中出现存储名称，然后取出一批立即回收
+
+    引用计数的行锁保证不会删除正在被重新引用的存储块，因此不需要宽限期
+
+    返回:
+    - 被回收的存储名称列表
+    """
+    storage_names = [await _storage_blob_reclaim_queue.get()]
+    while (
+        len(storage_names) < STORAGE_BLOB_RECLAIM_BATCH_SIZE
+        and not _storage_blob_reclaim_queue.empty()
+    ):
+        storage_names.append(_storage_blob_reclaim_queue.get_nowait())
+    return await storage_blob_reclaim(storage_names, grace_period=0)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+from sqlalchemy import delete, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from intellide.config import (
+    STORAGE_GC_GRACE_PERIOD,
+    STORAGE_GC_BATCH_SIZE,
+    STORAGE_GC_DELETE_RATE,
+)
+from intellide.database import async_session_maker
+from intellide.database.model import (
+    CourseCollaborativeDirectoryEntry,
+    CourseDirectoryEntry,
+    CourseDirectoryEntryVersion,
+    StorageBlob,
+)
+from intellide.storage.pack import storage_pack_compact
+from intellide.storage.storage import storage_list, storage_remove_file
+
+logger = logging.getLogger(__name__)
+
+# 引用存储名称的所有列，新增引用存储内容的表时需要加入这里
+STORAGE_GC_REFERENCES = [
+    CourseDirectoryEntry.storage_name,
+    CourseDirectoryEntryVersion.storage_name,
+    CourseCollaborativeDirectoryEntry.storage_name,
+]
+
+
+class StorageGCReport(NamedTuple):
+    """
+    一次标记清除回收的结果
+
+    属性:
+    - dry_run: 是否只检查不删除
+    - scanned: 扫描到的存储名称数量
+    - referenced: 仍被引用的存储名称数量
+    - recent: 处于宽限期内而跳过的存储名称数量
+    - locked: 正在被写入而跳过的存储名称数量
+    - deleted: 删除（或试运行时将会删除）的存储名称数量
+    - reclaimed_bytes: 释放（或试运行时将会释放）的磁盘字节数
+    - compacted_bytes: 压缩打包文件释放的磁盘字节数，试运行时不压缩
+    - duration: 耗时（秒）
+    - storage_names: 删除（或试运行时将会删除）的存储名称列表
+    """
+
+    dry_run: bool
+    scanned: int
+    referenced: int
+    recent: int
+    locked: int
+    deleted: int
+    reclaimed_bytes: int
+    compacted_bytes: int
+    duration: float
+    storage_names: List[str]
+
+
+async def storage_gc_referenced(
+    db: AsyncSession,
+    storage_names: Iterable[str],
+) -> Set[str]:
+    """
+    查询给定存储名称中仍被引用的部分
+
+    参数:
+    - db: 数据库会话对象
+    - storage_names: 存储名称
+
+    返回:
+    - 仍被引用的存储名称集合
+    """
+    storage_names = list(storage_names)
+    if not storage_names:
+        return set()
+    result = await db.execute(
+        union_all(
+            *(select(column).where(column.in_(storage_names)) for column in STORAGE_GC_REFERENCES)
+        )
+    )
+    return set(result.scalars().all())
+
+
+async def storage_gc(
+    dry_run: bool = False,
+) -> StorageGCReport:
+    """
+    标记清除回收没有被任何记录引用的存储内容
+
+    遍历存储目录得到所有存储名称，分批查询引用；没有引用且超过宽限期的存储内容
+    在持有存储块记录行锁的情况下再次确认没有引用后删除，与 storage_blob_create 互斥。
+    删除速度受 STORAGE_GC_DELETE_RATE 限制；删除完成后压缩已删除数据过多的打包文件
+
+    参数:
+    - dry_run: 只统计将会删除的存储内容，不实际删除
+
+    返回:
+    - 回收结果
+    """
+    started = time.monotonic()
+    cutoff = time.time() - STORAGE_GC_GRACE_PERIOD
+    # 同一存储名称可能同时有原始版本、压缩版本和旧布局下的文件
+    sizes: Dict[str, int] = {}
+    modified_times: Dict[str, float] = {}
+    for item in await asyncio.to_thread(lambda: list(storage_list())):
+        sizes[item.storage_name] = sizes.get(item.storage_name, 0) + item.size
+        modified_times[item.storage_name] = max(
+            modified_times.get(item.storage_name, 0), item.modified_time
+        )
+
+    storage_names = sorted(sizes)
+    referenced = recent = locked = 0
+    deleted: List[str] = []
+    for start in range(0, len(storage_names), STORAGE_GC_BATCH_SIZE):
+        batch = storage_names[start : start + STORAGE_GC_BATCH_SIZE]
+        async with async_session_maker() as db:
+            # 标记：查询仍被引用的存储名称
+            marked = await storage_gc_referenced(db, batch)
+            referenced += len(marked)
+            candidates = [storage_name for storage_name in batch if storage_name not in marked]
+            old = [
+                storage_name for storage_name in candidates if modified_times[storage_name] < cutoff
+            ]
+            recent += len(candidates) - len(old)
+            if not old:
+                continue
+            if dry_run:
+                deleted.extend(old)
+                continue
+            # 锁住存储块记录，没有记录的先以引用计数 0 登记，正在写入的跳过
+            await db.execute(
+                insert(StorageBlob)
+                .values(
+                    [{"storage_name": storage_name, "reference_count": 0} for storage_name in old]
+                )
+                .on_conflict_do_nothing(index_elements=[StorageBlob.storage_name])
+            )
+            result = await db.execute(
+                select(StorageBlob.storage_name)
+                .where(StorageBlob.storage_name.in_(old))
+                .with_for_update(skip_locked=True)
+            )
+            locked_names = set(result.scalars().all())
+            locked += len(old) - len(locked_names)
+            # 持有行锁后再次确认没有新的引用
+            marked = await storage_gc_referenced(db, locked_names)
+            referenced += len(marked)
+            removed = []
+            for storage_name in sorted(locked_names - marked):
+                try:
+                    await storage_remove_file(storage_name)
+                except FileNotFoundError:
+                    pass
+                removed.append(storage_name)
+                await asyncio.sleep(1 / STORAGE_GC_DELETE_RATE)
+            if removed:
+                await db.execute(delete(StorageBlob).where(StorageBlob.storage_name.in_(removed)))
+            await db.commit()
+            deleted.extend(removed)
+
+    # 压缩打包文件，释放删除标记对应的磁盘空间
+    compacted_bytes = 0 if dry_run else await storage_pack_compact()
+
+    report = StorageGCReport(
+        dry_run=dry_run,
+        scanned=len(storage_names),
+        referenced=referenced,
+        recent=recent,
+        locked=locked,
+        deleted=len(deleted),
+        reclaimed_bytes=sum(sizes[storage_name] for storage_name in deleted),
+        compacted_bytes=compacted_bytes,
+        duration=time.monotonic() - started,
+        storage_names=deleted,
+    )
+    logger.info(
+        "Storage GC %s: scanned %d, referenced %d, recent %d, locked %d, "
+        "%s %d storage names (%d bytes), compacted %d bytes in %.1f seconds",
+        "dry run" if dry_run else "finished",
+        report.scanned,
+        report.referenced,
+        report.recent,
+        report.locked,
+        "would delete" if dry_run else "deleted",
+        report.deleted,
+        report.reclaimed_bytes,
+        report.compacted_bytes,
+        report.duration,
+    )
+    return report
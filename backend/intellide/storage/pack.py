@@ -0,0 +1,482 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from intellide.config import (
+    STORAGE_PACK_ENABLE,
+    STORAGE_PACK_PATH,
+    STORAGE_PACK_THRESHOLD,
+    STORAGE_PACK_MAX_SIZE,
+    STORAGE_PACK_COMPACT_RATIO,
+)
+from intellide.utils.response import APIError, bad_request, payload_too_large
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有文件锁，只能由单个进程写入打包文件
+    fcntl = None
+
+# 打包文件名格式
+_PACK_NAME_PATTERN = re.compile(r"^pack-(\d+)\.pack$")
+# 多个进程之间互斥写入打包文件的锁文件名
+_PACK_LOCK_NAME = "pack.lock"
+
+
+class StoragePackLocation(NamedTuple):
+    """
+    存储块在打包文件中的位置
+
+    属性:
+    - pack_id: 打包文件编号
+    - offset: 在打包文件中的偏移量
+    - size: 字节数
+    """
+
+    pack_id: int
+    offset: int
+    size: int
+
+
+# 存储名称到打包位置的索引
+_pack_index: Dict[str, StoragePackLocation] = {}
+# 打包文件编号到内存映射的缓存
+_pack_maps: Dict[int, mmap.mmap] = {}
+# 打包文件编号到已经读取的索引文件字节数，用于增量读取其他进程追加的记录
+_pack_index_offsets: Dict[int, int] = {}
+# 当前追加写入的打包文件编号和大小
+_pack_current_id: int = 1
+_pack_current_size: int = 0
+# 进程内追加写入的互斥锁，进程之间由打包目录下的文件锁互斥
+_pack_lock = asyncio.Lock()
+# 保护索引和内存映射的线程锁，索引在线程中增量加载
+_pack_thread_lock = threading.Lock()
+
+
+def _storage_pack_data_path(pack_id: int) -> str:
+    """
+    获取打包数据文件的路径
+    """
+    return os.path.join(STORAGE_PACK_PATH, f"pack-{pack_id:06d}.pack")
+
+
+def _storage_pack_index_path(pack_id: int) -> str:
+    """
+    获取打包索引文件的路径
+
+    索引文件每行记录一个存储块 "<存储名称> <偏移量> <字节数>"，
+    或者一个删除标记 "- <存储名称>"
+    """
+    return os.path.join(STORAGE_PACK_PATH, f"pack-{pack_id:06d}.idx")
+
+
+@contextmanager
+def _storage_pack_file_lock() -> Iterator[None]:
+    """
+    同步获取打包目录的文件锁，多个工作进程或命令行工具同时写入打包文件时互斥
+    """
+    with open(os.path.join(STORAGE_PACK_PATH, _PACK_LOCK_NAME), "a") as fp:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+
+def _storage_pack_forget(pack_id: int) -> None:
+    """
+    从索引中移除已删除的打包文件，调用方需要持有线程锁
+    """
+    for storage_name in [
+        storage_name
+        for storage_name, location in _pack_index.items()
+        if location.pack_id == pack_id
+    ]:
+        del _pack_index[storage_name]
+    _pack_index_offsets.pop(pack_id, None)
+    mapped = _pack_maps.pop(pack_id, None)
+    if mapped is not None:
+        mapped.close()
+
+
+def _storage_pack_refresh() -> None:
+    """
+    同步增量加载打包索引，读取其他进程追加的记录，并确定当前追加写入的打包文件
+
+    同一存储名称以后读取到的记录为准，新的存储块只会追加到编号最大的打包文件；
+    删除标记只删除同一打包文件中的记录；已被压缩删除的打包文件中的记录会被移除
+    """
+    global _pack_current_id, _pack_current_size
+    with _pack_thread_lock:
+        pack_ids = sorted(
+            int(match.group(1))
+            for match in map(_PACK_NAME_PATTERN.match, os.listdir(STORAGE_PACK_PATH))
+            if match
+        )
+        for pack_id in set(_pack_index_offsets) - set(pack_ids):
+            _storage_pack_forget(pack_id)
+        for pack_id in pack_ids:
+            offset = _pack_index_offsets.get(pack_id, 0)
+            try:
+                with open(_storage_pack_index_path(pack_id), "rb") as fp:
+                    fp.seek(offset)
+                    data = fp.read()
+            except FileNotFoundError:
+                data = b""
+            # 崩溃或其他进程正在写入时可能留下不完整的最后一行，留到下次读取
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].decode().splitlines():
+                parts = line.split()
+                if len(parts) == 3:
+                    _pack_index[parts[0]] = StoragePackLocation(
+                        pack_id, int(parts[1]), int(parts[2])
+                    )
+                elif len(parts) == 2 and parts[0] == "-":
+                    location = _pack_index.get(parts[1])
+                    if location is not None and location.pack_id == pack_id:
+                        del _pack_index[parts[1]]
+            _pack_index_offsets[pack_id] = offset + end
+        if pack_ids:
+            _pack_current_id = pack_ids[-1]
+        data_path = _storage_pack_data_path(_pack_current_id)
+        _pack_current_size = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+
+
+def _storage_pack_load() -> None:
+    """
+    同步重新加载打包索引
+    """
+    os.makedirs(STORAGE_PACK_PATH, exist_ok=True)
+    with _pack_thread_lock:
+        for pack_id in list(_pack_index_offsets):
+            _storage_pack_forget(pack_id)
+        _pack_index.clear()
+    _storage_pack_refresh()
+
+
+async def storage_pack_load() -> None:
+    """
+    从磁盘加载所有打包文件的索引
+    """
+    await asyncio.to_thread(_storage_pack_load)
+
+
+def storage_pack_accepts(
+    size: int,
+) -> bool:
+    """
+    判断指定大小的存储块是否应该写入打包文件
+
+    参数:
+    - size: 存储块字节数
+
+    返回:
+    - 打包存储已启用且存储块足够小时返回True
+    """
+    return STORAGE_PACK_ENABLE and size <= STORAGE_PACK_THRESHOLD
+
+
+async def storage_pack_locate(
+    storage_name: str,
+) -> Optional[StoragePackLocation]:
+    """
+    查询存储块在打包文件中的位置
+
+    本进程的索引中没有时，可能是其他进程新写入的存储块，增量加载索引后再查询一次
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 打包位置，不在打包文件中时返回 None
+    """
+    location = _pack_index.get(storage_name)
+    if location is None and (STORAGE_PACK_ENABLE or _pack_index_offsets):
+        await asyncio.to_thread(_storage_pack_refresh)
+        location = _pack_index.get(storage_name)
+    return location
+
+
+def storage_pack_list() -> List[Tuple[str, StoragePackLocation, float]]:
+    """
+    同步列出打包文件中的所有存储块
+
+    返回:
+    - (存储名称, 打包位置, 所在打包文件的最后修改时间戳) 列表
+    """
+    _storage_pack_refresh()
+    with _pack_thread_lock:
+        locations = list(_pack_index.items())
+    modified_times: Dict[int, Optional[float]] = {}
+    items = []
+    for storage_name, location in locations:
+        if location.pack_id not in modified_times:
+            try:
+                modified_times[location.pack_id] = os.path.getmtime(
+                    _storage_pack_data_path(location.pack_id)
+                )
+            except FileNotFoundError:
+                # 打包文件刚被其他进程压缩删除，存储块已经复制到新的打包文件
+                modified_times[location.pack_id] = None
+        modified_time = modified_times[location.pack_id]
+        if modified_time is not None:
+            items.append((storage_name, location, modified_time))
+    return items
+
+
+def _storage_pack_append(
+    pack_id: int,
+    storage_name: str,
+    content: bytes,
+) -> int:
+    """
+    同步追加写入存储块到打包文件，返回存储块的偏移量
+    """
+    # 先写数据再写索引，崩溃时最多留下没有索引的无用数据
+    with open(_storage_pack_data_path(pack_id), "ab") as fp:
+        offset = fp.tell()
+        fp.write(content)
+        fp.flush()
+        os.fsync(fp.fileno())
+    with open(_storage_pack_index_path(pack_id), "a") as fp:
+        fp.write(f"{storage_name} {offset} {len(content)}\n")
+        fp.flush()
+        os.fsync(fp.fileno())
+    return offset
+
+
+def _storage_pack_append_locked(
+    storage_name: str,
+    content: bytes,
+) -> None:
+    """
+    同步追加写入存储块到当前打包文件并更新索引，调用方需要持有文件锁并已增量加载索引
+    """
+    global _pack_current_id, _pack_current_size
+    # 当前打包文件写满后切换到新的打包文件
+    if _pack_current_size and _pack_current_size + len(content) > STORAGE_PACK_MAX_SIZE:
+        _pack_current_id += 1
+        _pack_current_size = 0
+    offset = _storage_pack_append(_pack_current_id, storage_name, content)
+    with _pack_thread_lock:
+        _pack_current_size = offset + len(content)
+        _pack_index[storage_name] = StoragePackLocation(_pack_current_id, offset, len(content))
+
+
+def _storage_pack_write(
+    storage_name: str,
+    content: bytes,
+) -> None:
+    """
+    同步在文件锁内追加写入存储块
+    """
+    with _storage_pack_file_lock():
+        # 其他进程可能已经追加写入或切换了打包文件
+        _storage_pack_refresh()
+        _storage_pack_append_locked(storage_name, content)
+
+
+async def storage_pack_write_stream(
+    storage_name: str,
+    stream: AsyncIterator[bytes],
+    max_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
+) -> int:
+    """
+    将小存储块追加写入当前打包文件
+
+    参数:
+    - storage_name: 存储名称
+    - stream: 内容的异步迭代器
+    - max_size: 最大字节数（可选），不提供时使用打包阈值
+    - content_hash: 期望的内容 SHA-256 哈希值（可选）
+
+    返回:
+    - 写入的字节数
+
+    异常:
+    - APIError: 当内容超过大小限制或内容哈希不一致时抛出
+    """
+    if max_size is None:
+        max_size = STORAGE_PACK_THRESHOLD
+    chunks = []
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+        if size > max_size:
+            raise APIError(payload_too_large, f"File exceeds the maximum size of {max_size} bytes")
+        chunks.append(chunk)
+    content = b"".join(chunks)
+    if content_hash is not None and hashlib.sha256(content).hexdigest() != content_hash:
+        raise APIError(bad_request, "File content changed while writing")
+    async with _pack_lock:
+        await asyncio.to_thread(_storage_pack_write, storage_name, content)
+    return len(content)
+
+
+def _storage_pack_read(
+    location: StoragePackLocation,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> bytes:
+    """
+    同步通过内存映射读取打包文件中的存储块
+
+    打包文件只会追加写入，映射长度不足时重新映射
+
+    异常:
+    - FileNotFoundError: 当打包文件已被压缩删除时抛出
+    """
+    if length is None:
+        length = location.size - offset
+    length = max(0, min(length, location.size - offset))
+    if length == 0:
+        return b""
+    start = location.offset + offset
+    with _pack_thread_lock:
+        mapped = _pack_maps.get(location.pack_id)
+        if mapped is None or len(mapped) < start + length:
+            if mapped is not None:
+                mapped.close()
+                del _pack_maps[location.pack_id]
+            with open(_storage_pack_data_path(location.pack_id), "rb") as fp:
+                mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            _pack_maps[location.pack_id] = mapped
+        return mapped[start : start + length]
+
+
+async def storage_pack_read(
+    storage_name: str,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> Optional[bytes]:
+    """
+    读取打包文件中的存储块，内存映射的读取在线程中进行
+
+    参数:
+    - storage_name: 存储名称
+    - offset: 存储块内的起始偏移量
+    - length: 读取的字节数（可选），不提供时读取到存储块末尾
+
+    返回:
+    - 读取的内容，不在打包文件中时返回 None
+    """
+    location = await storage_pack_locate(storage_name)
+    if location is None:
+        return None
+    try:
+        return await asyncio.to_thread(_storage_pack_read, location, offset, length)
+    except FileNotFoundError:
+        # 打包文件已被其他进程压缩删除，增量加载索引后从新的位置读取
+        await asyncio.to_thread(_storage_pack_refresh)
+        location = _pack_index.get(storage_name)
+        if location is None:
+            return None
+        return await asyncio.to_thread(_storage_pack_read, location, offset, length)
+
+
+def _storage_pack_remove(
+    storage_name: str,
+) -> bool:
+    """
+    同步在文件锁内为存储块追加删除标记
+    """
+    with _storage_pack_file_lock():
+        _storage_pack_refresh()
+        with _pack_thread_lock:
+            location = _pack_index.pop(storage_name, None)
+        if location is None:
+            return False
+        with open(_storage_pack_index_path(location.pack_id), "a") as fp:
+            fp.write(f"- {storage_name}\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+    return True
+
+
+async def storage_pack_remove(
+    storage_name: str,
+) -> bool:
+    """
+    从打包索引中删除存储块
+
+    只追加删除标记，打包文件中的数据在压缩时释放
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 存储块在打包文件中时返回True，否则返回False
+    """
+    async with _pack_lock:
+        return await asyncio.to_thread(_storage_pack_remove, storage_name)
+
+
+def _storage_pack_compact(
+    min_garbage_ratio: float,
+) -> int:
+    """
+    同步在文件锁内压缩打包文件，返回释放的字节数
+    """
+    freed = 0
+    with _storage_pack_file_lock():
+        _storage_pack_refresh()
+        with _pack_thread_lock:
+            live: Dict[int, List[Tuple[str, StoragePackLocation]]] = {
+                pack_id: [] for pack_id in _pack_index_offsets
+            }
+            for storage_name, location in _pack_index.items():
+                live.setdefault(location.pack_id, []).append((storage_name, location))
+        for pack_id, items in sorted(live.items()):
+            # 当前追加写入的打包文件不压缩
+            if pack_id == _pack_current_id:
+                continue
+            try:
+                total_size = os.path.getsize(_storage_pack_data_path(pack_id))
+            except FileNotFoundError:
+                total_size = 0
+            live_size = sum(location.size for _, location in items)
+            if live_size > total_size * (1 - min_garbage_ratio):
+                continue
+            # 先把仍在使用的存储块复制到当前打包文件，新的记录覆盖旧的记录
+            for storage_name, location in sorted(items, key=lambda item: item[1].offset):
+                _storage_pack_append_locked(storage_name, _storage_pack_read(location))
+            # 先删除索引再删除数据，崩溃时只留下没有索引的数据，下次压缩时删除
+            for path in (_storage_pack_index_path(pack_id), _storage_pack_data_path(pack_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            with _pack_thread_lock:
+                _storage_pack_forget(pack_id)
+            freed += total_size - live_size
+    return freed
+
+
+async def storage_pack_compact(
+    min_garbage_ratio: float = STORAGE_PACK_COMPACT_RATIO,
+) -> int:
+    """
+    压缩已删除数据占比达到阈值的打包文件
+
+    仍在使用的存储块复制到当前打包文件后删除旧的打包文件，释放删除标记对应的磁盘空间；
+    其他进程读取时发现打包文件不存在会增量加载索引后从新的位置读取
+
+    参数:
+    - min_garbage_ratio: 已删除数据占打包文件大小的最小比例
+
+    返回:
+    - 释放的字节数
+    """
+    if not _pack_index_offsets:
+        return 0
+    async with _pack_lock:
+        return await asyncio.to_thread(_storage_pack_compact, min_garbage_ratio)
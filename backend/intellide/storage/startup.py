@@ -1,10 +1,14 @@
 import aiofiles.os
 
-from intellide.config import STORAGE_PATH
+from intellide.config import STORAGE_PATH, STORAGE_TEMP_PATH, STORAGE_UPLOAD_PATH
+from intellide.storage.pack import storage_pack_load
 
 
 async def startup():
     """
-    异步创建存储目录（如果不存在）
+    异步创建存储目录（如果不存在），并加载打包存储的索引
     """
     await aiofiles.os.makedirs(STORAGE_PATH, exist_ok=True)
+    await aiofiles.os.makedirs(STORAGE_TEMP_PATH, exist_ok=True)
+    await aiofiles.os.makedirs(STORAGE_UPLOAD_PATH, exist_ok=True)
+    await storage_pack_load()
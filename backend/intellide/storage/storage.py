@@ -1,12 +1,44 @@
+import asyncio
+import hashlib
 import mimetypes
 import os
+import re
+import shutil
 import uuid
+import zipfile
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, Iterable, Iterator, Optional, List, Tuple, Mapping, NamedTuple
 
 import aiofiles
 import aiofiles.os
-from fastapi.responses import FileResponse
+from fastapi import UploadFile, status
+from fastapi.responses import Response, StreamingResponse
 
-from intellide.config import STORAGE_PATH
+from intellide.config import (
+    STORAGE_PATH,
+    STORAGE_TEMP_PATH,
+    STORAGE_CHUNK_SIZE,
+    STORAGE_UPLOAD_PATH,
+    STORAGE_SHARD_LEVELS,
+    STORAGE_COMPRESS_ENABLE,
+    STORAGE_COMPRESS_LEVEL,
+    STORAGE_COMPRESS_MIN_SIZE,
+    STORAGE_COMPRESS_MEDIA_TYPES,
+)
+from intellide.storage.pack import (
+    storage_pack_list,
+    storage_pack_locate,
+    storage_pack_read,
+    storage_pack_remove,
+)
+from intellide.utils.response import APIError, payload_too_large, bad_request
+
+# 存储文件名格式：十六进制存储名称，压缩版本带有 .gz 后缀
+_STORAGE_NAME_PATTERN = re.compile(r"^([0-9a-f]+)(?:\.gz)?$")
+# 分片目录名格式
+_STORAGE_SHARD_PATTERN = re.compile(r"^[0-9a-f]{2}$")
 
 
 def storage_name_create() -> str:
@@ -19,29 +51,442 @@ def storage_name_create() -> str:
     return uuid.uuid4().hex
 
 
-def storage_path(storage_name: str) -> str:
+def storage_flat_path(storage_name: str) -> str:
     """
-    获取存储路径
+    获取旧的平铺布局下的存储路径
 
     参数:
     - storage_name: 存储名称
 
     返回:
-    - 完整的存储路径
+    - STORAGE_PATH 下直接以存储名称命名的路径
     """
     return os.path.join(STORAGE_PATH, storage_name)
 
 
+def storage_shard_path(storage_name: str) -> str:
+    """
+    获取分片布局下的存储路径
+
+    使用存储名称的前几组十六进制字符作为多级子目录，例如两级分片时
+    0123abcd... 存储在 01/23/0123abcd...，避免单个目录中文件过多
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 分片布局下的存储路径
+    """
+    if len(storage_name) < 2 * STORAGE_SHARD_LEVELS:
+        return storage_flat_path(storage_name)
+    shards = [storage_name[2 * level : 2 * level + 2] for level in range(STORAGE_SHARD_LEVELS)]
+    return os.path.join(STORAGE_PATH, *shards, storage_name)
+
+
+async def storage_path(storage_name: str) -> str:
+    """
+    异步获取存储路径
+
+    迁移期间同时兼容两种布局：优先使用分片布局，
+    只有分片布局下不存在而平铺布局下存在时才返回平铺布局的路径
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 完整的存储路径
+    """
+    shard_path = storage_shard_path(storage_name)
+    if not await aiofiles.os.path.exists(shard_path):
+        flat_path = storage_flat_path(storage_name)
+        if await aiofiles.os.path.exists(flat_path):
+            return flat_path
+    return shard_path
+
+
+def storage_migrate_layout(
+    limit: Optional[int] = None,
+) -> int:
+    """
+    将平铺布局下的存储文件迁移到分片布局，可以在服务运行时执行
+
+    先创建分片布局下的硬链接再删除平铺布局下的文件，迁移过程中任意时刻
+    至少有一个路径可以读到文件；分片布局下已存在同名文件时说明其已被重新写入，
+    直接删除平铺布局下的旧文件
+
+    参数:
+    - limit: 最多迁移的文件数量（可选）
+
+    返回:
+    - 迁移的文件数量
+    """
+    migrated = 0
+    with os.scandir(STORAGE_PATH) as entries:
+        for entry in entries:
+            if limit is not None and migrated >= limit:
+                break
+            # 只迁移平铺布局下的文件，跳过分片目录、临时目录和分块上传目录
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            shard_path = storage_shard_path(entry.name)
+            if shard_path == entry.path:
+                continue
+            os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+            try:
+                os.link(entry.path, shard_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                # 文件系统不支持硬链接时退化为原子重命名
+                os.replace(entry.path, shard_path)
+                migrated += 1
+                continue
+            os.remove(entry.path)
+            migrated += 1
+    return migrated
+
+
+class StorageItem(NamedTuple):
+    """
+    存储目录中的一个存储内容
+
+    属性:
+    - storage_name: 存储名称，压缩版本也使用原始的存储名称
+    - size: 在磁盘上占用的字节数
+    - modified_time: 最后修改时间戳
+    """
+
+    storage_name: str
+    size: int
+    modified_time: float
+
+
+def storage_list() -> Iterator[StorageItem]:
+    """
+    同步遍历所有存储内容，包括两种布局下的独立文件和打包存储中的存储块，
+    跳过临时目录、分块上传目录和打包目录
+
+    返回:
+    - 存储内容的迭代器，同一存储名称的原始版本和压缩版本会分别出现
+    """
+
+    def scan(path: str, level: int) -> Iterator[StorageItem]:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # 分片目录以两个十六进制字符命名
+                    if level < STORAGE_SHARD_LEVELS and _STORAGE_SHARD_PATTERN.match(entry.name):
+                        yield from scan(entry.path, level + 1)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                match = _STORAGE_NAME_PATTERN.match(entry.name)
+                if match is None:
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                yield StorageItem(match.group(1), stat.st_size, stat.st_mtime)
+
+    yield from scan(STORAGE_PATH, 0)
+    for storage_name, location, modified_time in storage_pack_list():
+        match = _STORAGE_NAME_PATTERN.match(storage_name)
+        if match is not None:
+            yield StorageItem(match.group(1), location.size, modified_time)
+
+
+def storage_temp_path() -> str:
+    """
+    获取一个新的临时文件路径
+
+    返回:
+    - 临时文件路径
+    """
+    return os.path.join(STORAGE_TEMP_PATH, uuid.uuid4().hex)
+
+
+def storage_gzip_name(
+    storage_name: str,
+) -> str:
+    """
+    获取存储文件 gzip 压缩版本的存储名称
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 压缩版本的存储名称
+    """
+    return f"{storage_name}.gz"
+
+
+def storage_media_type(
+    file_name: str,
+) -> str:
+    """
+    根据文件名称推断文件的 MIME 类型
+
+    参数:
+    - file_name: 文件名称
+
+    返回:
+    - MIME 类型，无法推断时返回 application/octet-stream
+    """
+    media_type, _ = mimetypes.guess_type(file_name)
+    return media_type or "application/octet-stream"
+
+
+def storage_compressible(
+    file_name: str,
+    size: int,
+) -> bool:
+    """
+    根据文件的 MIME 类型和大小判断是否应该压缩存储
+
+    参数:
+    - file_name: 文件名称
+    - size: 文件字节数
+
+    返回:
+    - 应该压缩存储返回True，否则返回False
+    """
+    if not STORAGE_COMPRESS_ENABLE or size < STORAGE_COMPRESS_MIN_SIZE:
+        return False
+    media_type, encoding = mimetypes.guess_type(file_name)
+    # 已经压缩过的文件（例如 .tar.gz）不再压缩
+    if media_type is None or encoding is not None:
+        return False
+    return media_type.startswith(STORAGE_COMPRESS_MEDIA_TYPES)
+
+
+async def storage_gzip_stream(
+    stream: AsyncIterator[bytes],
+) -> AsyncIterator[bytes]:
+    """
+    以 gzip 格式流式压缩数据流
+
+    参数:
+    - stream: 内容的异步迭代器
+
+    返回:
+    - 压缩内容的异步迭代器
+    """
+    compressor = zlib.compressobj(STORAGE_COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in stream:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def storage_gunzip_stream(
+    stream: AsyncIterator[bytes],
+) -> AsyncIterator[bytes]:
+    """
+    流式解压 gzip 格式的数据流
+
+    参数:
+    - stream: 压缩内容的异步迭代器
+
+    返回:
+    - 解压内容的异步迭代器
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    async for chunk in stream:
+        decompressed = decompressor.decompress(chunk)
+        if decompressed:
+            yield decompressed
+    decompressed = decompressor.flush()
+    if decompressed:
+        yield decompressed
+
+
+async def _storage_stored_exists(
+    storage_name: str,
+) -> bool:
+    """
+    检查存储名称对应的内容是否存在于打包存储或独立文件中
+    """
+    if await storage_pack_locate(storage_name) is not None:
+        return True
+    return await aiofiles.os.path.exists(await storage_path(storage_name))
+
+
+async def _storage_stored_size(
+    storage_name: str,
+) -> int:
+    """
+    获取存储名称对应的内容在磁盘上的字节数
+    """
+    location = await storage_pack_locate(storage_name)
+    if location is not None:
+        return location.size
+    return await aiofiles.os.path.getsize(await storage_path(storage_name))
+
+
+async def _storage_stored_iterate(
+    storage_name: str,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    按块迭代存储名称对应的内容在磁盘上的字节，同时支持打包存储和独立文件
+    """
+    content = await storage_pack_read(storage_name, offset, length)
+    if content is not None:
+        if content:
+            yield content
+        return
+    async for chunk in storage_iterate_file(
+        await storage_path(storage_name), offset=offset, length=length
+    ):
+        yield chunk
+
+
+async def storage_compressed(
+    storage_name: str,
+) -> bool:
+    """
+    检查存储文件是否以 gzip 压缩的形式存储
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 压缩存储返回True，否则返回False
+    """
+    return not await _storage_stored_exists(storage_name) and await _storage_stored_exists(
+        storage_gzip_name(storage_name)
+    )
+
+
+async def storage_exists(
+    storage_name: str,
+) -> bool:
+    """
+    检查存储文件是否存在（原始或压缩形式）
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 存在返回True，否则返回False
+    """
+    return await _storage_stored_exists(storage_name) or await _storage_stored_exists(
+        storage_gzip_name(storage_name)
+    )
+
+
+async def storage_size(
+    storage_name: str,
+) -> int:
+    """
+    获取存储文件解压后的字节数
+
+    参数:
+    - storage_name: 存储名称
+
+    返回:
+    - 字节数
+    """
+    if not await storage_compressed(storage_name):
+        return await _storage_stored_size(storage_name)
+    # gzip 尾部的 ISIZE 字段记录了原始内容字节数对 2^32 取模的值，上传大小限制保证不会溢出
+    gzip_name = storage_gzip_name(storage_name)
+    stored_size = await _storage_stored_size(gzip_name)
+    trailer = b"".join(
+        [chunk async for chunk in _storage_stored_iterate(gzip_name, offset=stored_size - 4)]
+    )
+    return int.from_bytes(trailer, "little")
+
+
+async def storage_iterate(
+    storage_name: str,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    按块迭代存储文件的原始内容，同时支持打包存储、独立文件和压缩存储
+
+    参数:
+    - storage_name: 存储名称
+    - offset: 起始偏移量
+    - length: 读取的字节数（可选），不提供时读取到文件末尾
+
+    返回:
+    - 文件内容块的异步迭代器
+    """
+    if not await storage_compressed(storage_name):
+        async for chunk in _storage_stored_iterate(storage_name, offset=offset, length=length):
+            yield chunk
+        return
+    # 压缩存储无法随机访问，解压时跳过偏移量之前的内容
+    async for chunk in storage_gunzip_stream(
+        _storage_stored_iterate(storage_gzip_name(storage_name))
+    ):
+        if offset >= len(chunk):
+            offset -= len(chunk)
+            continue
+        chunk = chunk[offset:]
+        offset = 0
+        if length is not None:
+            chunk = chunk[:length]
+            length -= len(chunk)
+        if chunk:
+            yield chunk
+        if length is not None and length <= 0:
+            break
+
+
+async def storage_hash_stream(
+    stream: AsyncIterator[bytes],
+    max_size: Optional[int] = None,
+) -> Tuple[str, int]:
+    """
+    计算数据流的 SHA-256 哈希值和字节数，不写入磁盘
+
+    参数:
+    - stream: 内容的异步迭代器
+    - max_size: 最大字节数（可选）
+
+    返回:
+    - (十六进制哈希值, 字节数) 元组
+
+    异常:
+    - APIError: 当内容超过大小限制时抛出
+    """
+    size = 0
+    digest = hashlib.sha256()
+    async for chunk in stream:
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise APIError(payload_too_large, f"File exceeds the maximum size of {max_size} bytes")
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+
 async def storage_remove_file(
     storage_name: str,
 ) -> None:
     """
-    异步删除文件
+    异步删除文件，打包存储、两种布局下的文件以及压缩版本都会被删除
 
     参数:
     - storage_name: 存储名称
+
+    异常:
+    - FileNotFoundError: 当所有位置都不存在该文件时抛出
     """
-    await aiofiles.os.remove(storage_path(storage_name))
+    removed = False
+    for name in (storage_name, storage_gzip_name(storage_name)):
+        if await storage_pack_remove(name):
+            removed = True
+        for path in {storage_shard_path(name), storage_flat_path(name)}:
+            try:
+                await aiofiles.os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                pass
+    if not removed:
+        raise FileNotFoundError(storage_shard_path(storage_name))
 
 
 async def storage_write_file(
@@ -55,8 +500,145 @@ async def storage_write_file(
     - storage_name: 存储名称
     - content: 文件内容
     """
-    async with aiofiles.open(storage_path(storage_name), "wb") as fp:
-        await fp.write(content)
+
+    async def stream():
+        yield content
+
+    await storage_write_stream(
+        storage_name=storage_name,
+        stream=stream(),
+    )
+
+
+async def _storage_write_stream(
+    path: str,
+    stream: AsyncIterator[bytes],
+    max_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
+    expected_size: Optional[int] = None,
+) -> int:
+    """
+    异步流式写入文件到指定路径
+
+    数据先写入临时文件，全部写入成功后再重命名到目标路径，
+    超过大小限制、大小或内容哈希不一致或写入失败时删除临时文件
+
+    参数:
+    - path: 目标路径
+    - stream: 文件内容的异步迭代器
+    - max_size: 文件的最大字节数（可选）
+    - content_hash: 期望的内容 SHA-256 哈希值（可选）
+    - expected_size: 期望的文件字节数（可选）
+
+    返回:
+    - 写入的字节数
+
+    异常:
+    - APIError: 当文件超过大小限制、大小或内容哈希不一致时抛出
+    """
+    size = 0
+    digest = hashlib.sha256()
+    temp_path = storage_temp_path()
+    try:
+        async with aiofiles.open(temp_path, "wb") as fp:
+            async for chunk in stream:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise APIError(
+                        payload_too_large, f"File exceeds the maximum size of {max_size} bytes"
+                    )
+                if content_hash is not None:
+                    digest.update(chunk)
+                await fp.write(chunk)
+        if content_hash is not None and digest.hexdigest() != content_hash:
+            raise APIError(bad_request, "File content changed while writing")
+        if expected_size is not None and size != expected_size:
+            raise APIError(bad_request, f"File must be exactly {expected_size} bytes")
+        # 写入完成后原子地重命名，避免读到写了一半的文件
+        await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+        await aiofiles.os.replace(temp_path, path)
+    finally:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+    return size
+
+
+async def storage_write_stream(
+    storage_name: str,
+    stream: AsyncIterator[bytes],
+    max_size: Optional[int] = None,
+    content_hash: Optional[str] = None,
+) -> int:
+    """
+    异步流式写入文件
+
+    新文件总是写入分片布局，写入后删除平铺布局和打包存储中可能存在的旧内容
+
+    参数:
+    - storage_name: 存储名称
+    - stream: 文件内容的异步迭代器
+    - max_size: 文件的最大字节数（可选）
+    - content_hash: 期望的内容 SHA-256 哈希值（可选）
+
+    返回:
+    - 写入的字节数
+    """
+    size = await _storage_write_stream(
+        path=storage_shard_path(storage_name),
+        stream=stream,
+        max_size=max_size,
+        content_hash=content_hash,
+    )
+    flat_path = storage_flat_path(storage_name)
+    if flat_path != storage_shard_path(storage_name):
+        try:
+            await aiofiles.os.remove(flat_path)
+        except FileNotFoundError:
+            pass
+    await storage_pack_remove(storage_name)
+    return size
+
+
+async def storage_iterate_upload_file(
+    file: UploadFile,
+    chunk_size: int = STORAGE_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    从头按块迭代上传文件的内容
+
+    参数:
+    - file: 上传的文件
+    - chunk_size: 块大小
+
+    返回:
+    - 文件内容块的异步迭代器
+    """
+    await file.seek(0)
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def storage_write_upload_file(
+    storage_name: str,
+    file: UploadFile,
+    max_size: Optional[int] = None,
+) -> int:
+    """
+    异步流式写入上传的文件
+
+    参数:
+    - storage_name: 存储名称
+    - file: 上传的文件
+    - max_size: 文件的最大字节数（可选）
+
+    返回:
+    - 写入的字节数
+    """
+    return await storage_write_stream(
+        storage_name=storage_name,
+        stream=storage_iterate_upload_file(file),
+        max_size=max_size,
+    )
 
 
 async def storage_read_file(
@@ -71,32 +653,500 @@ async def storage_read_file(
     返回:
     - 文件内容
     """
-    async with aiofiles.open(storage_path(storage_name), "rb") as fp:
+    if await storage_compressed(storage_name):
+        return b"".join([chunk async for chunk in storage_iterate(storage_name)])
+    content = await storage_pack_read(storage_name)
+    if content is not None:
+        return content
+    async with aiofiles.open(await storage_path(storage_name), "rb") as fp:
         return await fp.read()
 
+
+async def storage_iterate_file(
+    path: str,
+    chunk_size: int = STORAGE_CHUNK_SIZE,
+    offset: int = 0,
+    length: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    按块迭代文件的内容
+
+    参数:
+    - path: 文件路径
+    - chunk_size: 块大小
+    - offset: 起始偏移量
+    - length: 读取的字节数（可选），不提供时读取到文件末尾
+
+    返回:
+    - 文件内容块的异步迭代器
+    """
+    async with aiofiles.open(path, "rb") as fp:
+        if offset:
+            await fp.seek(offset)
+        while length is None or length > 0:
+            chunk = await fp.read(chunk_size if length is None else min(chunk_size, length))
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+
+
+def storage_upload_path(
+    upload_name: str,
+    index: Optional[int] = None,
+) -> str:
+    """
+    获取分块上传的存储路径
+
+    参数:
+    - upload_name: 分块上传的存储名称
+    - index: 分块序号（可选），不提供时返回分块所在的目录
+
+    返回:
+    - 分块目录或分块文件的路径
+    """
+    if index is None:
+        return os.path.join(STORAGE_UPLOAD_PATH, upload_name)
+    return os.path.join(STORAGE_UPLOAD_PATH, upload_name, str(index))
+
+
+async def storage_upload_write_chunk(
+    upload_name: str,
+    index: int,
+    stream: AsyncIterator[bytes],
+    max_size: Optional[int] = None,
+    expected_size: Optional[int] = None,
+) -> int:
+    """
+    异步写入一个上传分块，同一分块重复上传时覆盖旧内容
+
+    大小不正确的分块不会出现在分块目录中，也不会覆盖已经上传的旧内容
+
+    参数:
+    - upload_name: 分块上传的存储名称
+    - index: 分块序号
+    - stream: 分块内容的异步迭代器
+    - max_size: 分块的最大字节数（可选）
+    - expected_size: 分块应有的字节数（可选）
+
+    返回:
+    - 写入的字节数
+
+    异常:
+    - APIError: 当分块超过大小限制或大小不正确时抛出
+    """
+    await aiofiles.os.makedirs(storage_upload_path(upload_name), exist_ok=True)
+    return await _storage_write_stream(
+        path=storage_upload_path(upload_name, index),
+        stream=stream,
+        max_size=max_size,
+        expected_size=expected_size,
+    )
+
+
+async def storage_upload_list_chunks(
+    upload_name: str,
+) -> List[int]:
+    """
+    列出已经上传完成的分块序号
+
+    参数:
+    - upload_name: 分块上传的存储名称
+
+    返回:
+    - 升序排列的分块序号列表
+    """
+    path = storage_upload_path(upload_name)
+    if not await aiofiles.os.path.isdir(path):
+        return []
+    return sorted(int(name) for name in await aiofiles.os.listdir(path) if name.isdigit())
+
+
+async def storage_upload_chunk_size(
+    upload_name: str,
+    index: int,
+) -> int:
+    """
+    获取已上传分块的字节数
+
+    参数:
+    - upload_name: 分块上传的存储名称
+    - index: 分块序号
+
+    返回:
+    - 分块的字节数
+    """
+    return await aiofiles.os.path.getsize(storage_upload_path(upload_name, index))
+
+
+async def storage_upload_iterate_chunks(
+    upload_name: str,
+    chunk_count: int,
+) -> AsyncIterator[bytes]:
+    """
+    按序号顺序迭代所有分块的内容
+
+    参数:
+    - upload_name: 分块上传的存储名称
+    - chunk_count: 分块数量
+
+    返回:
+    - 文件内容块的异步迭代器
+    """
+    for index in range(chunk_count):
+        async for chunk in storage_iterate_file(storage_upload_path(upload_name, index)):
+            yield chunk
+
+
+async def storage_upload_remove(
+    upload_name: str,
+) -> None:
+    """
+    异步删除分块上传的所有分块
+
+    参数:
+    - upload_name: 分块上传的存储名称
+    """
+    await asyncio.to_thread(shutil.rmtree, storage_upload_path(upload_name), True)
+
+
+def _storage_http_date(
+    value: datetime,
+) -> str:
+    """
+    将本地时间转换为 HTTP 日期格式
+
+    参数:
+    - value: 本地时间
+
+    返回:
+    - HTTP 日期字符串
+    """
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def _storage_etag_match(
+    header: str,
+    etag: str,
+) -> bool:
+    """
+    检查 If-None-Match / If-Range 请求头是否与 ETag 匹配
+
+    参数:
+    - header: 请求头的值
+    - etag: 带引号的 ETag
+
+    返回:
+    - 匹配返回True，否则返回False
+    """
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def _storage_not_modified_since(
+    header: str,
+    last_modified: datetime,
+) -> bool:
+    """
+    检查资源在 If-Modified-Since 请求头给出的时间之后是否没有修改
+
+    参数:
+    - header: 请求头的值
+    - last_modified: 资源的最后修改时间（本地时间）
+
+    返回:
+    - 没有修改返回True，否则返回False；请求头无法解析时返回False
+    """
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+
+
+def _storage_parse_range(
+    header: str,
+    size: int,
+) -> Optional[Tuple[int, int]]:
+    """
+    解析 Range 请求头，只支持单个字节范围
+
+    参数:
+    - header: 请求头的值，例如 bytes=0-99、bytes=100- 或 bytes=-100
+    - size: 文件字节数
+
+    返回:
+    - (起始偏移量, 结束偏移量) 闭区间；范围不可满足时起始偏移量不小于文件大小；
+      请求头无法解析或包含多个范围时返回 None，表示忽略 Range 返回完整内容
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, sep, end = ranges.strip().partition("-")
+    if (
+        not sep
+        or not (start or end)
+        or (start and not start.isdigit())
+        or (end and not end.isdigit())
+    ):
+        return None
+    # 后缀范围：最后 N 个字节
+    if not start:
+        suffix = int(end)
+        if suffix == 0:
+            return size, size
+        return max(size - suffix, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end and start < size:
+        return None
+    return start, end
+
+
+def _storage_accepts_gzip(
+    header: str,
+) -> bool:
+    """
+    检查 Accept-Encoding 请求头是否接受 gzip 编码
+
+    参数:
+    - header: 请求头的值
+
+    返回:
+    - 接受 gzip 编码返回True，否则返回False
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted.get("gzip", accepted.get("*", 0.0)) > 0
+
+
 # TODO
 # 不支持非英文文件名
-def storage_get_file_response(
+async def storage_get_file_response(
     storage_name: str,
     file_name: str,
-) -> FileResponse:
+    headers: Optional[Mapping[str, str]] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+    media_type: Optional[str] = None,
+    size: Optional[int] = None,
+) -> Response:
     """
-    获取文件响应
+    获取文件响应，支持条件请求和范围请求
+
+    - If-None-Match 与 ETag 匹配，或资源在 If-Modified-Since 之后没有修改时返回 304
+    - Range 请求单个字节范围时返回 206，范围不可满足时返回 416
+    - If-Range 与当前 ETag 或修改时间不一致时忽略 Range，返回完整内容
+    - 压缩存储的文件在客户端接受 gzip 时直接返回压缩内容，否则流式解压后返回；
+      两种表示使用不同的 ETag，范围请求针对所返回的表示
 
     参数:
     - storage_name: 存储名称
     - file_name: 文件名称
+    - headers: 请求头（可选）
+    - etag: 由文件内容决定的强 ETag，不含引号（可选）
+    - last_modified: 文件最后修改时间（可选）
+    - media_type: 文件的 MIME 类型（可选），不提供时根据文件名称推断
+    - size: 文件原始内容的字节数（可选），不提供时从存储中读取
 
     返回:
     - 文件响应
     """
-    # 使用 mimetypes.guess_type 来获取文件的 MIME 类型
-    media_type, _ = mimetypes.guess_type(file_name)
+    headers = headers or {}
     if media_type is None:
-        media_type = "application/octet-stream"
-    # 返回文件
-    return FileResponse(
-        storage_path(storage_name),
+        media_type = storage_media_type(file_name)
+    # 缓存校验相关的响应头
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={file_name}",
+    }
+    # 选择返回的表示：压缩存储的文件在客户端接受 gzip 时返回压缩内容
+    compressed = await storage_compressed(storage_name)
+    encoded = compressed and _storage_accepts_gzip(headers.get("accept-encoding", ""))
+    if compressed:
+        response_headers["Vary"] = "Accept-Encoding"
+    if encoded:
+        response_headers["Content-Encoding"] = "gzip"
+        etag = f"{etag}-gzip" if etag else None
+    quoted_etag = f'"{etag}"' if etag else None
+    if quoted_etag:
+        response_headers["ETag"] = quoted_etag
+    if last_modified:
+        response_headers["Last-Modified"] = _storage_http_date(last_modified)
+
+    # 条件请求：If-None-Match 优先于 If-Modified-Since
+    if_none_match = headers.get("if-none-match")
+    if_modified_since = headers.get("if-modified-since")
+    if if_none_match is not None:
+        if quoted_etag and _storage_etag_match(if_none_match, quoted_etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+    elif if_modified_since is not None and last_modified:
+        if _storage_not_modified_since(if_modified_since, last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+
+    if encoded:
+        gzip_name = storage_gzip_name(storage_name)
+        size = await _storage_stored_size(gzip_name)
+
+        def iterate(offset: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+            return _storage_stored_iterate(gzip_name, offset=offset, length=length)
+
+    else:
+        if size is None:
+            size = await storage_size(storage_name)
+
+        def iterate(offset: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+            return storage_iterate(storage_name, offset=offset, length=length)
+
+    # 范围请求
+    byte_range = None
+    range_header = headers.get("range")
+    if range_header is not None:
+        if_range = headers.get("if-range")
+        if (
+            if_range is None
+            or (quoted_etag and if_range.strip() == quoted_etag)
+            or (last_modified and if_range.strip() == response_headers.get("Last-Modified"))
+        ):
+            byte_range = _storage_parse_range(range_header, size)
+    if byte_range is not None:
+        start, end = byte_range
+        if start >= size:
+            return Response(
+                status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+                headers={**response_headers, "Content-Range": f"bytes */{size}"},
+            )
+        return StreamingResponse(
+            iterate(offset=start, length=end - start + 1),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers={
+                **response_headers,
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1),
+            },
+        )
+
+    # 返回完整文件
+    return StreamingResponse(
+        iterate(),
         media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={file_name}"},
+        headers={
+            **response_headers,
+            "Content-Length": str(size),
+        },
+    )
+
+
+class StorageZipItem(NamedTuple):
+    """
+    ZIP 压缩包中的一个条目
+
+    属性:
+    - arcname: 压缩包内的路径，目录以 / 结尾
+    - storage_name: 存储名称，目录为 None
+    - modified_at: 最后修改时间
+    """
+
+    arcname: str
+    storage_name: Optional[str]
+    modified_at: datetime
+
+
+class _StorageZipBuffer:
+    """
+    只追加的写入缓冲区，供 zipfile 以不可寻址流的方式写入，
+    每写完一块数据就取出已写入的字节
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+async def storage_zip_stream(
+    items: Iterable[StorageZipItem],
+) -> AsyncIterator[bytes]:
+    """
+    流式生成 ZIP 压缩包，不写入临时文件，内存占用与文件数量和大小无关
+
+    可压缩的文件使用 DEFLATE 压缩，其余文件直接存储
+
+    参数:
+    - items: 压缩包条目
+
+    返回:
+    - 压缩包内容块的异步迭代器
+    """
+    buffer = _StorageZipBuffer()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for item in items:
+            date_time = max(item.modified_at.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+            if item.storage_name is None:
+                zf.writestr(zipfile.ZipInfo(item.arcname.rstrip("/") + "/", date_time), b"")
+            else:
+                size = await storage_size(item.storage_name)
+                info = zipfile.ZipInfo(item.arcname, date_time)
+                info.file_size = size
+                info.compress_type = (
+                    zipfile.ZIP_DEFLATED
+                    if storage_compressible(item.arcname, size)
+                    else zipfile.ZIP_STORED
+                )
+                with zf.open(info, "w") as fp:
+                    async for chunk in storage_iterate(item.storage_name):
+                        fp.write(chunk)
+                        if buffer.buffer:
+                            yield buffer.drain()
+            if buffer.buffer:
+                yield buffer.drain()
+    # 写入中央目录
+    if buffer.buffer:
+        yield buffer.drain()
+
+
+async def storage_get_zip_response(
+    file_name: str,
+    items: Iterable[StorageZipItem],
+) -> Response:
+    """
+    获取流式生成的 ZIP 压缩包响应
+
+    参数:
+    - file_name: 压缩包文件名称
+    - items: 压缩包条目
+
+    返回:
+    - 压缩包响应
+    """
+    return StreamingResponse(
+        storage_zip_stream(items),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={file_name}",
+        },
     )
@@ -0,0 +1,2 @@
+from intellide.tasks.startup import startup, shutdown
+from intellide.tasks.tasks import *
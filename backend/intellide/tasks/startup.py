@@ -0,0 +1,47 @@
+from intellide.config import (
+    COURSE_DIRECTORY_ENTRY_CHANGES_LISTEN_INTERVAL,
+    STORAGE_UPLOAD_SESSION_CLEANUP_INTERVAL,
+    STORAGE_BLOB_RECLAIM_INTERVAL,
+    STORAGE_BLOB_RECLAIM_QUEUE_INTERVAL,
+    STORAGE_GC_INTERVAL,
+)
+from intellide.routers.course_directory_entry import course_directory_entry_changes_listen
+from intellide.routers.course_directory_entry_upload import (
+    course_directory_entry_upload_session_cleanup,
+)
+from intellide.storage import storage_blob_reclaim, storage_blob_reclaim_queued, storage_gc
+from intellide.tasks.tasks import task_run_periodically, task_cancel_all
+
+
+async def startup():
+    """
+    启动后台任务
+    """
+    # 接收所有进程发布的目录变更，正常情况下一直运行，订阅断开时重新订阅
+    task_run_periodically(
+        course_directory_entry_changes_listen,
+        COURSE_DIRECTORY_ENTRY_CHANGES_LISTEN_INTERVAL,
+    )
+    task_run_periodically(
+        course_directory_entry_upload_session_cleanup,
+        STORAGE_UPLOAD_SESSION_CLEANUP_INTERVAL,
+    )
+    task_run_periodically(
+        storage_blob_reclaim,
+        STORAGE_BLOB_RECLAIM_INTERVAL,
+    )
+    task_run_periodically(
+        storage_blob_reclaim_queued,
+        STORAGE_BLOB_RECLAIM_QUEUE_INTERVAL,
+    )
+    task_run_periodically(
+        storage_gc,
+        STORAGE_GC_INTERVAL,
+    )
+
+
+async def shutdown():
+    """
+    停止后台任务
+    """
+    await task_cancel_all()
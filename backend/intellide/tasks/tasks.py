@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+_tasks: List[asyncio.Task] = []
+
+
+def task_run_periodically(
+    func: Callable[[], Awaitable[None]],
+    interval: float,
+) -> None:
+    """
+    在后台周期性地执行异步函数
+
+    参数:
+    - func: 要执行的异步函数
+    - interval: 两次执行之间的间隔（秒）
+    """
+
+    async def loop():
+        while True:
+            try:
+                await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error occurred while running background task %s", func.__name__)
+            await asyncio.sleep(interval)
+
+    _tasks.append(asyncio.create_task(loop()))
+
+
+async def task_cancel_all() -> None:
+    """
+    取消所有后台任务并等待其结束
+    """
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
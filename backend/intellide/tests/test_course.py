@@ -1,5 +1,7 @@
+import io
 import json
 import time
+import zipfile
 from typing import Dict, Callable, List, Optional, Union
 
 import pytest
@@ -277,6 +279,304 @@ def test_course_directory_entry_download_success(
     assert response.content == temp_file_content
 
 
+@pytest.mark.dependency(depends=["test_course_directory_entry_download_success"])
+def test_course_directory_entry_download_conditional_and_range(
+    store: Dict,
+    temp_file_content: bytes,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_entry_id_base = store["course_directory_entry_id_base"]
+    url = f"{SERVER_API_BASE_URL}/course/directory/entry/download"
+    params = {
+        "course_directory_entry_id": course_directory_entry_id_base,
+    }
+    response = requests.get(
+        url=url,
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        params=params,
+    )
+    etag = response.headers["ETag"]
+    # 缓存仍然有效时返回 304
+    response = requests.get(
+        url=url,
+        headers={
+            "Access-Token": user_token_teacher,
+            "If-None-Match": etag,
+        },
+        params=params,
+    )
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+    # 从中断处继续下载时返回 206
+    response = requests.get(
+        url=url,
+        headers={
+            "Access-Token": user_token_teacher,
+            "Range": "bytes=2-",
+            "If-Range": etag,
+        },
+        params=params,
+    )
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert response.content == temp_file_content[2:]
+    assert (
+        response.headers["Content-Range"]
+        == f"bytes 2-{len(temp_file_content) - 1}/{len(temp_file_content)}"
+    )
+
+
+@pytest.mark.dependency(depends=["test_course_directory_post_success"])
+def test_course_directory_entry_download_compressed(
+    store: Dict,
+    unique_path_generator: Callable,
+    tmp_path,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    path = unique_path_generator(depth=2, suffix="txt")
+    content = ("print('hello world')\n" * 1000).encode()
+    file_path = tmp_path / "compressible.txt"
+    file_path.write_bytes(content)
+    course_directory_entry_id = course_directory_entry_post_success(
+        user_token_teacher,
+        course_directory_id_base,
+        path,
+        file_path=str(file_path),
+    )["course_directory_entry_id"]
+    url = f"{SERVER_API_BASE_URL}/course/directory/entry/download"
+    params = {
+        "course_directory_entry_id": course_directory_entry_id,
+    }
+    # 客户端接受 gzip 时直接返回压缩内容
+    response = requests.get(
+        url=url,
+        headers={
+            "Access-Token": user_token_teacher,
+            "Accept-Encoding": "gzip",
+        },
+        params=params,
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) < len(content)
+    assert response.content == content
+    # 客户端不接受 gzip 时返回解压后的内容
+    response = requests.get(
+        url=url,
+        headers={
+            "Access-Token": user_token_teacher,
+            "Accept-Encoding": "identity",
+        },
+        params=params,
+    )
+    assert "Content-Encoding" not in response.headers
+    assert response.content == content
+
+
+@pytest.mark.dependency(depends=["test_course_directory_post_success"])
+def test_course_directory_entry_download_zip(
+    store: Dict,
+    unique_path_generator: Callable,
+    temp_file_path: str,
+    temp_file_content: bytes,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    root = unique_path_generator(depth=1)
+    paths = [
+        f"{root}/a.txt",
+        f"{root}/sub/b.txt",
+    ]
+    for path in paths:
+        course_directory_entry_post_success(
+            user_token_teacher,
+            course_directory_id_base,
+            path,
+            file_path=temp_file_path,
+        )
+    course_directory_entry_id = course_directory_entry_get_success(
+        user_token_teacher,
+        course_directory_id_base,
+        root,
+        False,
+    )["id"]
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/download/zip",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        params={
+            "course_directory_entry_id": course_directory_entry_id,
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["Content-Type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        root_name = root.lstrip("/")
+        assert set(zf.namelist()) == {
+            f"{root_name}/",
+            f"{root_name}/a.txt",
+            f"{root_name}/sub/",
+            f"{root_name}/sub/b.txt",
+        }
+        assert zf.read(f"{root_name}/sub/b.txt") == temp_file_content
+
+
+@pytest.mark.dependency(depends=["test_course_directory_post_success"])
+def test_course_directory_entry_post_archive(
+    store: Dict,
+    unique_path_generator: Callable,
+    temp_file_content: bytes,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    root = unique_path_generator(depth=2)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("src/main.py", temp_file_content)
+        zf.writestr("src/util/helper.py", temp_file_content)
+        zf.writestr("README.md", temp_file_content)
+    response = requests.post(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/archive",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        data={
+            "course_directory_id": course_directory_id_base,
+            "path": root,
+        },
+        files={
+            "archive": ("project.zip", archive.getvalue()),
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert response["data"]["file_count"] == 3
+    # 目标目录本身、其父目录以及压缩包中的目录都会被创建
+    assert response["data"]["directory_count"] == 4
+    entry = course_directory_entry_get_success(
+        user_token_teacher,
+        course_directory_id_base,
+        f"{root}/src/util/helper.py",
+        False,
+    )
+    assert entry["type"] == "file"
+    # 解压到目标目录之外的成员会被拒绝
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("../escape.txt", temp_file_content)
+    response = requests.post(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/archive",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        data={
+            "course_directory_id": course_directory_id_base,
+            "path": root,
+        },
+        files={
+            "archive": ("escape.zip", archive.getvalue()),
+        },
+    ).json()
+    assert_code(response, status.HTTP_400_BAD_REQUEST)
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_post_success"])
+def test_course_directory_entry_list_children(
+    store: Dict,
+    unique_path_generator: Callable,
+):
+    user_token_teacher = store["user_token_teacher"]
+    user_token_student = store["user_token_student"]
+    course_directory_id_base = store["course_directory_id_base"]
+    root = unique_path_generator(depth=1)
+    for child in ["a", "b", "c"]:
+        course_directory_entry_post_success(
+            user_token_teacher, course_directory_id_base, f"{root}/{child}/nested"
+        )
+    course_directory_entry_post_success(user_token_teacher, course_directory_id_base, f"{root}2")
+    # 只列出直接子条目，按路径分页
+    paths = []
+    cursor = None
+    while True:
+        params = {
+            "course_directory_id": course_directory_id_base,
+            "path": root,
+            "limit": 2,
+        }
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = requests.get(
+            url=f"{SERVER_API_BASE_URL}/course/directory/entry/list",
+            headers={
+                "Access-Token": user_token_teacher,
+            },
+            params=params,
+        ).json()
+        assert_code(response, status.HTTP_200_OK)
+        assert len(response["data"]["entries"]) <= 2
+        paths.extend(entry["path"] for entry in response["data"]["entries"])
+        cursor = response["data"]["next_cursor"]
+        if cursor is None:
+            break
+    assert paths == [f"{root}/a", f"{root}/b", f"{root}/c"]
+    # 最大深度为 2 时同时列出孙条目
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/list",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        params={
+            "course_directory_id": course_directory_id_base,
+            "path": root,
+            "max_depth": 2,
+            "sort": "path",
+            "descending": True,
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert [entry["path"] for entry in response["data"]["entries"]] == [
+        f"{root}/c/nested",
+        f"{root}/c",
+        f"{root}/b/nested",
+        f"{root}/b",
+        f"{root}/a/nested",
+        f"{root}/a",
+    ]
+    # 学生的读取权限在数据库中过滤，分页后每页仍然取满
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/list",
+        headers={
+            "Access-Token": user_token_student,
+        },
+        params={
+            "course_directory_id": course_directory_id_base,
+            "path": root,
+            "limit": 2,
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert [entry["path"] for entry in response["data"]["entries"]] == [f"{root}/a", f"{root}/b"]
+    assert response["data"]["next_cursor"] is not None
+    # 不指定路径时列出根目录的直接子条目，最近创建的两个是 root2 和 root
+    for params in [{}, {"path": ""}, {"path": "/"}]:
+        response = requests.get(
+            url=f"{SERVER_API_BASE_URL}/course/directory/entry/list",
+            headers={
+                "Access-Token": user_token_teacher,
+            },
+            params={
+                "course_directory_id": course_directory_id_base,
+                "sort": "created_at",
+                "descending": True,
+                "limit": 2,
+                **params,
+            },
+        ).json()
+        assert_code(response, status.HTTP_200_OK)
+        assert [entry["path"] for entry in response["data"]["entries"]] == [f"{root}2", root]
+
+
 @pytest.mark.dependency(depends=["test_course_directory_entry_get_success"])
 def test_course_directory_entry_delete_success_and_fail(
     store: Dict,
@@ -386,6 +686,407 @@ def test_course_directory_entry_move_success_and_fail(
     assert path_join(dst_path, path_parts(path, 2), path_parts(path, 3)) in course_directory_entry_paths
 
 
+@pytest.mark.dependency(depends=["test_course_directory_entry_get_success"])
+def test_course_directory_entry_move_subtree_boundary(
+    store: Dict,
+    unique_path_generator: Callable,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    root = unique_path_generator(depth=1)
+    course_directory_entry_post_success(
+        user_token_teacher, course_directory_id_base, f"{root}/src/a/b"
+    )
+    course_directory_entry_post_success(
+        user_token_teacher, course_directory_id_base, f"{root}/src2/c"
+    )
+    src_course_directory_entry_id = course_directory_entry_get_success(
+        user_token_teacher,
+        course_directory_id_base,
+        f"{root}/src",
+        False,
+    )["id"]
+    url = f"{SERVER_API_BASE_URL}/course/directory/entry/move"
+    headers = {
+        "Access-Token": user_token_teacher,
+    }
+    # 不能移动到自身的子树中
+    response = requests.put(
+        url=url,
+        headers=headers,
+        json={
+            "course_directory_entry_id": src_course_directory_entry_id,
+            "dst_path": f"{root}/src/a/inner",
+        },
+    ).json()
+    assert_code(response, status.HTTP_400_BAD_REQUEST)
+    # 移动到更深的路径时深度随之改变，同级的 src2 不受影响
+    response = requests.put(
+        url=url,
+        headers=headers,
+        json={
+            "course_directory_entry_id": src_course_directory_entry_id,
+            "dst_path": f"{root}/dst/nested",
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    moved = course_directory_entry_get_success(
+        user_token_teacher,
+        course_directory_id_base,
+        f"{root}/dst/nested/a/b",
+        False,
+    )
+    assert moved["depth"] == "5"
+    course_directory_entry_get_success(
+        user_token_teacher,
+        course_directory_id_base,
+        f"{root}/src2/c",
+        False,
+    )
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_post_success"])
+def test_course_directory_entry_batch(
+    store: Dict,
+    unique_path_generator: Callable,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    root = unique_path_generator(depth=1)
+    # 后面的操作可以看到前面操作的结果
+    response = requests.post(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/batch",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        json={
+            "course_directory_id": course_directory_id_base,
+            "operations": [
+                {"type": "create", "path": f"{root}/a/b"},
+                {"type": "move", "path": f"{root}/a", "dst_path": f"{root}/c"},
+                {"type": "create", "path": f"{root}/c/d"},
+                {"type": "delete", "path": f"{root}/c/b"},
+            ],
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert len(response["data"]) == 4
+    course_directory_entry_get_success(
+        user_token_teacher, course_directory_id_base, f"{root}/c/d", False
+    )
+    # 任何一个操作失败时回滚所有操作
+    response = requests.post(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/batch",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        json={
+            "course_directory_id": course_directory_id_base,
+            "operations": [
+                {"type": "delete", "path": f"{root}/c/d"},
+                {"type": "delete", "path": f"{root}/missing"},
+            ],
+        },
+    ).json()
+    assert_code(response, status.HTTP_400_BAD_REQUEST)
+    assert response["index"] == 1
+    course_directory_entry_get_success(
+        user_token_teacher, course_directory_id_base, f"{root}/c/d", False
+    )
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_post_success"])
+def test_course_directory_entry_sync(
+    store: Dict,
+    unique_path_generator: Callable,
+    temp_file_path: str,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    path = unique_path_generator(depth=2, suffix="txt")
+    course_directory_entry_post_success(
+        user_token_teacher,
+        course_directory_id_base,
+        path,
+        file_path=temp_file_path,
+    )
+    entry = course_directory_entry_get_success(
+        user_token_teacher, course_directory_id_base, path, False
+    )
+    # 内容元数据在上传时记录
+    assert entry["content_hash"] == entry["storage_name"]
+    assert entry["mime_type"] == "text/plain"
+    content_hash = entry["content_hash"]
+    missing = unique_path_generator(depth=1)
+
+    def sync(manifest: Dict) -> Dict:
+        response = requests.post(
+            url=f"{SERVER_API_BASE_URL}/course/directory/entry/sync",
+            headers={
+                "Access-Token": user_token_teacher,
+            },
+            json={
+                "course_directory_id": course_directory_id_base,
+                "manifest": manifest,
+            },
+        ).json()
+        assert_code(response, status.HTTP_200_OK)
+        return response["data"]
+
+    # 内容没有变化的文件不需要下载，服务端不存在的路径需要删除
+    data = sync({path: content_hash, missing: None})
+    assert path not in {entry["path"] for entry in data["added"] + data["changed"]}
+    assert data["deleted"] == [missing]
+    # 内容哈希值不同的文件需要重新下载
+    data = sync({path: "0" * 64})
+    assert [entry["path"] for entry in data["changed"]] == [path]
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_post_success"])
+def test_course_directory_entry_put_content(
+    store: Dict,
+    unique_path_generator: Callable,
+    temp_file_path: str,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    path = unique_path_generator(depth=2, suffix="txt")
+    course_directory_entry_id = course_directory_entry_post_success(
+        user_token_teacher,
+        course_directory_id_base,
+        path,
+        file_path=temp_file_path,
+    )["course_directory_entry_id"]
+    content_hash = course_directory_entry_get_success(
+        user_token_teacher, course_directory_id_base, path, False
+    )["content_hash"]
+
+    def put_content(content: bytes, if_match: str) -> Dict:
+        return requests.put(
+            url=f"{SERVER_API_BASE_URL}/course/directory/entry/content",
+            headers={
+                "Access-Token": user_token_teacher,
+                "If-Match": if_match,
+            },
+            data={
+                "course_directory_entry_id": course_directory_entry_id,
+            },
+            files={
+                "file": ("content.txt", content),
+            },
+        ).json()
+
+    # 内容哈希值匹配时原地覆盖，条目ID保持不变
+    response = put_content(b"new content", f'"{content_hash}"')
+    assert_code(response, status.HTTP_200_OK)
+    entry = course_directory_entry_get_success(
+        user_token_teacher, course_directory_id_base, path, False
+    )
+    assert entry["id"] == str(course_directory_entry_id)
+    assert entry["content_hash"] == response["data"]["content_hash"] != content_hash
+    # 使用过期的内容哈希值时拒绝覆盖
+    response = put_content(b"stale content", f'"{content_hash}"')
+    assert_code(response, status.HTTP_412_PRECONDITION_FAILED)
+    store["course_directory_entry_id_versioned"] = course_directory_entry_id
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_put_content"])
+def test_course_directory_entry_version(
+    store: Dict,
+    temp_file_content: bytes,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_entry_id = store["course_directory_entry_id_versioned"]
+    # 第一次覆盖时记录原内容和新内容两个版本
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/version",
+        headers={"Access-Token": user_token_teacher},
+        params={"course_directory_entry_id": course_directory_entry_id},
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert [version["version"] for version in response["data"]] == [1, 2]
+    # 下载历史版本
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/version/download",
+        headers={"Access-Token": user_token_teacher},
+        params={"course_directory_entry_id": course_directory_entry_id, "version": 2},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == b"new content"
+    # 覆盖前的原内容仍然可以下载
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/version/download",
+        headers={"Access-Token": user_token_teacher},
+        params={"course_directory_entry_id": course_directory_entry_id, "version": 1},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == temp_file_content
+    # 比较两个版本
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/version/diff",
+        headers={"Access-Token": user_token_teacher},
+        params={
+            "course_directory_entry_id": course_directory_entry_id,
+            "from_version": 1,
+            "to_version": 2,
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert "+new content" in response["data"]["diff"]
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_post_success"])
+def test_course_directory_entry_changes(
+    store: Dict,
+    unique_path_generator: Callable,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    url = f"{SERVER_WS_BASE_URL}/course/directory/{course_directory_id_base}/changes"
+    headers = {"Access-Token": user_token_teacher}
+    path = unique_path_generator(depth=2)
+
+    ws_teacher = websocket.WebSocket()
+    try:
+        ws_teacher.connect(url=url, header=headers)
+        sequence = json.loads(ws_teacher.recv())["sequence"]
+        # 创建条目后推送带有下一个序号的变更
+        course_directory_entry_post_success(user_token_teacher, course_directory_id_base, path)
+        message = json.loads(ws_teacher.recv())
+        assert message["type"] == "changes"
+        assert message["sequence"] == sequence + 1
+        assert [(change["type"], change["path"]) for change in message["changes"]] == [
+            ("create", path)
+        ]
+        # 列表返回的版本号与推送的序号一致，客户端可以从该版本号继续订阅
+        response = requests.get(
+            url=f"{SERVER_API_BASE_URL}/course/directory/entry",
+            headers=headers,
+            params={"course_directory_id": course_directory_id_base, "path": path},
+        ).json()
+        assert_code(response, status.HTTP_200_OK)
+        assert response["version"] == message["sequence"]
+    finally:
+        ws_teacher.close()
+
+    # 断线重连时从上一个序号恢复
+    ws_teacher = websocket.WebSocket()
+    try:
+        ws_teacher.connect(url=f"{url}?sequence={message['sequence'] - 1}", header=headers)
+        assert json.loads(ws_teacher.recv()) == message
+        assert json.loads(ws_teacher.recv())["type"] == "ready"
+    finally:
+        ws_teacher.close()
+
+
+@pytest.mark.dependency(depends=["test_course_directory_entry_post_success"])
+def test_course_directory_entry_post_deduplicate(
+    store: Dict,
+    unique_path_generator: Callable,
+    temp_file_path: str,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    path = unique_path_generator(depth=2, suffix="txt")
+    course_directory_entry_post_success(
+        user_token_teacher,
+        course_directory_id_base,
+        path,
+        file_path=temp_file_path,
+    )
+    # 相同内容的文件共享同一个存储块
+    assert (
+        course_directory_entry_get_success(
+            user_token_teacher,
+            course_directory_id_base,
+            path,
+            False,
+        )["storage_name"]
+        == course_directory_entry_get_success(
+            user_token_teacher,
+            course_directory_id_base,
+            store["course_directory_entry_path_base"],
+            False,
+        )["storage_name"]
+    )
+
+
+@pytest.mark.dependency(depends=["test_course_directory_post_success"])
+def test_course_directory_entry_upload_success(
+    store: Dict,
+    unique_path_generator: Callable,
+    temp_file_content: bytes,
+):
+    user_token_teacher = store["user_token_teacher"]
+    course_directory_id_base = store["course_directory_id_base"]
+    path = unique_path_generator(depth=3, suffix="txt")
+    chunk_size = len(temp_file_content) // 2 + 1
+    response = requests.post(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/upload",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        json={
+            "course_directory_id": course_directory_id_base,
+            "path": path,
+            "size": len(temp_file_content),
+            "chunk_size": chunk_size,
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    upload_session_id = response["data"]["upload_session_id"]
+    assert response["data"]["chunk_count"] == 2
+    # 乱序上传分块
+    for index in (1, 0):
+        response = requests.put(
+            url=f"{SERVER_API_BASE_URL}/course/directory/entry/upload/chunk",
+            headers={
+                "Access-Token": user_token_teacher,
+            },
+            data={
+                "upload_session_id": upload_session_id,
+                "index": index,
+            },
+            files={
+                "file": temp_file_content[index * chunk_size : (index + 1) * chunk_size],
+            },
+        ).json()
+        assert_code(response, status.HTTP_200_OK)
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/upload",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        params={
+            "upload_session_id": upload_session_id,
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    assert response["data"]["received"] == [0, 1]
+    assert response["data"]["missing"] == []
+    response = requests.post(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/upload/finalize",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        json={
+            "upload_session_id": upload_session_id,
+        },
+    ).json()
+    assert_code(response, status.HTTP_200_OK)
+    response = requests.get(
+        url=f"{SERVER_API_BASE_URL}/course/directory/entry/download",
+        headers={
+            "Access-Token": user_token_teacher,
+        },
+        params={
+            "course_directory_entry_id": response["data"]["course_directory_entry_id"],
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == temp_file_content
+
+
 @pytest.mark.dependency(depends=["test_course_post_success"])
 def test_course_chat_success(
     store: Dict,
@@ -1220,4 +1921,4 @@ def test_course_collaborative_directory_entry_delete_success(
         },
     ).json()
     assert_code(response_get, status.HTTP_200_OK)
-    assert collab_entry_id not in [entry["id"] for entry in response_get["data"]]
\ No newline at end of file
+    assert collab_entry_id not in [entry["id"] for entry in response_get["data"]]
@@ -0,0 +1,151 @@
+from typing import Dict, List, Tuple
+
+# 增量中的指令类型
+_DELTA_INSERT = 0
+_DELTA_COPY = 1
+# 源内容按块建立索引的块大小，小于一个块的重复内容不会被复制
+_DELTA_BLOCK_SIZE = 16
+
+
+def _delta_write_varint(
+    buffer: bytearray,
+    value: int,
+) -> None:
+    """
+    以 LEB128 变长整数格式写入非负整数
+    """
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _delta_read_varint(
+    delta: bytes,
+    offset: int,
+) -> Tuple[int, int]:
+    """
+    读取 LEB128 变长整数，返回 (整数, 下一个字节的偏移量)
+    """
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(delta):
+            raise ValueError("Truncated delta")
+        byte = delta[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def delta_create(
+    source: bytes,
+    target: bytes,
+    block_size: int = _DELTA_BLOCK_SIZE,
+) -> bytes:
+    """
+    计算从源内容生成目标内容的二进制增量
+
+    源内容按固定大小的块建立索引，在目标内容中逐字节查找与某个块相同的位置，
+    找到后向前后扩展匹配范围并记录为复制指令，其余内容记录为插入指令
+
+    参数:
+    - source: 源内容
+    - target: 目标内容
+    - block_size: 建立索引的块大小
+
+    返回:
+    - 增量，格式为 <源长度><目标长度> 后跟若干条指令，
+      插入指令为 0 <长度> <内容>，复制指令为 1 <源偏移量> <长度>，整数均为变长整数
+    """
+    delta = bytearray()
+    _delta_write_varint(delta, len(source))
+    _delta_write_varint(delta, len(target))
+
+    # 源内容中每个块第一次出现的位置
+    blocks: Dict[bytes, int] = {}
+    for offset in range(0, len(source) - block_size + 1, block_size):
+        blocks.setdefault(source[offset : offset + block_size], offset)
+
+    def flush_insert(start: int, end: int) -> None:
+        if start < end:
+            delta.append(_DELTA_INSERT)
+            _delta_write_varint(delta, end - start)
+            delta.extend(target[start:end])
+
+    # 尚未写入增量的目标内容的起始位置
+    pending = 0
+    position = 0
+    last = len(target) - block_size
+    while position <= last:
+        source_offset = blocks.get(target[position : position + block_size])
+        if source_offset is None:
+            position += 1
+            continue
+        # 向前扩展匹配，但不超过尚未写入的内容
+        start = position
+        while (
+            start > pending and source_offset > 0 and target[start - 1] == source[source_offset - 1]
+        ):
+            start -= 1
+            source_offset -= 1
+        # 向后扩展匹配
+        end = position + block_size
+        source_end = source_offset + (end - start)
+        while end < len(target) and source_end < len(source) and target[end] == source[source_end]:
+            end += 1
+            source_end += 1
+        flush_insert(pending, start)
+        delta.append(_DELTA_COPY)
+        _delta_write_varint(delta, source_offset)
+        _delta_write_varint(delta, end - start)
+        pending = position = end
+    flush_insert(pending, len(target))
+    return bytes(delta)
+
+
+def delta_apply(
+    source: bytes,
+    delta: bytes,
+) -> bytes:
+    """
+    将二进制增量应用到源内容上，还原目标内容
+
+    参数:
+    - source: 生成增量时使用的源内容
+    - delta: delta_create 生成的增量
+
+    返回:
+    - 目标内容
+
+    异常:
+    - ValueError: 当增量格式错误或与源内容不匹配时抛出
+    """
+    source_length, offset = _delta_read_varint(delta, 0)
+    target_length, offset = _delta_read_varint(delta, offset)
+    if source_length != len(source):
+        raise ValueError("Delta does not match the source")
+    parts: List[bytes] = []
+    while offset < len(delta):
+        instruction = delta[offset]
+        offset += 1
+        if instruction == _DELTA_INSERT:
+            length, offset = _delta_read_varint(delta, offset)
+            if offset + length > len(delta):
+                raise ValueError("Truncated delta")
+            parts.append(delta[offset : offset + length])
+            offset += length
+        elif instruction == _DELTA_COPY:
+            source_offset, offset = _delta_read_varint(delta, offset)
+            length, offset = _delta_read_varint(delta, offset)
+            if source_offset + length > len(source):
+                raise ValueError("Delta copies beyond the source")
+            parts.append(source[source_offset : source_offset + length])
+        else:
+            raise ValueError(f"Unknown delta instruction {instruction}")
+    target = b"".join(parts)
+    if len(target) != target_length:
+        raise ValueError("Delta produced content of the wrong length")
+    return target
@@ -1,3 +1,4 @@
+import hashlib
 import posixpath
 from typing import Tuple, Iterator, cast
 
@@ -165,3 +166,38 @@ def path_join(
     - 连接后的路径
     """
     return cast(str, posixpath.join(path, *paths))
+
+
+def path_tree(
+    path: str,
+) -> str:
+    """
+    将文件路径转换为 ltree 层级路径
+
+    ltree 标签只允许字母、数字和下划线，因此每一级名称都使用其 MD5 哈希值作为标签；
+    以 "/" 开头的路径第一级是空字符串，根目录因此是所有条目的祖先
+
+    参数:
+    - path: 规范化后的文件路径
+
+    返回:
+    - 以 "." 分隔的 ltree 层级路径
+    """
+    return ".".join(hashlib.md5(part.encode()).hexdigest() for part in path.split("/"))
+
+
+def path_tree_children(
+    path: str,
+    max_depth: int,
+) -> str:
+    """
+    构造匹配文件路径下子条目的 lquery 模式
+
+    参数:
+    - path: 规范化后的文件路径
+    - max_depth: 相对于该路径的最大深度
+
+    返回:
+    - 匹配深度在 [1, max_depth] 之间的子条目的 lquery 模式
+    """
+    return f"{path_tree(path)}.*{{1,{max_depth}}}"
@@ -0,0 +1,211 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, not_, or_, true
+from sqlalchemy.sql.elements import ColumnElement
+
+# 缓存的权限前缀树数量上限
+_PERMISSION_TRIE_CACHE_SIZE = 1024
+# 课程目录ID到 (更新时间, 权限前缀树) 的缓存，按最近使用顺序淘汰
+_permission_tries: "OrderedDict[int, Tuple[datetime, PermissionTrie]]" = OrderedDict()
+
+
+class _PermissionTrieNode:
+    """
+    权限前缀树节点
+    """
+
+    __slots__ = ("path", "children", "permissions")
+
+    def __init__(self, path: Optional[str] = None):
+        # 节点对应的路径，根节点为 None
+        self.path = path
+        self.children: Dict[str, "_PermissionTrieNode"] = {}
+        # 该路径上显式设置的权限，没有设置时为 None
+        self.permissions: Optional[frozenset] = None
+
+
+class PermissionTrie:
+    def __init__(
+        self,
+        permissions: Optional[Dict[str, Iterable[str]]],
+    ):
+        """
+        按路径分段编译的目录权限前缀树
+
+        与逐级调用 path_prefix 查找父路径相比，检查一个路径只需要沿前缀树走一遍，
+        不需要重复规范化和校验路径
+
+        参数:
+        - permissions: 路径到权限列表的映射，根目录对应空字符串
+        """
+        self.root = _PermissionTrieNode()
+        for path, path_permissions in (permissions or {}).items():
+            node = self.root
+            for segment in path.split("/"):
+                if segment not in node.children:
+                    node.children[segment] = _PermissionTrieNode(
+                        segment if node.path is None else f"{node.path}/{segment}"
+                    )
+                node = node.children[segment]
+            node.permissions = frozenset(str(permission) for permission in path_permissions)
+
+    def _locate(
+        self,
+        path: str,
+    ) -> Tuple[Optional[_PermissionTrieNode], Optional[frozenset]]:
+        """
+        沿前缀树查找路径，返回路径对应的节点（不存在时为 None），
+        以及路径本身或其祖先路径中最近的一个显式设置的权限
+        """
+        node = self.root
+        nearest = None
+        for segment in path.split("/"):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.permissions is not None:
+                nearest = node.permissions
+        return node, nearest
+
+    def verify(
+        self,
+        path: str,
+        needed_permission_type: str,
+    ) -> bool:
+        """
+        检查路径是否具有某种权限
+
+        路径本身显式设置了权限时必须包含所需权限，同时最近的一个显式设置了权限的祖先路径
+        也必须包含所需权限；都没有显式设置时默认具有权限
+
+        参数:
+        - path: 规范化后的条目路径
+        - needed_permission_type: 需要的权限类型
+
+        返回:
+        - 具有权限返回True，否则返回False
+        """
+        return self.verify_many([path], needed_permission_type)[0]
+
+    def verify_many(
+        self,
+        paths: Iterable[str],
+        needed_permission_type: str,
+    ) -> List[bool]:
+        """
+        批量检查路径是否具有某种权限，同一父目录下的路径只查找一次父目录
+
+        参数:
+        - paths: 规范化后的条目路径
+        - needed_permission_type: 需要的权限类型
+
+        返回:
+        - 与 paths 顺序一致的检查结果列表
+        """
+        needed = str(needed_permission_type)
+        parents: Dict[str, Tuple[Optional[_PermissionTrieNode], Optional[frozenset]]] = {}
+        results = []
+        for path in paths:
+            parent, separator, name = path.rpartition("/")
+            if not separator:
+                # 没有父路径（例如根目录本身）
+                results.append(self._verify_without_parent(path, needed))
+                continue
+            if parent not in parents:
+                parents[parent] = self._locate(parent)
+            parent_node, nearest_ancestor = parents[parent]
+            node = parent_node.children.get(name) if parent_node is not None else None
+            if node is not None and node.permissions is not None and needed not in node.permissions:
+                results.append(False)
+            else:
+                results.append(nearest_ancestor is None or needed in nearest_ancestor)
+        return results
+
+    def predicate(
+        self,
+        column: ColumnElement,
+        needed_permission_type: str,
+    ) -> ColumnElement:
+        """
+        将权限规则转换为 SQL 条件，与 verify 的判断结果一致
+
+        路径被拒绝当且仅当路径本身显式设置的权限不包含所需权限，或者位于某个不包含所需权限的
+        显式设置路径之下、且中间没有其他显式设置的路径
+
+        参数:
+        - column: 条目路径列
+        - needed_permission_type: 需要的权限类型
+
+        返回:
+        - 具有权限时为真的 SQL 条件
+        """
+        needed = str(needed_permission_type)
+        # 每个显式设置了权限的节点下最近的显式设置了权限的子孙节点
+        explicit_children: Dict[Optional[_PermissionTrieNode], List[_PermissionTrieNode]] = {}
+        stack: List[Tuple[_PermissionTrieNode, Optional[_PermissionTrieNode]]] = [(self.root, None)]
+        while stack:
+            node, nearest = stack.pop()
+            if node.permissions is not None:
+                explicit_children.setdefault(nearest, []).append(node)
+                nearest = node
+            stack.extend((child, nearest) for child in node.children.values())
+        denied_nodes = [
+            node
+            for nodes in explicit_children.values()
+            for node in nodes
+            if needed not in node.permissions
+        ]
+        if not denied_nodes:
+            return true()
+        conditions = [column.in_([node.path for node in denied_nodes])]
+        for node in denied_nodes:
+            allowed_subtrees = [
+                column.startswith(f"{child.path}/", autoescape=True)
+                for child in explicit_children.get(node, [])
+            ]
+            under = column.startswith(f"{node.path}/", autoescape=True)
+            conditions.append(
+                and_(under, not_(or_(*allowed_subtrees))) if allowed_subtrees else under
+            )
+        return not_(or_(*conditions))
+
+    def _verify_without_parent(
+        self,
+        path: str,
+        needed: str,
+    ) -> bool:
+        """
+        检查没有父路径的路径，只需要检查路径本身显式设置的权限
+        """
+        node = self.root.children.get(path)
+        return node is None or node.permissions is None or needed in node.permissions
+
+
+def permission_trie(
+    course_directory_id: int,
+    updated_at: datetime,
+    permissions: Optional[Dict[str, Iterable[str]]],
+) -> PermissionTrie:
+    """
+    获取课程目录的权限前缀树，按目录缓存，目录的更新时间变化时重新编译
+
+    参数:
+    - course_directory_id: 课程目录ID
+    - updated_at: 课程目录的更新时间，权限修改时随之变化
+    - permissions: 课程目录的权限映射
+
+    返回:
+    - 权限前缀树
+    """
+    cached = _permission_tries.get(course_directory_id)
+    if cached is not None and cached[0] == updated_at:
+        _permission_tries.move_to_end(course_directory_id)
+        return cached[1]
+    trie = PermissionTrie(permissions)
+    _permission_tries[course_directory_id] = (updated_at, trie)
+    _permission_tries.move_to_end(course_directory_id)
+    while len(_permission_tries) > _PERMISSION_TRIE_CACHE_SIZE:
+        _permission_tries.popitem(last=False)
+    return trie
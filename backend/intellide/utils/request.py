@@ -0,0 +1,79 @@
+from starlette.types import ASGIApp, Receive, Scope, Send, Message
+
+from intellide.utils.response import payload_too_large
+
+
+class RequestSizeLimitExceeded(Exception):
+    """
+    请求体超过大小限制时在 receive 中抛出的异常
+    """
+
+
+class RequestSizeLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_size: int,
+    ):
+        """
+        请求体大小限制中间件
+
+        在读取请求体的过程中累计字节数，超过限制时立即中断读取，
+        而不是等整个请求体被接收后再检查
+
+        参数:
+        - app: ASGI 应用
+        - max_size: 请求体的最大字节数
+        """
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 如果请求头中声明的长度已经超过限制，直接拒绝
+        for key, value in scope["headers"]:
+            if key == b"content-length" and value.isdigit() and int(value) > self.max_size:
+                await payload_too_large(self._message())(scope, receive, send)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    exceeded = True
+                    raise RequestSizeLimitExceeded()
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal response_started
+            # 超限之后应用产生的响应（例如请求体解析失败）会被丢弃，统一返回超限响应
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded or response_started:
+                raise
+        if exceeded and not response_started:
+            await payload_too_large(self._message())(scope, receive, send)
+
+    def _message(self) -> str:
+        return f"Request body exceeds the maximum size of {self.max_size} bytes"
@@ -108,6 +108,58 @@ def not_found(
     )
 
 
+def precondition_failed(
+    message: str = "N/A",
+    **kwargs,
+) -> JSONResponse:
+    """
+    返回前提条件失败响应
+
+    参数:
+    - message: 错误信息（可选）
+    - kwargs: 其他附加内容（可选）
+
+    返回:
+    - JSONResponse: 包含状态为 "error" 和描述为 "Precondition Failed" 的响应
+    """
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "error",
+            "code": status.HTTP_412_PRECONDITION_FAILED,
+            "description": "Precondition Failed",
+            "message": message,
+            **kwargs,
+        },
+    )
+
+
+def payload_too_large(
+    message: str = "N/A",
+    **kwargs,
+) -> JSONResponse:
+    """
+    返回请求体过大响应
+
+    参数:
+    - message: 错误信息（可选）
+    - kwargs: 其他附加内容（可选）
+
+    返回:
+    - JSONResponse: 包含状态为 "error" 和描述为 "Payload Too Large" 的响应
+    """
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "error",
+            "code": status.HTTP_413_CONTENT_TOO_LARGE,
+            "description": "Payload Too Large",
+            "message": message,
+            **kwargs,
+        },
+    )
+
+
 def internal_server_error(
     message: str = "N/A",
     **kwargs,
@@ -165,6 +217,8 @@ class APIError(Exception):
         bad_request: status.HTTP_400_BAD_REQUEST,
         forbidden: status.HTTP_403_FORBIDDEN,
         not_found: status.HTTP_404_NOT_FOUND,
+        precondition_failed: status.HTTP_412_PRECONDITION_FAILED,
+        payload_too_large: status.HTTP_413_CONTENT_TOO_LARGE,
         internal_server_error: status.HTTP_500_INTERNAL_SERVER_ERROR,
         not_implemented: status.HTTP_501_NOT_IMPLEMENTED,
     }
@@ -182,8 +236,8 @@ class APIError(Exception):
     def code(self) -> int:
         return self._map[self._func]
 
-    def response(self) -> JSONResponse:
-        return self._func(message=self._msg, **self._kwargs)
+    def response(self, **kwargs) -> JSONResponse:
+        return self._func(message=self._msg, **self._kwargs, **kwargs)
 
     def message(self) -> str:
         return self._msg
@@ -138,7 +138,8 @@ class WebSocketManager:
                 raise RuntimeError(f"WebSocket group with keys: {keys} not found")
             current = current.get_child(key)
         connection = current.remove_connection(identifier)
-        while current and not current.connections and not current.children:
+        # 逐级删除空的分组，根分组保留
+        while current.parent is not None and not current.connections and not current.children:
             current.parent.remove_child(current.name)
             current = current.parent
         return connection
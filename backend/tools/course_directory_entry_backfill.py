@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from intellide.storage.backfill import storage_backfill_entry_metadata  # noqa: E402
+from intellide.storage.pack import storage_pack_load  # noqa: E402
+
+
+async def run(batch_size: int) -> int:
+    await storage_pack_load()
+    batches = 0
+    after_id = 0
+    while True:
+        after_id = await storage_backfill_entry_metadata(after_id=after_id, limit=batch_size)
+        if after_id is None:
+            return batches
+        batches += 1
+        print(f"Backfilled entries up to id {after_id}")
+
+
+def main():
+    """
+    为旧的文件条目回填大小、内容哈希值和 MIME 类型
+
+    服务运行期间可以直接执行，新上传的文件条目在上传时已经记录了这些信息
+    """
+    parser = argparse.ArgumentParser(
+        description="Backfill size, content hash and MIME type of course directory file entries"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="number of entries to backfill per batch"
+    )
+    args = parser.parse_args()
+
+    batches = asyncio.run(run(args.batch_size))
+    print(f"Finished after {batches} batches")
+
+
+if __name__ == "__main__":
+    main()
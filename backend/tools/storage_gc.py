@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from intellide.config import STORAGE_PATH, STORAGE_GC_GRACE_PERIOD  # noqa: E402
+from intellide.storage.gc import storage_gc  # noqa: E402
+from intellide.storage.pack import storage_pack_load  # noqa: E402
+
+
+async def run(dry_run: bool):
+    await storage_pack_load()
+    return await storage_gc(dry_run=dry_run)
+
+
+def main():
+    """
+    回收没有被任何记录引用的存储内容
+
+    服务运行期间可以直接执行，宽限期内修改过的存储内容不会被删除
+    """
+    parser = argparse.ArgumentParser(
+        description="Remove storage files that are no longer referenced by any row"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="print every storage name that is (or would be) removed",
+    )
+    args = parser.parse_args()
+
+    print(f"Collecting {STORAGE_PATH} with a grace period of {STORAGE_GC_GRACE_PERIOD} seconds")
+    report = asyncio.run(run(args.dry_run))
+    if args.verbose:
+        for storage_name in report.storage_names:
+            print(storage_name)
+    action = "Would remove" if report.dry_run else "Removed"
+    print(
+        f"Scanned {report.scanned}, referenced {report.referenced}, "
+        f"recent {report.recent}, locked {report.locked}"
+    )
+    print(
+        f"{action} {report.deleted} storage names, {report.reclaimed_bytes} bytes "
+        f"in {report.duration:.1f} seconds"
+    )
+    if not report.dry_run:
+        print(f"Compacted packs, freed {report.compacted_bytes} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from intellide.config import STORAGE_PATH, STORAGE_SHARD_LEVELS  # noqa: E402
+from intellide.storage.storage import storage_migrate_layout  # noqa: E402
+
+
+def main():
+    """
+    将存储目录从平铺布局迁移到分片布局
+
+    服务运行期间可以直接执行，读取路径会同时兼容两种布局
+    """
+    parser = argparse.ArgumentParser(
+        description="Migrate storage files from the flat layout to the sharded layout"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=10000, help="number of files to move per batch"
+    )
+    args = parser.parse_args()
+
+    print(f"Migrating {STORAGE_PATH} to {STORAGE_SHARD_LEVELS} shard levels")
+    total = 0
+    while True:
+        migrated = storage_migrate_layout(limit=args.batch_size)
+        total += migrated
+        print(f"Migrated {total} files")
+        if migrated < args.batch_size:
+            break
+
+
+if __name__ == "__main__":
+    main()